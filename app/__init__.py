@@ -1,18 +1,21 @@
 from flask import Flask
 from app.routes.cart_routes import cart_bp
 from app.models.database import db
+from app.cache import cache
 from app.config import Config
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
-    # Inicializar SQLAlchemy
+    # Inicializar SQLAlchemy. El esquema no se crea aquí (cada worker pagaría
+    # las consultas al catálogo en cada arranque): python -m scripts.migrate
     db.init_app(app)
     
-    # Crear todas las tablas
-    with app.app_context():
-        db.create_all()
-    
     app.register_blueprint(cart_bp, url_prefix='/cart')
+    
+    # Las conexiones a Redis se abren en el primer uso; aquí sólo se adelantan
+    # en segundo plano, sin demorar el arranque del worker
+    if Config.CACHE_WARMUP_ON_START:
+        cache.warm_up()
     return app
\ No newline at end of file
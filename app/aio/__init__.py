@@ -0,0 +1,25 @@
+from quart import Quart
+from app.aio.routes import cart_bp
+from app.aio.redis_cache import cache
+from app.aio.database import db
+from app.config import Config
+
+def create_app():
+    """Variante asyncio de la API de carritos (mismos endpoints y respuestas)"""
+    app = Quart(__name__)
+    app.config.from_object(Config)
+    
+    app.register_blueprint(cart_bp, url_prefix='/cart')
+    
+    # Los clientes asyncio quedan ligados al event loop del servidor
+    @app.before_serving
+    async def open_connections():
+        db.init()
+        await cache.connect()
+    
+    @app.after_serving
+    async def close_connections():
+        await cache.close()
+        await db.dispose()
+    
+    return app
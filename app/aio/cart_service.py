@@ -0,0 +1,322 @@
+import logging
+import time
+from typing import Optional, List, Dict, Tuple, Callable, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.aio.redis_cache import cache
+from app.aio.database import db
+from app.config import Config
+from app.models.cart import Cart, CartItem
+from app.services.cart_events import CartEvent
+from app.services.cart_service import CartService
+
+logger = logging.getLogger(__name__)
+
+class AsyncCartService:
+    """CartService sobre asyncio: mismas sentencias, claves de caché y formas de respuesta"""
+    CART_CACHE_PREFIX = CartService.CART_CACHE_PREFIX
+    PRODUCT_STATS_KEY = CartService.PRODUCT_STATS_KEY
+    LEADERBOARD_KEY = CartService.LEADERBOARD_KEY
+    LEADERBOARD_ORDERS_KEY = CartService.LEADERBOARD_ORDERS_KEY
+    LEADERBOARD_PRICES_KEY = CartService.LEADERBOARD_PRICES_KEY
+    LEADERBOARD_NAMES_KEY = CartService.LEADERBOARD_NAMES_KEY
+    LEADERBOARD_BUILT_KEY = CartService.LEADERBOARD_BUILT_KEY
+    LEADERBOARD_TEMP_TTL = CartService.LEADERBOARD_TEMP_TTL
+    TRENDING_KEY = CartService.TRENDING_KEY
+    TRENDING_WINDOWS = CartService.TRENDING_WINDOWS
+    
+    # Sentencias y armado de resultados sin E/S compartidos con la versión síncrona
+    _cart_from_dict = CartService._cart_from_dict
+    _cache_payload = CartService._cache_payload
+    _load_carts_statement = CartService._load_carts_statement
+    _payloads_from_rows = CartService._payloads_from_rows
+    _lock_cart_statement = CartService._lock_cart_statement
+    _bump_version_statement = CartService._bump_version_statement
+    _add_item_statement = CartService._add_item_statement
+    _remove_item_statement = CartService._remove_item_statement
+    _select_item_statement = CartService._select_item_statement
+    _set_quantity_statement = CartService._set_quantity_statement
+    _clear_items_statement = CartService._clear_items_statement
+    _item_added_event = CartService._item_added_event
+    _item_removed_event = CartService._item_removed_event
+    _quantity_updated_event = CartService._quantity_updated_event
+    _cart_cleared_event = CartService._cart_cleared_event
+    _queue_changes = CartService._queue_changes
+    _leaderboard_entries = CartService._leaderboard_entries
+    _trending_entries = CartService._trending_entries
+    _queue_trending_build = CartService._queue_trending_build
+    _product_stats_query = CartService._product_stats_query
+    _top_products_statement = CartService._top_products_statement
+    _top_product_entries = CartService._top_product_entries
+    _leaderboard_source_query = CartService._leaderboard_source_query
+    _leaderboard_temp_keys = CartService._leaderboard_temp_keys
+    _queue_leaderboard_build = CartService._queue_leaderboard_build
+    _queue_leaderboard_swap = CartService._queue_leaderboard_swap
+    _trending_buckets = CartService._trending_buckets
+    _trending_window_buckets = CartService._trending_window_buckets
+    
+    async def get_cart(self, user_id: str) -> Cart:
+        """Obtener carrito usando patrón Cache-Aside"""
+        cache_key = f"{self.CART_CACHE_PREFIX}{user_id}"
+        cached_cart = await cache.get_or_load(
+            cache_key,
+            lambda: self._load_cart_from_db(user_id),
+            version=lambda payload: payload['version']
+        )
+        return self._cart_from_dict(user_id, cached_cart)
+    
+    async def get_carts(self, user_ids: List[str]) -> List[Cart]:
+        """Obtener varios carritos: un MGET, una consulta para los fallos y un pipeline"""
+        user_ids = list(dict.fromkeys(user_ids))
+        cache_keys = [f"{self.CART_CACHE_PREFIX}{user_id}" for user_id in user_ids]
+        
+        carts = {}
+        for user_id, cached_cart in zip(user_ids, await cache.mget(cache_keys)):
+            if cached_cart is not None:
+                carts[user_id] = self._cart_from_dict(user_id, cached_cart)
+        
+        missing = [user_id for user_id in user_ids if user_id not in carts]
+        if missing:
+            logger.info(f"{len(missing)} de {len(user_ids)} carritos no encontrados en caché, consultando BD")
+            async with db.session() as session:
+                payloads = await self._load_carts_from_db(session, missing)
+            backfill = {}
+            for user_id in missing:
+                payload = payloads.get(user_id) or self._cache_payload(Cart(user_id=user_id, items=[]), 0)
+                carts[user_id] = self._cart_from_dict(user_id, payload)
+                backfill[f"{self.CART_CACHE_PREFIX}{user_id}"] = (payload, payload['version'])
+            await cache.mset_versioned(backfill)
+        
+        return [carts[user_id] for user_id in user_ids]
+    
+    async def _load_cart_from_db(self, user_id: str) -> dict:
+        """Cargar carrito desde la BD (vacío si no existe)"""
+        logger.info(f"Carrito {user_id} no encontrado en caché, consultando BD")
+        async with db.session() as session:
+            payload = (await self._load_carts_from_db(session, [user_id])).get(user_id)
+        return payload or self._cache_payload(Cart(user_id=user_id, items=[]), 0)
+    
+    async def _load_carts_from_db(self, session: AsyncSession, user_ids: List[str]) -> Dict[str, dict]:
+        """Cargar varios carritos con sus items en una sola consulta"""
+        rows = (await session.execute(self._load_carts_statement(user_ids))).all()
+        return self._payloads_from_rows(rows)
+    
+    async def _lock_cart(self, session: AsyncSession, user_id: str) -> Tuple[int, int, Optional[int]]:
+        """Bloquear el carrito (creándolo si no existe) y asignarle una versión nueva"""
+        previous_version = (await session.execute(self._lock_cart_statement(user_id))).scalar_one_or_none()
+        row = (await session.execute(self._bump_version_statement(user_id, previous_version is not None))).one()
+        return row.id, row.version, previous_version
+    
+    async def add_item(self, user_id: str, item_data: dict) -> Cart:
+        """Agregar item al carrito modificando sólo su fila"""
+        item = CartItem(**item_data)
+        
+        async with db.session() as session:
+            try:
+                cart_id, version, previous_version = await self._lock_cart(session, user_id)
+                row = (await session.execute(self._add_item_statement(cart_id, item))).one()
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Error agregando item al carrito {user_id}: {e}")
+                raise
+        
+        await self._publish_changes(self._item_added_event(user_id, version, item, row))
+        return await self._patch_cached_cart(user_id, version, previous_version, lambda cart: cart.add_item(item))
+    
+    async def remove_item(self, user_id: str, product_id: int) -> Cart:
+        """Eliminar item del carrito modificando sólo su fila"""
+        async with db.session() as session:
+            try:
+                cart_id, version, previous_version = await self._lock_cart(session, user_id)
+                removed = (await session.execute(self._remove_item_statement(cart_id, product_id))).one_or_none()
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Error eliminando item del carrito {user_id}: {e}")
+                raise
+        
+        if removed:
+            await self._publish_changes(self._item_removed_event(user_id, version, product_id, removed))
+        return await self._patch_cached_cart(
+            user_id, version, previous_version,
+            lambda cart: cart.remove_item(product_id)
+        )
+    
+    async def update_quantity(self, user_id: str, product_id: int, quantity: int) -> Optional[Cart]:
+        """Actualizar cantidad de un item modificando sólo su fila"""
+        async with db.session() as session:
+            try:
+                cart_id, version, previous_version = await self._lock_cart(session, user_id)
+                current = (await session.execute(self._select_item_statement(cart_id, product_id))).one_or_none()
+                
+                if current is None:
+                    # El producto no está en el carrito: descartar también la nueva versión
+                    await session.rollback()
+                    return None
+                
+                await session.execute(self._set_quantity_statement(current.id, quantity))
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Error actualizando cantidad en carrito {user_id}: {e}")
+                raise
+        
+        await self._publish_changes(self._quantity_updated_event(user_id, version, product_id, current, quantity))
+        return await self._patch_cached_cart(
+            user_id, version, previous_version,
+            lambda cart: cart.update_quantity(product_id, quantity)
+        )
+    
+    async def _patch_cached_cart(self, user_id: str, version: int, previous_version: Optional[int],
+                                 patch: Callable[[Cart], Any]) -> Cart:
+        """Aplicar una mutación al carrito cacheado sin releer toda la BD (ver CartService)"""
+        cache_key = f"{self.CART_CACHE_PREFIX}{user_id}"
+        cached_cart, cached_version = await cache.get_versioned(cache_key)
+        
+        if cached_cart is not None and previous_version is not None and cached_version == previous_version:
+            cart = self._cart_from_dict(user_id, cached_cart)
+            patch(cart)
+            payload = self._cache_payload(cart, version)
+        else:
+            payload = await self._load_cart_from_db(user_id)
+            cart = self._cart_from_dict(user_id, payload)
+        
+        await cache.set_versioned(cache_key, payload, payload['version'])
+        return cart
+    
+    async def clear_cart(self, user_id: str) -> None:
+        """Limpiar carrito"""
+        cache_key = f"{self.CART_CACHE_PREFIX}{user_id}"
+        
+        async with db.session() as session:
+            try:
+                cart_row = (await session.execute(self._bump_version_statement(user_id, exists=True))).one_or_none()
+                
+                removed = []
+                if cart_row:
+                    removed = (await session.execute(self._clear_items_statement(cart_row.id))).all()
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Error limpiando carrito {user_id}: {e}")
+                raise
+        
+        if cart_row:
+            empty_cart = Cart(user_id=user_id, items=[])
+            await cache.set_versioned(cache_key, self._cache_payload(empty_cart, cart_row.version), cart_row.version)
+        else:
+            await cache.delete(cache_key)
+        
+        if removed:
+            await self._publish_changes(self._cart_cleared_event(user_id, cart_row.version, removed))
+        logger.info(f"Carrito {user_id} eliminado")
+    
+    async def _publish_changes(self, event: CartEvent) -> None:
+        """Aplicar a estadísticas y ranking sólo los cambios y publicar el evento, en un round-trip"""
+        if not event.deltas:
+            return
+        try:
+            async with cache.batch(transaction=True) as pipe:
+                self._queue_changes(pipe, event, time.time())
+        except Exception as e:
+            logger.error(f"Error actualizando estadísticas (evento {event.type} de {event.user_id} no publicado): {e}")
+            # El ranking quedó desfasado: se reconstruirá cuando Redis responda
+            cache.mark_dirty([self.LEADERBOARD_BUILT_KEY])
+    
+    async def get_top_products(self, limit: int = 10) -> list:
+        """Obtener top productos más comprados desde el ranking en Redis"""
+        if limit <= 0:
+            return []
+        if not cache.available:
+            return await self._top_products_from_db(limit)
+        try:
+            await cache.get_or_load(
+                self.LEADERBOARD_BUILT_KEY,
+                self._build_leaderboard,
+                expiration=Config.LEADERBOARD_REBUILD_INTERVAL
+            )
+            return await self._read_leaderboard(limit)
+        except Exception as e:
+            logger.error(f"Error obteniendo top productos: {e}")
+            return []
+    
+    async def _read_leaderboard(self, limit: int) -> list:
+        """Leer los `limit` primeros productos del ranking: O(log N + limit)"""
+        top = await cache.zrevrange(self.LEADERBOARD_KEY, 0, limit - 1, withscores=True)
+        if not top:
+            return []
+        
+        product_ids = [product_id for product_id, _ in top]
+        async with cache.read_pipeline() as pipe:
+            pipe.hmget(self.LEADERBOARD_NAMES_KEY, product_ids)
+            pipe.hmget(self.LEADERBOARD_ORDERS_KEY, product_ids)
+            pipe.hmget(self.LEADERBOARD_PRICES_KEY, product_ids)
+            names, orders, prices = await pipe.execute()
+        return self._leaderboard_entries(top, names, orders, prices)
+    
+    async def _top_products_from_db(self, limit: int) -> list:
+        """Leer el top de productos de product_stats (Redis no disponible)"""
+        logger.info("Redis no disponible, leyendo top productos desde BD")
+        async with db.session() as session:
+            rows = (await session.execute(self._top_products_statement(limit))).all()
+        return self._top_product_entries(rows)
+    
+    async def get_trending_products(self, window: str, limit: int = 10) -> list:
+        """Top de productos por unidades agregadas a carritos en la ventana ('1h', '24h' o '7d')"""
+        if limit <= 0:
+            return []
+        if not cache.available:
+            logger.warning(f"Redis no disponible, sin tendencias para la ventana {window}")
+            return []
+        try:
+            await cache.get_or_load(
+                f"{self.TRENDING_KEY}:{window}:built",
+                lambda: self._build_trending(window),
+                expiration=Config.TRENDING_CACHE_TTL
+            )
+            return await self._read_trending(window, limit)
+        except Exception as e:
+            logger.error(f"Error obteniendo tendencias {window}: {e}")
+            return []
+    
+    async def _build_trending(self, window: str) -> dict:
+        """Sumar los buckets de la ventana en un sorted set (ver CartService)"""
+        async with cache.batch(transaction=True) as pipe:
+            buckets = self._queue_trending_build(pipe, window, time.time())
+        return {'window': window, 'buckets': len(buckets), 'built_at': time.time()}
+    
+    async def _read_trending(self, window: str, limit: int) -> list:
+        """Leer los `limit` primeros productos de la ventana"""
+        top = await cache.zrevrange(f"{self.TRENDING_KEY}:{window}", 0, limit - 1, withscores=True)
+        if not top:
+            return []
+        
+        async with cache.read_pipeline() as pipe:
+            pipe.hmget(self.LEADERBOARD_NAMES_KEY, [product_id for product_id, _ in top])
+            names, = await pipe.execute()
+        return self._trending_entries(top, names)
+    
+    async def _build_leaderboard(self) -> dict:
+        """Recalcular ranking y contadores desde la BD y reemplazarlos atómicamente (ver CartService)"""
+        logger.info("Reconstruyendo ranking de productos desde BD")
+        
+        async with db.session() as session:
+            results = (await session.execute(self._leaderboard_source_query())).all()
+        
+        temp_keys = self._leaderboard_temp_keys()
+        
+        async with cache.batch() as pipe:
+            scores = self._queue_leaderboard_build(pipe, results, temp_keys)
+        async with cache.batch(transaction=True) as pipe:
+            self._queue_leaderboard_swap(pipe, temp_keys, scores, bool(results))
+        
+        logger.info(f"Ranking reconstruido con {len(scores)} productos")
+        return {'products': len(scores), 'rebuilt_at': time.time()}
+    
+    async def get_cache_stats(self) -> dict:
+        """Obtener estadísticas del caché"""
+        return await cache.get_stats()
+    
+    def get_db_pool_stats(self) -> dict:
+        """Obtener estadísticas del pool de conexiones a la base de datos"""
+        return db.get_pool_stats()
@@ -0,0 +1,59 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.config import Config
+from app.models.database import InstrumentedQueuePool
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """InstrumentedQueuePool para engines asyncio"""
+
+class AsyncDatabase:
+    """Engine asyncpg y sesiones asyncio sobre las mismas tablas que la app síncrona"""
+    
+    def __init__(self):
+        self.engine: AsyncEngine = None
+        self._sessions = None
+    
+    def init(self) -> None:
+        """Crear el engine con la configuración de pool de SQLALCHEMY_ENGINE_OPTIONS"""
+        uri = Config.SQLALCHEMY_DATABASE_URI.replace('postgresql://', 'postgresql+asyncpg://', 1)
+        options = {k: v for k, v in Config.SQLALCHEMY_ENGINE_OPTIONS.items() if k != 'connect_args'}
+        # asyncpg no acepta `options` de libpq: el timeout se fija como parámetro de servidor
+        server_settings = {}
+        if Config.DB_STATEMENT_TIMEOUT_MS:
+            server_settings['statement_timeout'] = str(Config.DB_STATEMENT_TIMEOUT_MS)
+        self.engine = create_async_engine(
+            uri,
+            poolclass=InstrumentedAsyncQueuePool,
+            connect_args={'server_settings': server_settings},
+            **options
+        )
+        self._sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+    
+    async def dispose(self) -> None:
+        """Cerrar las conexiones del pool"""
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+    
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        """Sesión para una operación; se hace rollback de lo no confirmado al salir"""
+        async with self._sessions() as session:
+            yield session
+    
+    async def ping(self) -> None:
+        async with self.engine.connect() as conn:
+            await conn.execute(text('SELECT 1'))
+    
+    def get_pool_stats(self) -> dict:
+        """Estadísticas del pool de conexiones a PostgreSQL"""
+        pool = self.engine.pool
+        if isinstance(pool, InstrumentedQueuePool):
+            return pool.get_stats()
+        return {'status': pool.status()}
+
+# Instancia global de la base de datos asyncio
+db = AsyncDatabase()
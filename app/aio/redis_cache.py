@@ -0,0 +1,587 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional, Any, List, Callable, Awaitable, Tuple, Dict, AsyncIterator
+import redis
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.client import NEVER_DECODE
+from app.config import Config
+from app.cache.circuit_breaker import CircuitBreaker
+from app.cache.redis_cache import CacheSerializer, LocalCache, RedisCache
+from app.cache.replica_router import Replica, ReplicaRouter
+
+logger = logging.getLogger(__name__)
+
+async def _guarded_call(breaker: CircuitBreaker, call: Callable[..., Awaitable[Any]], *args, **kwargs):
+    """Versión asyncio de circuit_breaker._guarded_call: mismo criterio para cada resultado"""
+    breaker.before_call()
+    try:
+        result = await call(*args, **kwargs)
+    except (redis.ConnectionError, redis.TimeoutError):
+        breaker.record_failure()
+        raise
+    except redis.RedisError:
+        breaker.record_success()
+        raise
+    except BaseException:
+        # Incluye la cancelación de la tarea: no dice nada de Redis
+        breaker.release_probe()
+        raise
+    breaker.record_success()
+    return result
+
+class GuardedAsyncPipeline(aioredis.client.Pipeline):
+    """Pipeline asyncio cuyo envío pasa por el circuit breaker del cliente"""
+    
+    breaker = None
+    
+    async def execute(self, raise_on_error: bool = True):
+        return await _guarded_call(self.breaker, super().execute, raise_on_error)
+
+class GuardedAsyncRedis(aioredis.Redis):
+    """Cliente asyncio de Redis cuyos comandos pasan por un circuit breaker"""
+    
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+    
+    async def execute_command(self, *args, **options):
+        return await _guarded_call(self.breaker, super().execute_command, *args, **options)
+    
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> GuardedAsyncPipeline:
+        pipe = GuardedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+class InstrumentedAsyncConnectionPool(aioredis.BlockingConnectionPool):
+    """BlockingConnectionPool asyncio que mide la espera por una conexión libre.
+    
+    Mismas métricas que InstrumentedConnectionPool; todo corre en el event
+    loop, así que los contadores no necesitan lock.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created = 0
+        self.checked_out = set()
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+    
+    def make_connection(self):
+        self.created += 1
+        return super().make_connection()
+    
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.monotonic()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except Exception:
+            self.checkout_errors += 1
+            raise
+        finally:
+            waited = time.monotonic() - start
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+        self.checked_out.add(connection)
+        return connection
+    
+    async def release(self, connection) -> None:
+        # get_connection también libera la conexión si no pudo conectarla
+        self.checked_out.discard(connection)
+        await super().release(connection)
+    
+    def get_stats(self) -> dict:
+        """Obtener uso del pool y tiempos de espera"""
+        in_use = len(self.checked_out)
+        return {
+            'max_connections': self.max_connections,
+            'created': self.created,
+            'in_use': in_use,
+            'idle': self.created - in_use,
+            'utilization': round(in_use / self.max_connections, 4),
+            'checkouts': self.checkouts,
+            'checkout_errors': self.checkout_errors,
+            'wait_ms_avg': round(self.wait_time_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            'wait_ms_max': round(self.wait_time_max * 1000, 3)
+        }
+
+def create_async_client(host: str, port: int, breaker: CircuitBreaker = None) -> aioredis.Redis:
+    """Cliente asyncio de Redis con pool acotado, timeouts y reintentos (ver create_client)"""
+    pool = InstrumentedAsyncConnectionPool(
+        host=host,
+        port=port,
+        max_connections=Config.REDIS_MAX_CONNECTIONS,
+        timeout=Config.REDIS_POOL_TIMEOUT,
+        socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=Config.REDIS_SOCKET_KEEPALIVE,
+        retry=Retry(
+            ExponentialBackoff(cap=Config.REDIS_RETRY_BACKOFF_CAP, base=Config.REDIS_RETRY_BACKOFF_BASE),
+            Config.REDIS_RETRY_ATTEMPTS,
+            supported_errors=(redis.ConnectionError,)
+        ),
+        retry_on_error=[redis.ConnectionError],
+        decode_responses=True,
+        health_check_interval=30
+    )
+    if breaker is not None:
+        return GuardedAsyncRedis(connection_pool=pool, breaker=breaker)
+    return aioredis.Redis(connection_pool=pool)
+
+class AsyncReplicaRouter(ReplicaRouter):
+    """ReplicaRouter con clientes asyncio: misma política, expulsión y métricas.
+    
+    La elección y el registro de latencias y errores son los de la versión
+    síncrona; sólo el sondeo y la conexión esperan en el event loop.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._probe_task = None
+    
+    def start(self) -> None:
+        """Iniciar la tarea que sondea las réplicas: de inmediato y luego las expulsadas"""
+        if self._probe_task is not None or not self.replicas:
+            return
+        self._probe_task = asyncio.ensure_future(self._probe_loop())
+    
+    def stop(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+    
+    async def _probe_loop(self) -> None:
+        while True:
+            for replica in self.replicas:
+                if not replica.healthy:
+                    await self.probe(replica)
+            await asyncio.sleep(self.probe_interval)
+    
+    async def probe(self, replica: Replica) -> bool:
+        """Hacer PING a una réplica y actualizar su estado"""
+        start = time.monotonic()
+        try:
+            await replica.client.ping()
+        except Exception as e:
+            with self._lock:
+                replica.healthy = False
+                replica.last_error = str(e)
+            logger.warning(f"Réplica {replica.host}:{replica.port} no disponible: {e}")
+            return False
+        
+        with self._lock:
+            replica.record_latency(time.monotonic() - start)
+            replica.consecutive_errors = 0
+            recovered = not replica.healthy
+            replica.healthy = True
+        if recovered:
+            logger.info(f"Réplica {replica.host}:{replica.port} disponible para lecturas")
+        return True
+    
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aioredis.Redis]:
+        """Conexión para una lectura, registrando su latencia o su error de conexión"""
+        replica = self.choose()
+        if replica is None:
+            yield self.fallback
+            return
+        
+        start = time.monotonic()
+        try:
+            yield replica.client
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self.record_failure(replica, e)
+            raise
+        self.record_success(replica, time.monotonic() - start)
+
+class AsyncRedisCache:
+    """Caché sobre redis.asyncio con el mismo formato de claves y valores que RedisCache.
+    
+    Comparte serializador, claves de versión y script SET_IF_NEWER con la
+    versión síncrona, y publica en el mismo canal de invalidaciones, así que
+    ambos tipos de worker pueden atender el mismo tráfico. No mantiene L1:
+    sin caché local no hay invalidaciones que escuchar.
+    
+    Consistencia de lecturas: 'eventual' lee de las réplicas; 'session' lee
+    del master las claves que este proceso escribió dentro de
+    READ_YOUR_WRITES_WINDOW (sin comparar offsets de replicación); 'strong'
+    lee siempre del master. Las réplicas se eligen con AsyncReplicaRouter:
+    misma REDIS_READ_POLICY, expulsión y sondeo que la versión síncrona.
+    """
+    LOCK_PREFIX = RedisCache.LOCK_PREFIX
+    VERSION_SUFFIX = RedisCache.VERSION_SUFFIX
+    CONSISTENCY_LEVELS = RedisCache.CONSISTENCY_LEVELS
+    
+    def __init__(self):
+        # Los clientes se crean en `connect`, dentro del event loop que los usará
+        self.master = None
+        self.router = None
+        self.instance_id = uuid.uuid4().hex
+        self._flights = {}
+        self._recent_writes = None
+        if Config.READ_YOUR_WRITES_WINDOW > 0:
+            self._recent_writes = LocalCache(Config.LOCAL_CACHE_MAX_SIZE, Config.READ_YOUR_WRITES_WINDOW)
+        self._read_stats = {'replica': 0, 'master': 0, 'replica_errors': 0}
+        self.serializer = CacheSerializer(
+            Config.CACHE_CODEC,
+            Config.CACHE_COMPRESSION_THRESHOLD,
+            Config.CACHE_COMPRESSION_LEVEL
+        )
+        # Modo degradado como en RedisCache: con el circuito del master abierto
+        # los servicios leen de la BD en lugar de esperar timeouts de Redis
+        self.breaker = CircuitBreaker(
+            Config.CACHE_BREAKER_FAILURE_THRESHOLD,
+            Config.CACHE_BREAKER_RESET_TIMEOUT
+        )
+        # Claves que quedaron desactualizadas en Redis por una escritura fallida
+        self._dirty_keys = set()
+    
+    async def connect(self) -> None:
+        """Crear los clientes del master y las réplicas y comprobar el master"""
+        start = time.monotonic()
+        self.master = create_async_client(Config.REDIS_MASTER_HOST, Config.REDIS_MASTER_PORT, breaker=self.breaker)
+        self._set_if_newer = self.master.register_script(RedisCache.SET_IF_NEWER_SCRIPT)
+        slave_configs = [
+            (Config.REDIS_SLAVE1_HOST, Config.REDIS_SLAVE1_PORT, Config.REDIS_SLAVE1_WEIGHT),
+            (Config.REDIS_SLAVE2_HOST, Config.REDIS_SLAVE2_PORT, Config.REDIS_SLAVE2_WEIGHT)
+        ]
+        # Hasta que el primer sondeo responda las lecturas van al master
+        self.router = AsyncReplicaRouter(
+            [Replica(create_async_client(host, port), host, port, weight) for host, port, weight in slave_configs],
+            fallback=self.master,
+            policy=Config.REDIS_READ_POLICY,
+            max_errors=Config.REDIS_REPLICA_MAX_ERRORS,
+            probe_interval=Config.REDIS_REPLICA_PROBE_INTERVAL
+        )
+        self.router.start()
+        try:
+            await self.master.ping()
+            logger.info(f"Conectado a Redis Master (asyncio) en {(time.monotonic() - start) * 1000:.1f}ms")
+        except redis.ConnectionError as e:
+            # El circuito abierto se probará con los siguientes comandos
+            self.breaker.trip()
+            logger.error(f"Redis Master no disponible, funcionando en modo degradado: {e}")
+    
+    async def close(self) -> None:
+        """Cerrar los pools de conexiones"""
+        replicas = []
+        if self.router is not None:
+            self.router.stop()
+            replicas = [replica.client for replica in self.router.replicas]
+        for client in [self.master, *replicas]:
+            if client is not None:
+                await client.aclose()
+        self.master = None
+        self.router = None
+    
+    # Mismo nivel de consistencia por petición que la versión síncrona (ContextVar)
+    get_consistency = RedisCache.get_consistency
+    set_consistency = RedisCache.set_consistency
+    reset_consistency = RedisCache.reset_consistency
+    
+    def _requires_master(self, keys: List[str]) -> bool:
+        """Si `keys` deben leerse del master según el nivel de consistencia"""
+        level = self.get_consistency()
+        recent = self._recent_writes is not None and any(self._recent_writes.get(key) for key in keys)
+        return level == 'strong' or (level == 'session' and recent)
+    
+    @asynccontextmanager
+    async def _read_connection(self, keys: List[str]) -> AsyncIterator[aioredis.Redis]:
+        """Conexión para leer `keys`; las lecturas en réplicas registran latencia y errores"""
+        if self._requires_master(keys):
+            self._read_stats['master'] += 1
+            yield self.master
+            return
+        async with self.router.connection() as conn:
+            self._read_stats['master' if conn is self.master else 'replica'] += 1
+            yield conn
+    
+    async def _fetch(self, keys: List[str]) -> List[Optional[bytes]]:
+        """MGET sin decodificar, con el master como respaldo si la réplica falla"""
+        conn = None
+        try:
+            async with self._read_connection(keys) as conn:
+                return await conn.execute_command('MGET', *keys, **{NEVER_DECODE: []})
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            if conn is None or conn is self.master:
+                raise
+            self._read_stats['replica_errors'] += 1
+            logger.warning(f"Réplica no disponible, leyendo del master: {e}")
+            return await self.master.execute_command('MGET', *keys, **{NEVER_DECODE: []})
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Obtener valor del caché"""
+        return (await self.mget([key]))[0]
+    
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Obtener varios valores en un round-trip (None para los ausentes)"""
+        if not keys:
+            return []
+        try:
+            raw_values = await self._fetch(keys)
+            return [self.serializer.loads(raw) if raw else None for raw in raw_values]
+        except Exception as e:
+            logger.error(f"Error obteniendo {len(keys)} claves: {e}")
+            return [None] * len(keys)
+    
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]], expiration: int = None,
+                          version: Callable[[Any], int] = None) -> Any:
+        """Obtener valor del caché o calcularlo una única vez ante un fallo.
+        
+        Las corrutinas del proceso que piden la misma clave esperan el mismo
+        cálculo y entre procesos se coordinan con el lock de RedisCache.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        
+        flight = self._flights.get(key)
+        if flight is not None:
+            return await asyncio.shield(flight)
+        
+        flight = asyncio.ensure_future(self._load_with_lock(key, loader, expiration, version))
+        self._flights[key] = flight
+        flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(flight)
+    
+    async def _load_with_lock(self, key: str, loader: Callable[[], Awaitable[Any]], expiration: Optional[int],
+                              version: Optional[Callable[[Any], int]]) -> Any:
+        """Ejecutar `loader` coordinando con otros procesos mediante un lock en Redis"""
+        lock = None
+        acquired = False
+        try:
+            lock = self.master.lock(f"{self.LOCK_PREFIX}{key}", timeout=Config.CACHE_LOCK_TIMEOUT, blocking=False)
+            acquired = await lock.acquire()
+        except Exception as e:
+            logger.error(f"Error adquiriendo lock de {key}: {e}")
+            lock = None
+        
+        if lock is not None and not acquired:
+            value = await self._wait_for_value(key)
+            if value is not None:
+                return value
+            logger.warning(f"Timeout esperando {key} de otro proceso, calculando sin lock")
+        
+        try:
+            value = await loader()
+            if version is None:
+                await self.set(key, value, expiration)
+            else:
+                await self.set_versioned(key, value, version(value), expiration)
+            return value
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except Exception as e:
+                    logger.warning(f"Error liberando lock de {key}: {e}")
+    
+    async def _wait_for_value(self, key: str) -> Optional[Any]:
+        """Esperar a que el proceso que tiene el lock publique el valor"""
+        lock_key = f"{self.LOCK_PREFIX}{key}"
+        deadline = time.monotonic() + Config.CACHE_LOCK_WAIT
+        try:
+            while time.monotonic() < deadline:
+                pipe = self.master.pipeline(transaction=False)
+                pipe.execute_command('GET', key, **{NEVER_DECODE: []})
+                pipe.exists(lock_key)
+                value, locked = await pipe.execute()
+                if value:
+                    return self.serializer.loads(value)
+                if not locked:
+                    return None
+                await asyncio.sleep(Config.CACHE_LOCK_POLL_INTERVAL)
+        except Exception as e:
+            logger.error(f"Error esperando clave {key}: {e}")
+        return None
+    
+    def _publish_invalidation(self, pipe, keys: List[str]) -> None:
+        """Avisar a los procesos síncronos para que invaliden su L1"""
+        message = json.dumps({'origin': self.instance_id, 'keys': keys})
+        pipe.publish(Config.CACHE_INVALIDATION_CHANNEL, message)
+    
+    @property
+    def available(self) -> bool:
+        """False mientras el circuito del master está abierto (modo degradado)"""
+        return self.master is not None and self.breaker.state != CircuitBreaker.OPEN
+    
+    def mark_dirty(self, keys: List[str]) -> None:
+        """Registrar claves cuyo valor en Redis quedó desactualizado (ver RedisCache.mark_dirty).
+        
+        Se eliminan antes de la siguiente escritura de este proceso, es decir
+        en cuanto el master vuelve a responder.
+        """
+        if len(self._dirty_keys) + len(keys) > Config.CACHE_DIRTY_KEYS_MAX:
+            logger.error(f"Demasiadas claves pendientes de invalidar, se descartan {len(keys)}")
+            return
+        self._dirty_keys.update(keys)
+    
+    async def _flush_dirty(self) -> None:
+        """Eliminar de Redis las claves registradas con mark_dirty"""
+        keys = list(self._dirty_keys)
+        self._dirty_keys.clear()
+        try:
+            pipe = self.master.pipeline(transaction=False)
+            pipe.delete(*keys)
+            self._publish_invalidation(pipe, keys)
+            await pipe.execute()
+        except Exception:
+            self._dirty_keys.update(keys)
+            raise
+        logger.info(f"Invalidadas {len(keys)} claves que quedaron desactualizadas en Redis")
+    
+    async def _execute_write(self, pipe, keys: List[str]) -> list:
+        """Ejecutar un pipeline de escritura, avisando la invalidación y recordando las claves"""
+        if self._dirty_keys:
+            await self._flush_dirty()
+        self._publish_invalidation(pipe, keys)
+        results = await pipe.execute()
+        if self._recent_writes is not None:
+            for key in keys:
+                self._recent_writes.set(key, True)
+        return results[:-1]
+    
+    async def set(self, key: str, value: Any, expiration: int = None) -> bool:
+        """Establecer valor en el caché"""
+        try:
+            pipe = self.master.pipeline(transaction=False)
+            pipe.setex(key, expiration or Config.CACHE_EXPIRATION, self.serializer.dumps(value))
+            await self._execute_write(pipe, [key])
+            return True
+        except Exception as e:
+            logger.error(f"Error estableciendo clave {key}: {e}")
+            return False
+    
+    async def get_versioned(self, key: str) -> Tuple[Optional[Any], Optional[int]]:
+        """Leer del master un valor junto con su versión"""
+        try:
+            value, version = await self.master.execute_command(
+                'EVAL', RedisCache.GET_VERSIONED_SCRIPT, 2, key, f"{key}{self.VERSION_SUFFIX}",
+                **{NEVER_DECODE: []}
+            )
+            if not value:
+                return None, None
+            return self.serializer.loads(value), int(version) if version is not None else None
+        except Exception as e:
+            logger.error(f"Error obteniendo clave versionada {key}: {e}")
+            return None, None
+    
+    async def set_versioned(self, key: str, value: Any, version: int, expiration: int = None) -> bool:
+        """Establecer valor sólo si `version` es más nueva que la cacheada"""
+        return (await self.mset_versioned({key: (value, version)}, expiration)).get(key, False)
+    
+    async def mset_versioned(self, mapping: Dict[str, Tuple[Any, int]], expiration: int = None) -> Dict[str, bool]:
+        """Establecer varios valores versionados en un round-trip"""
+        if not mapping:
+            return {}
+        try:
+            expiration = expiration or Config.CACHE_EXPIRATION
+            pipe = self.master.pipeline(transaction=False)
+            for key, (value, version) in mapping.items():
+                await self._set_if_newer(
+                    keys=[key, f"{key}{self.VERSION_SUFFIX}"],
+                    args=[self.serializer.dumps(value), version, expiration],
+                    client=pipe
+                )
+            results = await self._execute_write(pipe, list(mapping))
+            return dict(zip(mapping, (bool(result) for result in results)))
+        except Exception as e:
+            logger.error(f"Error estableciendo {len(mapping)} claves versionadas: {e}")
+            return {}
+    
+    async def delete(self, key: str) -> bool:
+        """Eliminar valor del caché (la versión se conserva)"""
+        try:
+            pipe = self.master.pipeline(transaction=False)
+            pipe.delete(key)
+            await self._execute_write(pipe, [key])
+            return True
+        except Exception as e:
+            logger.error(f"Error eliminando clave {key}: {e}")
+            return False
+    
+    @asynccontextmanager
+    async def batch(self, transaction: bool = False) -> AsyncIterator[aioredis.client.Pipeline]:
+        """Agrupar comandos sobre el master y enviarlos al salir del bloque"""
+        pipe = self.master.pipeline(transaction=transaction)
+        try:
+            yield pipe
+            await pipe.execute()
+        finally:
+            await pipe.reset()
+    
+    @asynccontextmanager
+    async def read_pipeline(self) -> AsyncIterator[aioredis.client.Pipeline]:
+        """Pipeline sobre una réplica para agrupar lecturas (ver RedisCache.read_pipeline)"""
+        async with self._read_connection([]) as conn:
+            async with conn.pipeline(transaction=False) as pipe:
+                yield pipe
+    
+    async def zrevrange(self, key: str, start: int, end: int, withscores: bool = False) -> list:
+        """Obtener miembros de un sorted set de mayor a menor puntaje"""
+        try:
+            async with self._read_connection([key]) as conn:
+                return await conn.zrevrange(key, start, end, withscores=withscores)
+        except Exception as e:
+            logger.error(f"Error obteniendo rango de {key}: {e}")
+            return []
+    
+    @staticmethod
+    def _pool_stats(client: aioredis.Redis) -> dict:
+        """Uso del pool de conexiones de un cliente"""
+        pool = client.connection_pool
+        return pool.get_stats() if isinstance(pool, InstrumentedAsyncConnectionPool) else {}
+    
+    async def _node_stats(self, client: aioredis.Redis, host: str, port: int) -> dict:
+        """Estado, INFO y pool de un nodo"""
+        try:
+            info = await client.info()
+            return {
+                'status': 'connected',
+                'host': host,
+                'port': port,
+                'info': {
+                    'connected_clients': info.get('connected_clients', 0),
+                    'used_memory_human': info.get('used_memory_human', '0'),
+                    'keyspace_hits': info.get('keyspace_hits', 0),
+                    'keyspace_misses': info.get('keyspace_misses', 0)
+                },
+                'pool': self._pool_stats(client)
+            }
+        except Exception as e:
+            logger.error(f"Error obteniendo stats de {host}:{port}: {e}")
+            return {'status': 'disconnected', 'host': host, 'port': port, 'pool': self._pool_stats(client)}
+    
+    async def get_stats(self) -> dict:
+        """Obtener estadísticas de Redis con la misma forma que RedisCache.get_stats"""
+        master, *slaves = await asyncio.gather(
+            self._node_stats(self.master, Config.REDIS_MASTER_HOST, Config.REDIS_MASTER_PORT),
+            *(self._node_stats(replica.client, replica.host, replica.port) for replica in self.router.replicas)
+        )
+        return {
+            'master': master,
+            'slaves': slaves,
+            'routing': self.router.get_stats(),
+            'codec': {
+                'name': self.serializer.codec.name,
+                'compression_threshold': self.serializer.compression_threshold
+            },
+            'circuit_breaker': {**self.breaker.get_stats(), 'pending_invalidations': len(self._dirty_keys)},
+            'consistency': {
+                'default': Config.CACHE_READ_CONSISTENCY,
+                'read_your_writes_window_seconds': Config.READ_YOUR_WRITES_WINDOW,
+                'reads': dict(self._read_stats)
+            },
+            'single_flight': {'in_progress': len(self._flights)}
+        }
+
+# Instancia global del caché asyncio
+cache = AsyncRedisCache()
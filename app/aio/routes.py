@@ -0,0 +1,238 @@
+from quart import Blueprint, jsonify, request, g
+from app.aio.cart_service import AsyncCartService
+from app.aio.redis_cache import cache
+from app.aio.database import db
+from app.config import Config
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+cart_bp = Blueprint('cart', __name__)
+cart_service = AsyncCartService()
+
+@cart_bp.before_request
+async def apply_read_consistency():
+    """Aplicar el nivel de consistencia pedido en la cabecera X-Read-Consistency"""
+    level = request.headers.get('X-Read-Consistency')
+    if level is None:
+        return None
+    if level not in cache.CONSISTENCY_LEVELS:
+        return jsonify({'error': f"X-Read-Consistency debe ser uno de: {', '.join(cache.CONSISTENCY_LEVELS)}"}), 400
+    g.read_consistency_token = cache.set_consistency(level)
+
+@cart_bp.teardown_request
+async def reset_read_consistency(error):
+    """Restaurar el nivel de consistencia al terminar la petición"""
+    token = g.pop('read_consistency_token', None)
+    if token is not None:
+        cache.reset_consistency(token)
+
+@cart_bp.route('/<user_id>', methods=['GET'])
+async def get_cart(user_id):
+    """Obtener carrito de un usuario"""
+    start_time = time.time()
+    try:
+        cart = await cart_service.get_cart(user_id)
+        response_time = (time.time() - start_time) * 1000  # en milisegundos
+        
+        response = cart.to_dict()
+        response['_metadata'] = {
+            'response_time_ms': round(response_time, 2),
+            'source': 'cache_or_db'
+        }
+        
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Error obteniendo carrito {user_id}: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/batch', methods=['POST'])
+async def get_carts_batch():
+    """Obtener varios carritos en una sola petición"""
+    start_time = time.time()
+    try:
+        user_ids = (await request.get_json() or {}).get('user_ids')
+        
+        if not isinstance(user_ids, list) or not all(isinstance(user_id, str) for user_id in user_ids):
+            return jsonify({'error': 'Campo requerido: user_ids (lista de strings)'}), 400
+        if len(user_ids) > Config.CART_BATCH_MAX_SIZE:
+            return jsonify({'error': f'Máximo {Config.CART_BATCH_MAX_SIZE} carritos por petición'}), 400
+        
+        carts = await cart_service.get_carts(user_ids)
+        response_time = (time.time() - start_time) * 1000
+        
+        return jsonify({
+            'carts': [cart.to_dict() for cart in carts],
+            'total_count': len(carts),
+            '_metadata': {
+                'response_time_ms': round(response_time, 2)
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error obteniendo carritos en lote: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/<user_id>/add', methods=['POST'])
+async def add_to_cart(user_id):
+    """Agregar item al carrito"""
+    start_time = time.time()
+    try:
+        item_data = await request.get_json()
+        
+        # Validar datos requeridos
+        required_fields = ['product_id', 'name', 'price', 'quantity']
+        if not all(field in item_data for field in required_fields):
+            return jsonify({'error': 'Campos requeridos: product_id, name, price, quantity'}), 400
+        
+        cart = await cart_service.add_item(user_id, item_data)
+        response_time = (time.time() - start_time) * 1000
+        
+        return jsonify({
+            'message': 'Item agregado exitosamente',
+            'cart': cart.to_dict(),
+            '_metadata': {
+                'response_time_ms': round(response_time, 2)
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error agregando item al carrito {user_id}: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/<user_id>/remove/<int:product_id>', methods=['POST'])
+async def remove_from_cart(user_id, product_id):
+    """Eliminar item del carrito"""
+    start_time = time.time()
+    try:
+        cart = await cart_service.remove_item(user_id, product_id)
+        response_time = (time.time() - start_time) * 1000
+        
+        return jsonify({
+            'message': 'Item eliminado exitosamente',
+            'cart': cart.to_dict(),
+            '_metadata': {
+                'response_time_ms': round(response_time, 2)
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error eliminando item del carrito {user_id}: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/<user_id>/update/<int:product_id>', methods=['PUT'])
+async def update_quantity(user_id, product_id):
+    """Actualizar cantidad de un item"""
+    start_time = time.time()
+    try:
+        quantity = (await request.get_json()).get('quantity')
+        
+        if not isinstance(quantity, int) or quantity < 0:
+            return jsonify({'error': 'La cantidad debe ser un número entero positivo'}), 400
+        
+        cart = await cart_service.update_quantity(user_id, product_id, quantity)
+        response_time = (time.time() - start_time) * 1000
+        
+        if cart:
+            return jsonify({
+                'message': 'Cantidad actualizada exitosamente',
+                'cart': cart.to_dict(),
+                '_metadata': {
+                    'response_time_ms': round(response_time, 2)
+                }
+            })
+        return jsonify({'error': 'Producto no encontrado en el carrito'}), 404
+    except Exception as e:
+        logger.error(f"Error actualizando cantidad en carrito {user_id}: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/<user_id>/clear', methods=['POST'])
+async def clear_cart(user_id):
+    """Limpiar carrito"""
+    start_time = time.time()
+    try:
+        await cart_service.clear_cart(user_id)
+        response_time = (time.time() - start_time) * 1000
+        
+        return jsonify({
+            'message': 'Carrito limpiado exitosamente',
+            '_metadata': {
+                'response_time_ms': round(response_time, 2)
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error limpiando carrito {user_id}: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/stats/top-products', methods=['GET'])
+async def get_top_products():
+    """Obtener top productos más comprados, de siempre o de una ventana (?window=1h|24h|7d)"""
+    start_time = time.time()
+    try:
+        limit = int(request.args.get('limit', 10))
+        if limit > 50:  # Límite máximo
+            limit = 50
+        
+        window = request.args.get('window')
+        if window is not None and window not in cart_service.TRENDING_WINDOWS:
+            return jsonify({'error': f"window debe ser uno de: {', '.join(cart_service.TRENDING_WINDOWS)}"}), 400
+        
+        if window:
+            top_products = await cart_service.get_trending_products(window, limit)
+        else:
+            top_products = await cart_service.get_top_products(limit)
+        response_time = (time.time() - start_time) * 1000
+        
+        return jsonify({
+            'top_products': top_products,
+            'total_count': len(top_products),
+            '_metadata': {
+                'response_time_ms': round(response_time, 2),
+                'limit': limit,
+                'window': window or 'all'
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error obteniendo top productos: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/stats/cache', methods=['GET'])
+async def get_cache_stats():
+    """Obtener estadísticas del caché Redis"""
+    try:
+        stats = await cart_service.get_cache_stats()
+        return jsonify({
+            'cache_stats': stats,
+            'db_pool_stats': cart_service.get_db_pool_stats(),
+            'timestamp': time.time()
+        })
+    except Exception as e:
+        logger.error(f"Error obteniendo estadísticas de caché: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@cart_bp.route('/health', methods=['GET'])
+async def health_check():
+    """Endpoint de salud del servicio"""
+    try:
+        await db.ping()
+        
+        cache_stats = await cart_service.get_cache_stats()
+        redis_healthy = cache_stats['master']['status'] == 'connected'
+        
+        return jsonify({
+            'status': 'healthy' if redis_healthy else 'degraded',
+            'database': 'connected',
+            'redis_master': cache_stats['master']['status'],
+            'redis_slaves': [slave.get('status', 'unknown') for slave in cache_stats['slaves']],
+            'timestamp': time.time()
+        })
+    except Exception as e:
+        logger.error(f"Error en health check: {e}")
+        return jsonify({
+            'status': 'unhealthy',
+            'error': str(e),
+            'timestamp': time.time()
+        }), 500
+
+@cart_bp.route('/general-health', methods=['GET'])
+async def general_health():
+    """Health check general"""
+    return jsonify({'status': 'ok', 'service': 'ecommerce-cart'})
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+import redis
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(redis.ConnectionError):
+    """Redis se considera caído: el comando no se envía"""
+
+class CircuitBreaker:
+    """Circuit breaker para los comandos enviados a un nodo de Redis.
+    
+    - closed: los comandos pasan; `failure_threshold` errores de conexión
+      seguidos abren el circuito.
+    - open: los comandos fallan de inmediato con CircuitOpenError, sin esperar
+      timeouts. Pasados `reset_timeout` segundos pasa a half_open.
+    - half_open: se deja pasar un único comando de prueba; si responde el
+      circuito se cierra (y se llama a `on_close`), si falla vuelve a abrirse.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float,
+                 on_close: Optional[Callable[[], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_close = on_close
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened_count = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+    
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+    
+    def before_call(self) -> None:
+        """Autorizar un comando o lanzar CircuitOpenError"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError("Circuito abierto: Redis no disponible")
+    
+    def record_success(self) -> None:
+        with self._lock:
+            recovered = self._state != self.CLOSED
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+        if recovered:
+            logger.info("Circuito de Redis cerrado: conexión recuperada")
+            if self.on_close is not None:
+                self.on_close()
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._trip()
+    
+    def release_probe(self) -> None:
+        """El comando de prueba terminó sin decir nada de Redis: dejar pasar otro"""
+        with self._lock:
+            self._probing = False
+    
+    def trip(self) -> None:
+        """Abrir el circuito de inmediato (p. ej. si Redis no responde al iniciar)"""
+        with self._lock:
+            self._trip()
+    
+    def _trip(self) -> None:
+        if self._state != self.OPEN:
+            self.opened_count += 1
+            logger.warning(f"Circuito de Redis abierto por {self.reset_timeout}s tras {self._failures} fallos")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures,
+                'opened_count': self.opened_count,
+                'rejected_calls': self.rejected
+            }
+
+class GuardedPipeline(redis.client.Pipeline):
+    """Pipeline cuyo envío pasa por el circuit breaker del cliente"""
+    
+    breaker = None
+    
+    def execute(self, raise_on_error: bool = True):
+        return _guarded_call(self.breaker, super().execute, raise_on_error)
+
+class GuardedRedis(redis.Redis):
+    """Cliente de Redis cuyos comandos pasan por un circuit breaker"""
+    
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+    
+    def execute_command(self, *args, **options):
+        return _guarded_call(self.breaker, super().execute_command, *args, **options)
+    
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> GuardedPipeline:
+        pipe = GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+def _guarded_call(breaker: CircuitBreaker, call: Callable, *args, **kwargs):
+    breaker.before_call()
+    try:
+        result = call(*args, **kwargs)
+    except (redis.ConnectionError, redis.TimeoutError):
+        breaker.record_failure()
+        raise
+    except redis.RedisError:
+        # Un error de comando (WRONGTYPE, script, ...) indica que Redis responde
+        breaker.record_success()
+        raise
+    except BaseException:
+        # Otra excepción (p. ej. KeyboardInterrupt o un error al decodificar) no
+        # prueba nada; sin liberar la prueba el circuito quedaría en half_open
+        # rechazando todo
+        breaker.release_probe()
+        raise
+    breaker.record_success()
+    return result
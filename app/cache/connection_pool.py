@@ -0,0 +1,86 @@
+import threading
+import time
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+from app.config import Config
+from app.cache.circuit_breaker import CircuitBreaker, GuardedRedis
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Pool acotado de conexiones que mide la espera por una conexión libre.
+    
+    Cuando se alcanza `max_connections` las peticiones esperan hasta
+    `timeout` segundos y luego fallan con ConnectionError, en lugar de abrir
+    conexiones sin límite o quedar bloqueadas indefinidamente.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+    
+    def get_connection(self, command_name, *keys, **options):
+        start = time.monotonic()
+        try:
+            return super().get_connection(command_name, *keys, **options)
+        except Exception:
+            with self._stats_lock:
+                self.checkout_errors += 1
+            raise
+        finally:
+            waited = time.monotonic() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+    
+    def get_stats(self) -> dict:
+        """Obtener uso del pool y tiempos de espera"""
+        # La cola contiene conexiones libres y None por cada conexión aún no creada
+        idle = sum(1 for connection in list(self.pool.queue) if connection is not None)
+        created = len(self._connections)
+        in_use = created - idle
+        with self._stats_lock:
+            return {
+                'max_connections': self.max_connections,
+                'created': created,
+                'in_use': in_use,
+                'idle': idle,
+                'utilization': round(in_use / self.max_connections, 4),
+                'checkouts': self.checkouts,
+                'checkout_errors': self.checkout_errors,
+                'wait_ms_avg': round(self.wait_time_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_ms_max': round(self.wait_time_max * 1000, 3)
+            }
+
+def create_client(host: str, port: int, breaker: CircuitBreaker = None) -> redis.Redis:
+    """Crear un cliente de Redis con pool acotado, timeouts y reintentos.
+    
+    Sólo se reintenta ante ConnectionError (típicamente una conexión caída al
+    enviar el comando); un timeout no se reintenta porque el comando pudo
+    haberse ejecutado y repetir un INCRBY lo contaría dos veces. Con
+    `breaker` los comandos pasan por el circuit breaker.
+    """
+    pool = InstrumentedConnectionPool(
+        host=host,
+        port=port,
+        max_connections=Config.REDIS_MAX_CONNECTIONS,
+        timeout=Config.REDIS_POOL_TIMEOUT,
+        socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=Config.REDIS_SOCKET_KEEPALIVE,
+        retry=Retry(
+            ExponentialBackoff(cap=Config.REDIS_RETRY_BACKOFF_CAP, base=Config.REDIS_RETRY_BACKOFF_BASE),
+            Config.REDIS_RETRY_ATTEMPTS,
+            supported_errors=(redis.ConnectionError,)
+        ),
+        retry_on_error=[redis.ConnectionError],
+        decode_responses=True,
+        health_check_interval=30
+    )
+    if breaker is not None:
+        return GuardedRedis(connection_pool=pool, breaker=breaker)
+    return redis.Redis(connection_pool=pool)
@@ -1,80 +1,766 @@
 import redis
 import json
 import logging
-from typing import Optional, Any, List
+import math
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Any, List, Callable, Tuple, Dict, Union, Iterator
+from redis.client import NEVER_DECODE
 from app.config import Config
+from app.cache.circuit_breaker import CircuitBreaker
+from app.cache.connection_pool import InstrumentedConnectionPool, create_client
+from app.cache.replica_router import Replica, ReplicaRouter
+
+try:
+    import msgpack
+except ImportError:  # Dependencia opcional: sólo se usa con CACHE_CODEC=msgpack
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
+# Nivel de consistencia de lectura de la petición en curso (None: el de Config)
+_read_consistency = ContextVar('read_consistency', default=None)
+
+class LocalCache:
+    """Caché LRU en memoria del proceso con expiración por TTL (L1)"""
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Obtener valor si existe y no ha expirado.
+        
+        Los valores se comparten entre hilos, por lo que deben tratarse
+        como de solo lectura.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        """Guardar valor, expulsando el menos usado si se supera el tamaño"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key: str) -> None:
+        """Invalidar una clave"""
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+    
+    def clear(self) -> None:
+        """Invalidar todas las claves"""
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+    
+    def get_stats(self) -> dict:
+        """Obtener estadísticas del caché local"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+class _Flight:
+    """Cálculo en curso de una clave, compartido por las peticiones concurrentes"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class JsonCodec:
+    """Codec JSON, el formato original de los valores cacheados"""
+    codec_id = 1
+    name = 'json'
+    
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=str).encode('utf-8')
+    
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+class MsgpackCodec:
+    """Codec binario MessagePack: más compacto y rápido de decodificar que JSON"""
+    codec_id = 2
+    name = 'msgpack'
+    
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=str, use_bin_type=True)
+    
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+class CacheSerializer:
+    """Serializar valores con el codec configurado y leer cualquier formato.
+    
+    Los valores nuevos llevan una cabecera de 4 bytes: MAGIC (0x00), versión
+    del formato, id del codec y flags (bit 0: comprimido con zlib). El JSON sin
+    comprimir se escribe sin cabecera, igual que antes, y todo valor que no
+    empieza con MAGIC se lee como JSON; así procesos con distinto codec pueden
+    convivir durante un despliegue.
+    """
+    MAGIC = 0x00
+    FORMAT_VERSION = 1
+    HEADER_SIZE = 4
+    FLAG_ZLIB = 0x01
+    
+    def __init__(self, codec: str, compression_threshold: int, compression_level: int):
+        self.codecs = {JsonCodec.codec_id: JsonCodec()}
+        if msgpack is not None:
+            self.codecs[MsgpackCodec.codec_id] = MsgpackCodec()
+        
+        by_name = {c.name: c for c in self.codecs.values()}
+        self.codec = by_name.get(codec)
+        if self.codec is None:
+            logger.warning(f"Codec de caché '{codec}' no disponible, usando json")
+            self.codec = by_name['json']
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+    
+    def dumps(self, value: Any) -> bytes:
+        """Serializar un valor, comprimiéndolo si supera el umbral"""
+        body = self.codec.dumps(value)
+        flags = 0
+        if self.compression_threshold and len(body) >= self.compression_threshold:
+            body = zlib.compress(body, self.compression_level)
+            flags |= self.FLAG_ZLIB
+        if flags == 0 and self.codec.codec_id == JsonCodec.codec_id:
+            return body
+        return bytes((self.MAGIC, self.FORMAT_VERSION, self.codec.codec_id, flags)) + body
+    
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Deserializar un valor en cualquiera de los formatos conocidos"""
+        if isinstance(data, str) or data[0] != self.MAGIC:
+            return json.loads(data)
+        
+        format_version, codec_id, flags = data[1], data[2], data[3]
+        if format_version != self.FORMAT_VERSION:
+            raise ValueError(f"Versión de formato de caché desconocida: {format_version}")
+        codec = self.codecs.get(codec_id)
+        if codec is None:
+            raise ValueError(f"Codec de caché no disponible: {codec_id}")
+        
+        body = data[self.HEADER_SIZE:]
+        if flags & self.FLAG_ZLIB:
+            body = zlib.decompress(body)
+        return codec.loads(body)
+
 class RedisCache:
+    LOCK_PREFIX = "lock:"
+    VERSION_SUFFIX = ":version"
+    
+    # eventual: réplicas; session: lo escrito recientemente se lee del master o
+    # de una réplica que ya lo replicó; strong: siempre del master, sin L1
+    CONSISTENCY_LEVELS = ('eventual', 'session', 'strong')
+    # Offset de escrituras avisadas por otros procesos: se desconoce, leer del master
+    UNKNOWN_OFFSET = -1
+    
+    # Rangos de TTL restante para audit_ttls (límite superior en segundos)
+    TTL_BUCKETS = [('<1m', 60), ('<10m', 600), ('<1h', 3600), ('<1d', 86400), ('>=1d', None)]
+    
+    # Escribe valor y versión sólo si la versión es más nueva que la guardada:
+    # una escritura tardía con datos viejos nunca pisa a una más reciente
+    SET_IF_NEWER_SCRIPT = """
+    local current = tonumber(redis.call('GET', KEYS[2]) or '-1')
+    if tonumber(ARGV[2]) <= current then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return 1
+    """
+    
+    # Valor y versión en una sola lectura atómica (false: clave ausente)
+    GET_VERSIONED_SCRIPT = """
+    return {redis.call('GET', KEYS[1]) or false, redis.call('GET', KEYS[2]) or false}
+    """
+    
     def __init__(self):
-        self.master = None
-        self.slaves = []
-        self.current_slave = 0
-        self._connect()
+        # La conexión se establece en el primer uso (ver `master`) o con `warm_up`
+        self._master = None
+        self._router = None
+        self._connected = False
+        self._connect_lock = threading.Lock()
+        # Identificador del proceso para ignorar sus propias invalidaciones
+        self.instance_id = uuid.uuid4().hex
+        self.local = None
+        if Config.LOCAL_CACHE_ENABLED:
+            self.local = LocalCache(Config.LOCAL_CACHE_MAX_SIZE, Config.LOCAL_CACHE_TTL)
+        self._pubsub = None
+        self._pubsub_thread = None
+        # Single-flight: cálculos en curso y duración del último cálculo por clave
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._load_times = LocalCache(Config.LOCAL_CACHE_MAX_SIZE, Config.CACHE_EXPIRATION)
+        # Read-your-writes: offset de replicación del master tras escribir cada clave
+        self._write_offsets = None
+        if Config.READ_YOUR_WRITES_WINDOW > 0:
+            self._write_offsets = LocalCache(Config.LOCAL_CACHE_MAX_SIZE, Config.READ_YOUR_WRITES_WINDOW)
+        self._read_stats = {'replica': 0, 'master': 0, 'replica_lagging': 0}
+        self._read_stats_lock = threading.Lock()
+        self.serializer = CacheSerializer(
+            Config.CACHE_CODEC,
+            Config.CACHE_COMPRESSION_THRESHOLD,
+            Config.CACHE_COMPRESSION_LEVEL
+        )
+        # Modo degradado: con el master caído se sirve desde la fuente de datos y
+        # se recuerdan las claves que no se pudieron actualizar en Redis
+        self.breaker = CircuitBreaker(
+            Config.CACHE_BREAKER_FAILURE_THRESHOLD,
+            Config.CACHE_BREAKER_RESET_TIMEOUT,
+            on_close=self._on_recovered
+        )
+        self._dirty_keys = set()
+        self._dirty_lock = threading.Lock()
+    
+    @property
+    def master(self) -> redis.Redis:
+        """Cliente del master; el primer acceso establece las conexiones"""
+        if not self._connected:
+            self._ensure_connected()
+        return self._master
+    
+    @property
+    def router(self) -> ReplicaRouter:
+        """Router de lecturas entre réplicas; el primer acceso establece las conexiones"""
+        if not self._connected:
+            self._ensure_connected()
+        return self._router
+    
+    def _ensure_connected(self) -> None:
+        with self._connect_lock:
+            if not self._connected:
+                self._connect()
+    
+    def warm_up(self) -> threading.Thread:
+        """Conectar en segundo plano para que la primera petición no espere el handshake"""
+        thread = threading.Thread(target=self._ensure_connected, name='redis-warm-up', daemon=True)
+        thread.start()
+        return thread
     
     def _connect(self):
         """Conectar a Redis master y slaves"""
+        start = time.monotonic()
         try:
-            # Conexión al master (para escrituras)
-            self.master = redis.Redis(
-                host=Config.REDIS_MASTER_HOST,
-                port=Config.REDIS_MASTER_PORT,
-                decode_responses=True,
-                health_check_interval=30
-            )
-            self.master.ping()
-            logger.info("Conectado a Redis Master")
+            # Conexión al master (para escrituras). Crear los clientes no abre
+            # sockets: las conexiones se abren al enviar el primer comando
+            self._master = create_client(Config.REDIS_MASTER_HOST, Config.REDIS_MASTER_PORT, breaker=self.breaker)
+            self._set_if_newer = self._master.register_script(self.SET_IF_NEWER_SCRIPT)
             
-            # Conexiones a slaves (para lecturas)
+            # Conexiones a slaves (para lecturas). Se sondean en segundo plano:
+            # hasta que respondan las lecturas van al master
             slave_configs = [
-                (Config.REDIS_SLAVE1_HOST, Config.REDIS_SLAVE1_PORT),
-                (Config.REDIS_SLAVE2_HOST, Config.REDIS_SLAVE2_PORT)
+                (Config.REDIS_SLAVE1_HOST, Config.REDIS_SLAVE1_PORT, Config.REDIS_SLAVE1_WEIGHT),
+                (Config.REDIS_SLAVE2_HOST, Config.REDIS_SLAVE2_PORT, Config.REDIS_SLAVE2_WEIGHT)
             ]
+            replicas = [
+                Replica(create_client(host, port), host, port, weight)
+                for host, port, weight in slave_configs
+            ]
+            self._router = ReplicaRouter(
+                replicas,
+                fallback=self._master,
+                policy=Config.REDIS_READ_POLICY,
+                max_errors=Config.REDIS_REPLICA_MAX_ERRORS,
+                probe_interval=Config.REDIS_REPLICA_PROBE_INTERVAL
+            )
+            self._connected = True
+            self._router.start()
             
-            for host, port in slave_configs:
-                try:
-                    slave = redis.Redis(
-                        host=host,
-                        port=port,
-                        decode_responses=True,
-                        health_check_interval=30
-                    )
-                    slave.ping()
-                    self.slaves.append(slave)
-                    logger.info(f"Conectado a Redis Slave: {host}:{port}")
-                except Exception as e:
-                    logger.warning(f"No se pudo conectar al slave {host}:{port}: {e}")
-            
-            # Si no hay slaves disponibles, usar master para lecturas
-            if not self.slaves:
-                self.slaves = [self.master]
-                logger.info("Usando master para lecturas (no hay slaves disponibles)")
+            try:
+                self._master.ping()
+                logger.info(f"Conectado a Redis Master en {(time.monotonic() - start) * 1000:.1f}ms")
+                self._start_invalidation_listener()
+            except redis.ConnectionError as e:
+                # La app funciona igual: el circuito abierto se probará periódicamente
+                self.breaker.trip()
+                logger.error(f"Redis Master no disponible, funcionando en modo degradado: {e}")
                 
         except Exception as e:
             logger.error(f"Error conectando a Redis: {e}")
             raise
     
-    def _get_read_connection(self) -> redis.Redis:
-        """Obtener conexión para lectura (round-robin entre slaves)"""
-        if not self.slaves:
-            return self.master
+    def _start_invalidation_listener(self):
+        """Suscribirse al canal de invalidaciones para mantener coherente el L1"""
+        if self._pubsub_thread is not None or (self.local is None and self._write_offsets is None):
+            return
+        self._pubsub = self.master.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{Config.CACHE_INVALIDATION_CHANNEL: self._handle_invalidation})
+        self._pubsub_thread = self._pubsub.run_in_thread(
+            sleep_time=1,
+            daemon=True,
+            exception_handler=self._handle_pubsub_error
+        )
+        logger.info(f"Escuchando invalidaciones en {Config.CACHE_INVALIDATION_CHANNEL}")
+    
+    def _handle_invalidation(self, message: dict):
+        """Invalidar en el L1 las claves escritas por otros procesos"""
+        try:
+            payload = json.loads(message['data'])
+            if payload.get('origin') == self.instance_id:
+                return
+            for key in payload.get('keys', []):
+                if self.local is not None:
+                    self.local.delete(key)
+                if self._write_offsets is not None:
+                    self._write_offsets.set(key, self.UNKNOWN_OFFSET)
+        except Exception as e:
+            logger.error(f"Error procesando invalidación: {e}")
+    
+    def _handle_pubsub_error(self, error: Exception, pubsub, thread):
+        """Ante una desconexión se pudieron perder mensajes: vaciar el L1"""
+        logger.warning(f"Error en el canal de invalidaciones: {error}")
+        if self.local is not None:
+            self.local.clear()
+        time.sleep(1)
+    
+    def _publish_invalidation(self, pipe, keys: List[str]):
+        """Encolar en el pipeline el aviso de invalidación para otros procesos"""
+        if self.local is None and self._write_offsets is None:
+            return
+        message = json.dumps({'origin': self.instance_id, 'keys': keys})
+        pipe.publish(Config.CACHE_INVALIDATION_CHANNEL, message)
+    
+    @property
+    def available(self) -> bool:
+        """False mientras el circuito del master está abierto (modo degradado)"""
+        return self.master is not None and self.breaker.state != CircuitBreaker.OPEN
+    
+    def mark_dirty(self, keys: List[str]) -> None:
+        """Registrar claves cuyo valor en Redis quedó desactualizado.
+        
+        Se eliminan de Redis en cuanto el master vuelve a responder. El
+        registro es del proceso: si éste se reinicia durante la caída, esas
+        claves expiran por TTL. También se quitan del L1, que de otro modo
+        seguiría sirviendo el valor anterior.
+        """
+        if self.local is not None:
+            for key in keys:
+                self.local.delete(key)
+        with self._dirty_lock:
+            if len(self._dirty_keys) + len(keys) > Config.CACHE_DIRTY_KEYS_MAX:
+                logger.error(f"Demasiadas claves pendientes de invalidar, se descartan {len(keys)}")
+                return
+            self._dirty_keys.update(keys)
+    
+    def _flush_dirty(self) -> None:
+        """Eliminar de Redis las claves que no se pudieron actualizar durante la caída"""
+        with self._dirty_lock:
+            keys = list(self._dirty_keys)
+            self._dirty_keys.clear()
+        if not keys:
+            return
+        
+        for batch in self._batched(iter(keys), Config.CACHE_SCAN_BATCH_SIZE):
+            if self.local is not None:
+                for key in batch:
+                    self.local.delete(key)
+            try:
+                pipe = self.master.pipeline(transaction=False)
+                pipe.delete(*batch)
+                self._publish_invalidation(pipe, batch)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Error invalidando {len(batch)} claves pendientes: {e}")
+                self.mark_dirty(batch)
+                return
+        logger.info(f"Invalidadas {len(keys)} claves escritas durante la caída de Redis")
+    
+    def _on_recovered(self) -> None:
+        """Al cerrarse el circuito: resincronizar en segundo plano"""
+        threading.Thread(target=self._resync, name='redis-resync', daemon=True).start()
+    
+    def _resync(self) -> None:
+        try:
+            # Las invalidaciones de otros procesos se perdieron durante la caída
+            if self.local is not None:
+                self.local.clear()
+            self._start_invalidation_listener()
+            self._flush_dirty()
+        except Exception as e:
+            logger.error(f"Error resincronizando tras la recuperación de Redis: {e}")
+    
+    def _execute_write(self, pipe, keys: List[str]) -> list:
+        """Ejecutar un pipeline de escritura sobre `keys` en el master.
+        
+        Agrega el aviso de invalidación y, para read-your-writes, un ROLE que
+        retorna el offset de replicación del master tras la escritura, sin
+        round-trips adicionales. Retorna los resultados de los comandos del
+        llamador. Si Redis no responde, las claves quedan pendientes de
+        invalidar y se quitan del L1.
+        """
+        self._publish_invalidation(pipe, keys)
+        track = self._write_offsets is not None
+        if track:
+            pipe.execute_command('ROLE')
+        try:
+            results = pipe.execute(raise_on_error=False)
+        except (redis.ConnectionError, redis.TimeoutError):
+            if self.local is not None:
+                for key in keys:
+                    self.local.delete(key)
+            self.mark_dirty(keys)
+            raise
+        if self._dirty_keys:
+            # Lo recién escrito reemplaza al valor desactualizado
+            with self._dirty_lock:
+                self._dirty_keys.difference_update(keys)
+            self._flush_dirty()
+        
+        role = results.pop() if track else None
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        
+        if track:
+            if isinstance(role, Exception):
+                logger.warning(f"No se pudo obtener el offset de replicación: {role}")
+                offset = self.UNKNOWN_OFFSET
+            else:
+                offset = role[1]
+            for key in keys:
+                self._write_offsets.set(key, offset)
+        return results
+    
+    def run_write_script(self, script, keys: List[str], args: list, invalidate: List[str]) -> Any:
+        """Ejecutar un script Lua de escritura en el master.
+        
+        Las claves de `invalidate` se tratan como las de cualquier escritura:
+        se quitan del L1, se avisan a otros procesos y cuentan para
+        read-your-writes. Los errores se propagan al llamador.
+        """
+        if self.local is not None:
+            for key in invalidate:
+                self.local.delete(key)
+        pipe = self.master.pipeline(transaction=False)
+        script(keys=keys, args=args, client=pipe)
+        return self._execute_write(pipe, invalidate)[0]
+    
+    def get_consistency(self) -> str:
+        """Nivel de consistencia de lectura vigente"""
+        return _read_consistency.get() or Config.CACHE_READ_CONSISTENCY
+    
+    def set_consistency(self, level: str):
+        """Fijar el nivel de consistencia del contexto actual; retorna el token para restaurarlo"""
+        if level not in self.CONSISTENCY_LEVELS:
+            raise ValueError(f"Nivel de consistencia inválido: {level}")
+        return _read_consistency.set(level)
+    
+    def reset_consistency(self, token) -> None:
+        """Restaurar el nivel de consistencia anterior a `set_consistency`"""
+        _read_consistency.reset(token)
+    
+    @contextmanager
+    def consistency(self, level: str) -> Iterator[None]:
+        """Leer con el nivel de consistencia `level` dentro del bloque"""
+        token = self.set_consistency(level)
+        try:
+            yield
+        finally:
+            self.reset_consistency(token)
+    
+    def _required_offset(self, keys: List[str]) -> Optional[int]:
+        """Offset que debe tener una réplica para leer `keys`.
+        
+        None si cualquier réplica sirve; UNKNOWN_OFFSET si hay que leer del master.
+        """
+        level = self.get_consistency()
+        if level == 'strong':
+            return self.UNKNOWN_OFFSET
+        if level == 'eventual' or self._write_offsets is None:
+            return None
+        
+        offsets = [self._write_offsets.get(key) for key in keys]
+        offsets = [offset for offset in offsets if offset is not None]
+        if not offsets:
+            return None
+        if self.UNKNOWN_OFFSET in offsets:
+            return self.UNKNOWN_OFFSET
+        return max(offsets)
+    
+    def _count_read(self, source: str) -> None:
+        with self._read_stats_lock:
+            self._read_stats[source] += 1
+    
+    @contextmanager
+    def _read_connection(self) -> Iterator[redis.Redis]:
+        """Conexión para lectura que registra latencia y errores de la réplica"""
+        with self.router.connection() as conn:
+            yield conn
+    
+    @staticmethod
+    def _get_raw(conn, key: str):
+        """GET sin decodificar a texto: los valores pueden ser binarios"""
+        return conn.execute_command('GET', key, **{NEVER_DECODE: []})
+    
+    def _fetch(self, keys: List[str], with_ttl: bool = False) -> Tuple[List[Optional[bytes]], List[Optional[float]]]:
+        """Leer valores sin deserializar (y su TTL) respetando la consistencia.
+        
+        Si alguna clave se escribió hace poco, la réplica elegida informa su
+        offset con ROLE en el mismo round-trip; si aún no alcanza el offset de
+        la escritura, la lectura se repite en el master.
+        """
+        min_offset = self._required_offset(keys)
+        if min_offset == self.UNKNOWN_OFFSET:
+            self._count_read('master')
+            return self._fetch_from(self.master, keys, with_ttl)[:2]
+        
+        with self._read_connection() as conn:
+            check_offset = min_offset is not None and conn is not self.master
+            values, ttls, replica_offset = self._fetch_from(conn, keys, with_ttl, check_offset)
+        
+        if check_offset and replica_offset < min_offset:
+            self._count_read('replica_lagging')
+            return self._fetch_from(self.master, keys, with_ttl)[:2]
+        self._count_read('master' if conn is self.master else 'replica')
+        return values, ttls
+    
+    def _fetch_from(self, conn: redis.Redis, keys: List[str], with_ttl: bool,
+                    check_offset: bool = False) -> Tuple[list, list, Optional[int]]:
+        """MGET (con PTTL y ROLE opcionales) en un solo round-trip"""
+        pipe = conn.pipeline(transaction=False)
+        if check_offset:
+            pipe.execute_command('ROLE')
+        pipe.execute_command('MGET', *keys, **{NEVER_DECODE: []})
+        if with_ttl:
+            for key in keys:
+                pipe.pttl(key)
+        results = pipe.execute()
         
-        connection = self.slaves[self.current_slave]
-        self.current_slave = (self.current_slave + 1) % len(self.slaves)
-        return connection
+        replica_offset = None
+        if check_offset:
+            # Réplica: ['slave', host, port, estado, offset]
+            role = results.pop(0)
+            replica_offset = role[4] if role[0] == 'slave' and role[3] == 'connected' else -1
+        values = results[0]
+        ttls = [pttl / 1000 if pttl and pttl > 0 else None for pttl in results[1:]] or [None] * len(keys)
+        return values, ttls, replica_offset
+    
+    def _use_local(self, available: bool) -> bool:
+        """Si la lectura puede servirse desde el L1.
+        
+        Sin Redis no llegan invalidaciones de otros procesos, así que en modo
+        degradado el L1 sólo se usa si CACHE_DEGRADED_LOCAL_CACHE lo permite.
+        """
+        if self.local is None or self.get_consistency() == 'strong':
+            return False
+        return available or Config.CACHE_DEGRADED_LOCAL_CACHE
     
     def get(self, key: str) -> Optional[Any]:
-        """Obtener valor del caché"""
+        """Obtener valor del caché (primero L1, luego réplicas de Redis)"""
+        return self._read(key)[0]
+    
+    def _read(self, key: str, with_ttl: bool = False) -> Tuple[Optional[Any], Optional[float]]:
+        """Leer valor y, opcionalmente, su TTL restante en segundos"""
         try:
-            conn = self._get_read_connection()
-            value = conn.get(key)
+            available = self.available
+            use_local = self._use_local(available)
+            if use_local:
+                value = self.local.get(key)
+                if value is not None:
+                    return value, None
+            if not available or key in self._dirty_keys:
+                return None, None
+            
+            (value,), (ttl,) = self._fetch([key], with_ttl)
             if value:
-                return json.loads(value)
-            return None
+                data = self.serializer.loads(value)
+                if self.local is not None:
+                    self.local.set(key, data)
+                return data, ttl
+            return None, None
         except Exception as e:
             logger.error(f"Error obteniendo clave {key}: {e}")
-            return None
+            return None, None
+    
+    def get_or_load(self, key: str, loader: Callable[[], Any], expiration: int = None,
+                    version: Callable[[Any], int] = None) -> Any:
+        """Obtener valor del caché o calcularlo una única vez ante un fallo.
+        
+        Las peticiones concurrentes del proceso esperan al cálculo en curso y
+        entre procesos se coordinan con un lock en Redis, de modo que un fallo
+        bajo carga produce una sola llamada a `loader`. Con el refresco
+        anticipado (XFetch) una petición recalcula poco antes de expirar
+        mientras las demás siguen recibiendo el valor vigente. Si se indica
+        `version`, el valor calculado se guarda con `set_versioned`.
+        """
+        if expiration is None:
+            expiration = Config.CACHE_EXPIRATION
+        
+        def store(value: Any) -> None:
+            if version is None:
+                self.set(key, value, expiration)
+            else:
+                self.set_versioned(key, value, version(value), expiration)
+        
+        if not self.available:
+            return self._load_degraded(key, loader, expiration)
+        
+        value, ttl = self._read(key, with_ttl=Config.CACHE_EARLY_REFRESH_ENABLED)
+        if value is None:
+            return self._single_flight(key, loader, store)
+        
+        if self._should_refresh_early(key, ttl):
+            logger.info(f"Refresco anticipado de {key} (TTL restante {ttl:.1f}s)")
+            return self._single_flight(key, loader, store, stale=value)
+        return value
+    
+    def _load_degraded(self, key: str, loader: Callable[[], Any], expiration: int) -> Any:
+        """Redis no disponible: calcular desde la fuente, opcionalmente con el L1"""
+        use_local = self._use_local(False)
+        if use_local:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+        
+        def store(value: Any) -> None:
+            if use_local:
+                # Copia propia: el valor retornado al llamador no se comparte
+                self.local.set(key, self.serializer.loads(self.serializer.dumps(value)), expiration)
+        
+        return self._single_flight(key, loader, store)
+    
+    def _should_refresh_early(self, key: str, ttl: Optional[float]) -> bool:
+        """Decidir probabilísticamente si recalcular antes de que expire (XFetch)"""
+        if ttl is None or not Config.CACHE_EARLY_REFRESH_ENABLED:
+            return False
+        delta = self._load_times.get(key)
+        if not delta:
+            return False
+        return delta * Config.CACHE_EARLY_REFRESH_BETA * -math.log(1.0 - random.random()) >= ttl
+    
+    def _single_flight(self, key: str, loader: Callable[[], Any], store: Callable[[Any], None],
+                       stale: Any = None) -> Any:
+        """Ejecutar `loader` una sola vez por clave dentro del proceso"""
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+        
+        if not leader:
+            # Mientras otro hilo refresca se sirve el valor vigente
+            if stale is not None:
+                return stale
+            if flight.event.wait(Config.CACHE_LOCK_WAIT):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            logger.warning(f"Timeout esperando el cálculo de {key}, calculando localmente")
+            return loader()
+        
+        try:
+            flight.value = self._load_with_lock(key, loader, store, stale)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+    
+    def _load_with_lock(self, key: str, loader: Callable[[], Any], store: Callable[[Any], None],
+                        stale: Any = None) -> Any:
+        """Ejecutar `loader` coordinando con otros procesos mediante un lock en Redis"""
+        lock = None
+        acquired = False
+        if self.available:
+            try:
+                lock = self.master.lock(
+                    f"{self.LOCK_PREFIX}{key}",
+                    timeout=Config.CACHE_LOCK_TIMEOUT,
+                    blocking=False
+                )
+                acquired = lock.acquire()
+            except Exception as e:
+                logger.error(f"Error adquiriendo lock de {key}: {e}")
+                lock = None
+        
+        if lock is not None and not acquired:
+            # Otro proceso está calculando: servir el valor vigente o esperar el suyo
+            if stale is not None:
+                return stale
+            value = self._wait_for_value(key)
+            if value is not None:
+                return value
+            logger.warning(f"Timeout esperando {key} de otro proceso, calculando sin lock")
+        
+        try:
+            start = time.monotonic()
+            value = loader()
+            self._load_times.set(key, time.monotonic() - start)
+            store(value)
+            return value
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception as e:
+                    logger.warning(f"Error liberando lock de {key}: {e}")
+    
+    def _wait_for_value(self, key: str) -> Optional[Any]:
+        """Esperar a que el proceso que tiene el lock publique el valor"""
+        lock_key = f"{self.LOCK_PREFIX}{key}"
+        deadline = time.monotonic() + Config.CACHE_LOCK_WAIT
+        try:
+            while time.monotonic() < deadline:
+                # Se lee del master: las réplicas pueden no tener aún el valor
+                pipe = self.master.pipeline(transaction=False)
+                self._get_raw(pipe, key)
+                pipe.exists(lock_key)
+                value, locked = pipe.execute()
+                if value:
+                    return self.serializer.loads(value)
+                if not locked:
+                    return None
+                time.sleep(Config.CACHE_LOCK_POLL_INTERVAL)
+        except Exception as e:
+            logger.error(f"Error esperando clave {key}: {e}")
+        return None
     
     def set(self, key: str, value: Any, expiration: int = None) -> bool:
         """Establecer valor en el caché"""
@@ -82,39 +768,325 @@ class RedisCache:
             if expiration is None:
                 expiration = Config.CACHE_EXPIRATION
             
-            serialized_value = json.dumps(value, default=str)
-            self.master.setex(key, expiration, serialized_value)
+            serialized_value = self.serializer.dumps(value)
+            pipe = self.master.pipeline(transaction=False)
+            pipe.setex(key, expiration, serialized_value)
+            self._execute_write(pipe, [key])
+            
+            if self.local is not None:
+                self.local.set(key, self.serializer.loads(serialized_value), expiration)
             return True
         except Exception as e:
             logger.error(f"Error estableciendo clave {key}: {e}")
             return False
     
+    def get_versioned(self, key: str) -> Tuple[Optional[Any], Optional[int]]:
+        """Leer del master un valor junto con su versión (sin pasar por el L1)"""
+        if not self.available:
+            return None, None
+        try:
+            # Un pipeline dejaría pasar otra escritura entre ambos GET
+            value, version = self.master.execute_command(
+                'EVAL', self.GET_VERSIONED_SCRIPT, 2, key, f"{key}{self.VERSION_SUFFIX}",
+                **{NEVER_DECODE: []}
+            )
+            if not value:
+                return None, None
+            return self.serializer.loads(value), int(version) if version is not None else None
+        except Exception as e:
+            logger.error(f"Error obteniendo clave versionada {key}: {e}")
+            return None, None
+    
+    def set_versioned(self, key: str, value: Any, version: int, expiration: int = None) -> bool:
+        """Establecer valor sólo si `version` es más nueva que la cacheada"""
+        return self.mset_versioned({key: (value, version)}, expiration).get(key, False)
+    
+    def mset_versioned(self, mapping: Dict[str, Tuple[Any, int]], expiration: int = None) -> Dict[str, bool]:
+        """Establecer varios valores versionados en un round-trip.
+        
+        Retorna, por clave, si el valor se escribió o si ya había una
+        versión igual o más nueva.
+        """
+        if not mapping:
+            return {}
+        try:
+            if expiration is None:
+                expiration = Config.CACHE_EXPIRATION
+            
+            serialized = {key: self.serializer.dumps(value) for key, (value, _) in mapping.items()}
+            pipe = self.master.pipeline(transaction=False)
+            for key, (_, version) in mapping.items():
+                self._set_if_newer(
+                    keys=[key, f"{key}{self.VERSION_SUFFIX}"],
+                    args=[serialized[key], version, expiration],
+                    client=pipe
+                )
+            results = self._execute_write(pipe, list(mapping))
+            applied = dict(zip(mapping, (bool(result) for result in results)))
+            
+            if self.local is not None:
+                for key, written in applied.items():
+                    if written:
+                        self.local.set(key, self.serializer.loads(serialized[key]), expiration)
+                    else:
+                        self.local.delete(key)
+            return applied
+        except Exception as e:
+            logger.error(f"Error estableciendo {len(mapping)} claves versionadas: {e}")
+            return {}
+    
     def delete(self, key: str) -> bool:
         """Eliminar valor del caché"""
         try:
-            self.master.delete(key)
+            if self.local is not None:
+                self.local.delete(key)
+            # Si la clave es versionada su versión se conserva, de modo que
+            # las escrituras tardías con datos viejos se sigan rechazando
+            pipe = self.master.pipeline(transaction=False)
+            pipe.delete(key)
+            self._execute_write(pipe, [key])
             return True
         except Exception as e:
             logger.error(f"Error eliminando clave {key}: {e}")
             return False
     
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Obtener varios valores en un round-trip (None para los ausentes)"""
+        values = [None] * len(keys)
+        try:
+            available = self.available
+            use_local = self._use_local(available)
+            missing = []
+            for i, key in enumerate(keys):
+                value = self.local.get(key) if use_local else None
+                if value is None:
+                    if key not in self._dirty_keys:
+                        missing.append(i)
+                else:
+                    values[i] = value
+            
+            if missing and available:
+                raw_values, _ = self._fetch([keys[i] for i in missing])
+                for i, raw in zip(missing, raw_values):
+                    if raw:
+                        values[i] = self.serializer.loads(raw)
+                        if self.local is not None:
+                            self.local.set(keys[i], values[i])
+        except Exception as e:
+            logger.error(f"Error obteniendo {len(keys)} claves: {e}")
+        return values
+    
+    def mset(self, mapping: Dict[str, Any], expiration: Union[int, Dict[str, int]] = None) -> bool:
+        """Establecer varios valores en un round-trip.
+        
+        `expiration` puede ser un TTL común o un diccionario con el TTL de
+        cada clave; las claves sin TTL usan CACHE_EXPIRATION.
+        """
+        if not mapping:
+            return True
+        try:
+            if not isinstance(expiration, dict):
+                expiration = dict.fromkeys(mapping, expiration)
+            
+            serialized = {key: self.serializer.dumps(value) for key, value in mapping.items()}
+            pipe = self.master.pipeline(transaction=False)
+            for key, serialized_value in serialized.items():
+                pipe.setex(key, expiration.get(key) or Config.CACHE_EXPIRATION, serialized_value)
+            self._execute_write(pipe, list(serialized))
+            
+            if self.local is not None:
+                for key, serialized_value in serialized.items():
+                    ttl = expiration.get(key) or Config.CACHE_EXPIRATION
+                    self.local.set(key, self.serializer.loads(serialized_value), ttl)
+            return True
+        except Exception as e:
+            logger.error(f"Error estableciendo {len(mapping)} claves: {e}")
+            return False
+    
+    def delete_many(self, keys: List[str]) -> int:
+        """Eliminar varias claves en un round-trip; retorna cuántas existían"""
+        if not keys:
+            return 0
+        try:
+            if self.local is not None:
+                for key in keys:
+                    self.local.delete(key)
+            pipe = self.master.pipeline(transaction=False)
+            pipe.delete(*keys)
+            return self._execute_write(pipe, list(keys))[0]
+        except Exception as e:
+            logger.error(f"Error eliminando {len(keys)} claves: {e}")
+            return 0
+    
+    def incr_many(self, amounts: Dict[str, int]) -> Dict[str, int]:
+        """Incrementar varios contadores en un round-trip"""
+        if not amounts:
+            return {}
+        try:
+            pipe = self.master.pipeline(transaction=False)
+            for key, amount in amounts.items():
+                pipe.incrby(key, amount)
+            return dict(zip(amounts, pipe.execute()))
+        except Exception as e:
+            logger.error(f"Error incrementando {len(amounts)} contadores: {e}")
+            return {}
+    
+    @contextmanager
+    def batch(self, transaction: bool = False) -> Iterator[redis.client.Pipeline]:
+        """Agrupar comandos sobre el master y enviarlos al salir del bloque.
+        
+        Con `transaction=True` se ejecutan en MULTI/EXEC. Si el bloque lanza
+        una excepción los comandos se descartan. Estos comandos no invalidan
+        el caché local: para claves leídas con `get` usar `mset`/`delete_many`.
+        """
+        pipe = self.master.pipeline(transaction=transaction)
+        try:
+            yield pipe
+            pipe.execute()
+        finally:
+            pipe.reset()
+    
+    def pipeline(self, transaction: bool = True) -> redis.client.Pipeline:
+        """Pipeline sobre el master para agrupar escrituras en un round-trip"""
+        return self.master.pipeline(transaction=transaction)
+    
+    @contextmanager
+    def read_pipeline(self) -> Iterator[redis.client.Pipeline]:
+        """Pipeline sobre una réplica para agrupar lecturas en un round-trip.
+        
+        Debe ejecutarse dentro del bloque `with`: así el router registra la
+        latencia o el error de conexión de la réplica elegida.
+        """
+        with self._read_connection() as conn:
+            with conn.pipeline(transaction=False) as pipe:
+                yield pipe
+    
+    def zrevrange(self, key: str, start: int, end: int, withscores: bool = False) -> list:
+        """Obtener miembros de un sorted set de mayor a menor puntaje"""
+        try:
+            with self._read_connection() as conn:
+                return conn.zrevrange(key, start, end, withscores=withscores)
+        except Exception as e:
+            logger.error(f"Error obteniendo rango de {key}: {e}")
+            return []
+    
     def exists(self, key: str) -> bool:
         """Verificar si existe una clave"""
         try:
-            conn = self._get_read_connection()
-            return conn.exists(key) > 0
+            with self._read_connection() as conn:
+                return conn.exists(key) > 0
         except Exception as e:
             logger.error(f"Error verificando existencia de {key}: {e}")
             return False
     
-    def get_keys_pattern(self, pattern: str) -> List[str]:
-        """Obtener claves que coincidan con un patrón"""
+    def get_keys_pattern(self, pattern: str, count: int = None, conn: redis.Redis = None) -> Iterator[str]:
+        """Iterar las claves que coincidan con un patrón.
+        
+        Usa SCAN en lugar de KEYS: cada llamada revisa unas `count` claves,
+        por lo que Redis no queda bloqueado en instancias grandes. Una clave
+        puede aparecer más de una vez si el keyspace cambia durante el recorrido.
+        
+        Por defecto recorre el master: un cursor de SCAN no sirve en otra
+        réplica y un recorrido largo no debe contar como una lectura del router
+        (distorsionaría su latencia y sus errores).
+        """
+        if conn is None:
+            conn = self.master
         try:
-            conn = self._get_read_connection()
-            return conn.keys(pattern)
+            yield from conn.scan_iter(match=pattern, count=count or Config.CACHE_SCAN_COUNT)
         except Exception as e:
             logger.error(f"Error obteniendo claves con patrón {pattern}: {e}")
-            return []
+    
+    @staticmethod
+    def _batched(keys: Iterator[str], size: int) -> Iterator[List[str]]:
+        """Agrupar un iterador de claves en listas de hasta `size` elementos"""
+        batch = []
+        for key in keys:
+            batch.append(key)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def delete_pattern(self, pattern: str, batch_size: int = None) -> int:
+        """Eliminar las claves que coincidan con un patrón; retorna cuántas se eliminaron.
+        
+        Las claves se recorren con SCAN en el master y se borran con UNLINK
+        por lotes, un round-trip por lote, avisando a los demás procesos.
+        """
+        batch_size = batch_size or Config.CACHE_SCAN_BATCH_SIZE
+        deleted = 0
+        for batch in self._batched(self.get_keys_pattern(pattern, conn=self.master), batch_size):
+            try:
+                if self.local is not None:
+                    for key in batch:
+                        self.local.delete(key)
+                pipe = self.master.pipeline(transaction=False)
+                pipe.unlink(*batch)
+                deleted += self._execute_write(pipe, batch)[0]
+            except Exception as e:
+                logger.error(f"Error eliminando lote de {len(batch)} claves con patrón {pattern}: {e}")
+        return deleted
+    
+    def audit_ttls(self, pattern: str, batch_size: int = None, sample_size: int = 20) -> dict:
+        """Revisar el TTL de las claves que coincidan con un patrón.
+        
+        Lee los TTL con PTTL en pipelines por lote sobre el master y retorna
+        su distribución, junto con una muestra de claves sin expiración.
+        """
+        batch_size = batch_size or Config.CACHE_SCAN_BATCH_SIZE
+        buckets = {label: 0 for label, _ in self.TTL_BUCKETS}
+        audit = {
+            'pattern': pattern,
+            'total': 0,
+            'without_ttl': 0,
+            'expired': 0,
+            'min_ttl_seconds': None,
+            'max_ttl_seconds': None,
+            'avg_ttl_seconds': None,
+            'buckets': buckets,
+            'without_ttl_sample': []
+        }
+        ttl_sum = 0.0
+        with_ttl = 0
+        
+        conn = self.master
+        for batch in self._batched(self.get_keys_pattern(pattern, conn=conn), batch_size):
+            try:
+                pipe = conn.pipeline(transaction=False)
+                for key in batch:
+                    pipe.pttl(key)
+                pttls = pipe.execute()
+            except Exception as e:
+                logger.error(f"Error auditando lote de {len(batch)} claves con patrón {pattern}: {e}")
+                continue
+            
+            for key, pttl in zip(batch, pttls):
+                audit['total'] += 1
+                if pttl == -2:
+                    # Expiró o se eliminó entre SCAN y PTTL
+                    audit['expired'] += 1
+                    continue
+                if pttl == -1:
+                    audit['without_ttl'] += 1
+                    if len(audit['without_ttl_sample']) < sample_size:
+                        audit['without_ttl_sample'].append(key)
+                    continue
+                
+                ttl = pttl / 1000
+                with_ttl += 1
+                ttl_sum += ttl
+                audit['min_ttl_seconds'] = ttl if audit['min_ttl_seconds'] is None else min(audit['min_ttl_seconds'], ttl)
+                audit['max_ttl_seconds'] = ttl if audit['max_ttl_seconds'] is None else max(audit['max_ttl_seconds'], ttl)
+                for label, limit in self.TTL_BUCKETS:
+                    if limit is None or ttl < limit:
+                        buckets[label] += 1
+                        break
+        
+        if with_ttl:
+            audit['avg_ttl_seconds'] = round(ttl_sum / with_ttl, 3)
+        return audit
     
     def increment(self, key: str, amount: int = 1) -> int:
         """Incrementar un contador"""
@@ -124,6 +1096,12 @@ class RedisCache:
             logger.error(f"Error incrementando {key}: {e}")
             return 0
     
+    @staticmethod
+    def _pool_stats(client: redis.Redis) -> dict:
+        """Uso del pool de conexiones de un cliente"""
+        pool = client.connection_pool
+        return pool.get_stats() if isinstance(pool, InstrumentedConnectionPool) else {}
+    
     def get_stats(self) -> dict:
         """Obtener estadísticas de Redis"""
         stats = {
@@ -132,7 +1110,7 @@ class RedisCache:
         }
         
         try:
-            if self.master:
+            if self.available:
                 info = self.master.info()
                 stats['master'] = {
                     'status': 'connected',
@@ -147,27 +1125,63 @@ class RedisCache:
                 }
         except Exception as e:
             logger.error(f"Error obteniendo stats del master: {e}")
+        if self.master:
+            stats['master']['pool'] = self._pool_stats(self.master)
         
-        for i, slave in enumerate(self.slaves):
+        replicas = self.router.replicas
+        for i, replica in enumerate(replicas):
+            if not replica.healthy:
+                stats['slaves'].append({
+                    'status': 'disconnected',
+                    'host': replica.host,
+                    'port': replica.port,
+                    'pool': self._pool_stats(replica.client)
+                })
+                continue
             try:
-                if slave != self.master:  # No duplicar stats del master
-                    info = slave.info()
-                    host = Config.REDIS_SLAVE1_HOST if i == 0 else Config.REDIS_SLAVE2_HOST
-                    port = Config.REDIS_SLAVE1_PORT if i == 0 else Config.REDIS_SLAVE2_PORT
-                    stats['slaves'].append({
-                        'status': 'connected',
-                        'host': host,
-                        'port': port,
-                        'info': {
-                            'connected_clients': info.get('connected_clients', 0),
-                            'used_memory_human': info.get('used_memory_human', '0'),
-                            'keyspace_hits': info.get('keyspace_hits', 0),
-                            'keyspace_misses': info.get('keyspace_misses', 0)
-                        }
-                    })
+                info = replica.client.info()
+                stats['slaves'].append({
+                    'status': 'connected',
+                    'host': replica.host,
+                    'port': replica.port,
+                    'info': {
+                        'connected_clients': info.get('connected_clients', 0),
+                        'used_memory_human': info.get('used_memory_human', '0'),
+                        'keyspace_hits': info.get('keyspace_hits', 0),
+                        'keyspace_misses': info.get('keyspace_misses', 0)
+                    },
+                    'pool': self._pool_stats(replica.client)
+                })
             except Exception as e:
                 logger.error(f"Error obteniendo stats del slave {i}: {e}")
-                stats['slaves'].append({'status': 'disconnected'})
+                stats['slaves'].append({
+                    'status': 'disconnected',
+                    'host': replica.host,
+                    'port': replica.port,
+                    'pool': self._pool_stats(replica.client)
+                })
+        
+        stats['routing'] = self.router.get_stats()
+        
+        stats['codec'] = {
+            'name': self.serializer.codec.name,
+            'compression_threshold': self.serializer.compression_threshold
+        }
+        
+        stats['circuit_breaker'] = self.breaker.get_stats()
+        with self._dirty_lock:
+            stats['circuit_breaker']['pending_invalidations'] = len(self._dirty_keys)
+        
+        with self._read_stats_lock:
+            reads = dict(self._read_stats)
+        stats['consistency'] = {
+            'default': Config.CACHE_READ_CONSISTENCY,
+            'read_your_writes_window_seconds': Config.READ_YOUR_WRITES_WINDOW,
+            'reads': reads
+        }
+        
+        if self.local is not None:
+            stats['local'] = self.local.get_stats()
         
         return stats
 
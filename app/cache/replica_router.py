@@ -0,0 +1,189 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, List, Iterator
+import redis
+
+logger = logging.getLogger(__name__)
+
+class Replica:
+    """Estado de salud de una réplica de Redis"""
+    
+    # Peso de la última medición en la latencia promedio (EWMA)
+    LATENCY_ALPHA = 0.2
+    
+    def __init__(self, client: redis.Redis, host: str, port: int, weight: int = 1):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.weight = weight
+        self.healthy = False
+        self.latency = None  # segundos, promedio móvil exponencial
+        self.consecutive_errors = 0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.last_error = None
+    
+    def record_latency(self, latency: float) -> None:
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.LATENCY_ALPHA * (latency - self.latency)
+    
+    def get_stats(self) -> dict:
+        return {
+            'host': self.host,
+            'port': self.port,
+            'healthy': self.healthy,
+            'weight': self.weight,
+            'latency_ms': round(self.latency * 1000, 3) if self.latency is not None else None,
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': round(self.errors / self.requests, 4) if self.requests else 0.0,
+            'ejections': self.ejections,
+            'last_error': self.last_error
+        }
+
+class ReplicaRouter:
+    """Elegir la réplica para cada lectura según su salud y la política configurada.
+    
+    Políticas:
+    - round_robin: turnos entre réplicas sanas.
+    - least_latency: entre dos réplicas sanas al azar, la de menor latencia
+      (evita que todo el tráfico se concentre en la más rápida).
+    - weighted: aleatorio proporcional al peso de cada réplica.
+    
+    Las réplicas empiezan fuera del enrutamiento hasta responder al primer
+    sondeo. Una réplica se expulsa tras `max_errors` errores consecutivos y un hilo en
+    segundo plano le hace PING cada `probe_interval` segundos hasta que
+    responde, momento en que vuelve a recibir lecturas. Sin réplicas sanas las
+    lecturas van al master.
+    """
+    POLICIES = ('round_robin', 'least_latency', 'weighted')
+    
+    def __init__(self, replicas: List[Replica], fallback: redis.Redis, policy: str = 'least_latency',
+                 max_errors: int = 3, probe_interval: float = 5.0):
+        if policy not in self.POLICIES:
+            logger.warning(f"Política de lectura '{policy}' desconocida, usando least_latency")
+            policy = 'least_latency'
+        self.replicas = replicas
+        self.fallback = fallback
+        self.policy = policy
+        self.max_errors = max_errors
+        self.probe_interval = probe_interval
+        self.fallback_reads = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._probe_thread = None
+    
+    def start(self) -> None:
+        """Iniciar el hilo que sondea las réplicas: de inmediato y luego las expulsadas"""
+        if self._probe_thread is not None or not self.replicas:
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name='redis-replica-probe', daemon=True)
+        self._probe_thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+    
+    def _probe_loop(self) -> None:
+        while True:
+            for replica in self.replicas:
+                if not replica.healthy:
+                    self.probe(replica)
+            if self._stop.wait(self.probe_interval):
+                return
+    
+    def probe(self, replica: Replica) -> bool:
+        """Hacer PING a una réplica y actualizar su estado"""
+        start = time.monotonic()
+        try:
+            replica.client.ping()
+        except Exception as e:
+            with self._lock:
+                replica.healthy = False
+                replica.last_error = str(e)
+            logger.warning(f"Réplica {replica.host}:{replica.port} no disponible: {e}")
+            return False
+        
+        with self._lock:
+            replica.record_latency(time.monotonic() - start)
+            replica.consecutive_errors = 0
+            recovered = not replica.healthy
+            replica.healthy = True
+        if recovered:
+            logger.info(f"Réplica {replica.host}:{replica.port} disponible para lecturas")
+        return True
+    
+    def choose(self) -> Optional[Replica]:
+        """Elegir una réplica sana; None si hay que leer del master"""
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                self.fallback_reads += 1
+                return None
+            
+            if self.policy == 'round_robin':
+                replica = healthy[self._next % len(healthy)]
+                self._next += 1
+            elif self.policy == 'weighted':
+                replica = random.choices(healthy, weights=[r.weight for r in healthy])[0]
+            else:
+                candidates = random.sample(healthy, 2) if len(healthy) > 1 else healthy
+                # Las réplicas sin mediciones se prueban primero
+                replica = min(candidates, key=lambda r: -1 if r.latency is None else r.latency)
+            
+            replica.requests += 1
+            return replica
+    
+    def record_success(self, replica: Replica, latency: float) -> None:
+        with self._lock:
+            replica.record_latency(latency)
+            replica.consecutive_errors = 0
+    
+    def record_failure(self, replica: Replica, error: Exception) -> None:
+        with self._lock:
+            replica.errors += 1
+            replica.consecutive_errors += 1
+            replica.last_error = str(error)
+            eject = replica.healthy and replica.consecutive_errors >= self.max_errors
+            if eject:
+                replica.healthy = False
+                replica.ejections += 1
+        if eject:
+            logger.warning(f"Réplica {replica.host}:{replica.port} expulsada tras "
+                           f"{replica.consecutive_errors} errores: {error}")
+    
+    @contextmanager
+    def connection(self) -> Iterator[redis.Redis]:
+        """Conexión para una lectura, registrando su latencia o su error.
+        
+        Sólo los errores de conexión cuentan contra la salud de la réplica;
+        los errores de comando (p. ej. WRONGTYPE) no dependen de ella.
+        """
+        replica = self.choose()
+        if replica is None:
+            yield self.fallback
+            return
+        
+        start = time.monotonic()
+        try:
+            yield replica.client
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self.record_failure(replica, e)
+            raise
+        self.record_success(replica, time.monotonic() - start)
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'healthy': sum(1 for replica in self.replicas if replica.healthy),
+                'total': len(self.replicas),
+                'fallback_reads': self.fallback_reads,
+                'replicas': [replica.get_stats() for replica in self.replicas]
+            }
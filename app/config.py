@@ -11,6 +11,23 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Pool de conexiones a PostgreSQL y timeout de sentencias en el servidor
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))  # segundos esperando una conexión libre
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # segundos, -1 desactiva
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))  # 0 desactiva
+    
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+        'connect_args': {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+    }
+    
     # Redis config
     REDIS_MASTER_HOST = os.getenv('REDIS_MASTER_HOST', 'localhost')
     REDIS_MASTER_PORT = int(os.getenv('REDIS_MASTER_PORT', '6379'))
@@ -19,5 +36,98 @@ class Config:
     REDIS_SLAVE2_HOST = os.getenv('REDIS_SLAVE2_HOST', 'localhost')
     REDIS_SLAVE2_PORT = int(os.getenv('REDIS_SLAVE2_PORT', '6381'))
     
+    # Pools de conexiones (uno por nodo): máximo de conexiones, espera por una
+    # conexión libre, timeouts de socket y reintentos con backoff exponencial
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+    REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '2'))  # segundos
+    REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '2'))  # segundos
+    REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', '1'))  # segundos
+    REDIS_SOCKET_KEEPALIVE = os.getenv('REDIS_SOCKET_KEEPALIVE', 'true').lower() == 'true'
+    REDIS_RETRY_ATTEMPTS = int(os.getenv('REDIS_RETRY_ATTEMPTS', '3'))
+    REDIS_RETRY_BACKOFF_BASE = float(os.getenv('REDIS_RETRY_BACKOFF_BASE', '0.01'))  # segundos
+    REDIS_RETRY_BACKOFF_CAP = float(os.getenv('REDIS_RETRY_BACKOFF_CAP', '0.5'))  # segundos
+    
+    # Enrutamiento de lecturas: 'least_latency', 'round_robin' o 'weighted'
+    REDIS_READ_POLICY = os.getenv('REDIS_READ_POLICY', 'least_latency')
+    REDIS_SLAVE1_WEIGHT = int(os.getenv('REDIS_SLAVE1_WEIGHT', '1'))
+    REDIS_SLAVE2_WEIGHT = int(os.getenv('REDIS_SLAVE2_WEIGHT', '1'))
+    REDIS_REPLICA_MAX_ERRORS = int(os.getenv('REDIS_REPLICA_MAX_ERRORS', '3'))  # errores seguidos para expulsar
+    REDIS_REPLICA_PROBE_INTERVAL = float(os.getenv('REDIS_REPLICA_PROBE_INTERVAL', '5'))  # segundos
+    
+    # Consistencia de lecturas por defecto ('eventual', 'session' o 'strong');
+    # cada petición puede pedir otra con la cabecera X-Read-Consistency.
+    # En 'session' las claves escritas en la ventana se leen del master o de
+    # una réplica que ya alcanzó el offset de la escritura
+    CACHE_READ_CONSISTENCY = os.getenv('CACHE_READ_CONSISTENCY', 'session')
+    READ_YOUR_WRITES_WINDOW = float(os.getenv('READ_YOUR_WRITES_WINDOW', '10'))  # segundos, 0 desactiva
+    
     # Cache settings - 30 minutos como requiere el laboratorio
-    CACHE_EXPIRATION = 30 * 60  # 30 minutos en segundos
\ No newline at end of file
+    CACHE_EXPIRATION = 30 * 60  # 30 minutos en segundos
+    
+    # Conectar a Redis en segundo plano al crear la app; si no, en el primer uso
+    CACHE_WARMUP_ON_START = os.getenv('CACHE_WARMUP_ON_START', 'true').lower() == 'true'
+    
+    # Recorrido del keyspace con SCAN: claves revisadas por llamada (COUNT) y
+    # claves por pipeline en las operaciones masivas (borrado, auditoría de TTL)
+    CACHE_SCAN_COUNT = int(os.getenv('CACHE_SCAN_COUNT', '1000'))
+    CACHE_SCAN_BATCH_SIZE = int(os.getenv('CACHE_SCAN_BATCH_SIZE', '500'))
+    
+    # Caché local (L1) en memoria de cada proceso, delante de Redis
+    LOCAL_CACHE_ENABLED = os.getenv('LOCAL_CACHE_ENABLED', 'true').lower() == 'true'
+    LOCAL_CACHE_MAX_SIZE = int(os.getenv('LOCAL_CACHE_MAX_SIZE', '1000'))
+    LOCAL_CACHE_TTL = float(os.getenv('LOCAL_CACHE_TTL', '5'))  # segundos
+    CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'cache:invalidations')
+    
+    # Serialización de valores en Redis: 'json' (formato original) o 'msgpack'.
+    # Umbral de compresión zlib en bytes; 0 la desactiva
+    CACHE_CODEC = os.getenv('CACHE_CODEC', 'json').lower()
+    CACHE_COMPRESSION_THRESHOLD = int(os.getenv('CACHE_COMPRESSION_THRESHOLD', '0'))
+    CACHE_COMPRESSION_LEVEL = int(os.getenv('CACHE_COMPRESSION_LEVEL', '1'))
+    
+    # Protección contra estampidas: single-flight y refresco anticipado (XFetch)
+    CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', '10'))  # segundos
+    CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', '5'))  # segundos
+    CACHE_LOCK_POLL_INTERVAL = float(os.getenv('CACHE_LOCK_POLL_INTERVAL', '0.05'))  # segundos
+    CACHE_EARLY_REFRESH_ENABLED = os.getenv('CACHE_EARLY_REFRESH_ENABLED', 'true').lower() == 'true'
+    CACHE_EARLY_REFRESH_BETA = float(os.getenv('CACHE_EARLY_REFRESH_BETA', '1.0'))
+    
+    # Circuit breaker del master: tras N errores de conexión seguidos se deja de
+    # usar Redis (se sirve desde PostgreSQL) y se reintenta cada RESET_TIMEOUT
+    CACHE_BREAKER_FAILURE_THRESHOLD = int(os.getenv('CACHE_BREAKER_FAILURE_THRESHOLD', '5'))
+    CACHE_BREAKER_RESET_TIMEOUT = float(os.getenv('CACHE_BREAKER_RESET_TIMEOUT', '10'))  # segundos
+    # Usar el caché local mientras Redis está caído (sin invalidaciones entre procesos)
+    CACHE_DEGRADED_LOCAL_CACHE = os.getenv('CACHE_DEGRADED_LOCAL_CACHE', 'false').lower() == 'true'
+    CACHE_DIRTY_KEYS_MAX = int(os.getenv('CACHE_DIRTY_KEYS_MAX', '100000'))
+    
+    # Ranking de productos en Redis: reconstrucción periódica desde PostgreSQL
+    LEADERBOARD_REBUILD_INTERVAL = int(os.getenv('LEADERBOARD_REBUILD_INTERVAL', '3600'))  # segundos
+    # Tendencias por ventana (?window=1h|24h|7d): cada cuánto se vuelven a sumar los buckets
+    TRENDING_CACHE_TTL = int(os.getenv('TRENDING_CACHE_TTL', '30'))  # segundos
+    
+    # Persistencia de carritos: 'write_through' (commit en PostgreSQL antes de
+    # responder) o 'write_behind' (Redis + journal en un Stream que aplica
+    # python -m scripts.cart_flusher). Antes de volver a write_through, o de
+    # atender el mismo tráfico con la API asyncio, vaciar el journal
+    CART_WRITE_MODE = os.getenv('CART_WRITE_MODE', 'write_through').lower()
+    CART_JOURNAL_STREAM = os.getenv('CART_JOURNAL_STREAM', 'cart:journal')
+    CART_JOURNAL_GROUP = os.getenv('CART_JOURNAL_GROUP', 'cart-flushers')
+    # Atraso máximo de PostgreSQL respecto de Redis: superado, se rechazan escrituras (503)
+    CART_WRITE_BEHIND_MAX_LAG = float(os.getenv('CART_WRITE_BEHIND_MAX_LAG', '10'))  # segundos
+    CART_WRITE_BEHIND_LAG_CHECK_INTERVAL = float(os.getenv('CART_WRITE_BEHIND_LAG_CHECK_INTERVAL', '1'))  # segundos
+    CART_WRITE_BEHIND_CAS_RETRIES = int(os.getenv('CART_WRITE_BEHIND_CAS_RETRIES', '10'))
+    CART_FLUSH_BATCH_SIZE = int(os.getenv('CART_FLUSH_BATCH_SIZE', '500'))
+    CART_FLUSH_BLOCK_MS = int(os.getenv('CART_FLUSH_BLOCK_MS', '1000'))
+    # Entradas sin confirmar por más tiempo se reclaman (consumidor caído o lote fallido)
+    CART_FLUSH_CLAIM_IDLE_MS = int(os.getenv('CART_FLUSH_CLAIM_IDLE_MS', '30000'))
+    
+    # Stream de eventos de carritos (add/remove/update/clear/save) para
+    # consumidores externos; acotado a MAXLEN entradas aproximadas
+    CART_EVENTS_ENABLED = os.getenv('CART_EVENTS_ENABLED', 'true').lower() == 'true'
+    CART_EVENTS_STREAM = os.getenv('CART_EVENTS_STREAM', 'cart:events')
+    CART_EVENTS_MAXLEN = int(os.getenv('CART_EVENTS_MAXLEN', '1000000'))
+    CART_EVENTS_BATCH_SIZE = int(os.getenv('CART_EVENTS_BATCH_SIZE', '200'))
+    CART_EVENTS_BLOCK_MS = int(os.getenv('CART_EVENTS_BLOCK_MS', '1000'))
+    CART_EVENTS_CLAIM_IDLE_MS = int(os.getenv('CART_EVENTS_CLAIM_IDLE_MS', '30000'))
+    
+    # Máximo de carritos por petición a /cart/batch
+    CART_BATCH_MAX_SIZE = int(os.getenv('CART_BATCH_MAX_SIZE', '500'))
@@ -51,3 +51,34 @@ class Cart:
             'items': [item.to_dict() for item in self.items],
             'total': self.total
         }
+
+@dataclass
+class ItemDelta:
+    """Cambio de un producto entre dos versiones de un carrito"""
+    product_id: int
+    name: str
+    quantity: int  # Diferencia de unidades
+    orders: int    # +1 si el producto entra al carrito, -1 si sale
+    price: float   # Diferencia en la suma de precios (para el precio promedio)
+
+def diff_items(old_items: List[CartItem], new_items: List[CartItem]) -> List[ItemDelta]:
+    """Calcular los cambios por producto entre dos versiones de un carrito"""
+    old = {item.product_id: item for item in old_items}
+    new = {item.product_id: item for item in new_items}
+    
+    deltas = []
+    for product_id in sorted(old.keys() | new.keys()):
+        before = old.get(product_id)
+        after = new.get(product_id)
+        quantity = (after.quantity if after else 0) - (before.quantity if before else 0)
+        orders = (1 if after else 0) - (1 if before else 0)
+        price = (after.price if after else 0.0) - (before.price if before else 0.0)
+        if quantity or orders or price:
+            deltas.append(ItemDelta(
+                product_id=product_id,
+                name=(after or before).name,
+                quantity=quantity,
+                orders=orders,
+                price=price
+            ))
+    return deltas
@@ -1,14 +1,79 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import exc, or_, select
+from sqlalchemy.pool import QueuePool
 from datetime import datetime, timezone
+import threading
+import time
 
-db = SQLAlchemy()
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que registra cuánto tarda obtener una conexión del pool"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+    
+    def connect(self):
+        # Incluye la espera por una conexión libre y, si hace falta, abrir una nueva
+        start = time.monotonic()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.monotonic() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+    
+    def get_stats(self) -> dict:
+        """Obtener ocupación del pool y tiempos de checkout"""
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        with self._stats_lock:
+            return {
+                'pool_size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': checked_out,
+                'checked_in': self.checkedin(),
+                'overflow': max(self.overflow(), 0),
+                'utilization': round(checked_out / capacity, 4) if capacity else 0.0,
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.checkout_timeouts,
+                'wait_ms_avg': round(self.wait_time_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_ms_max': round(self.wait_time_max * 1000, 3)
+            }
+
+db = SQLAlchemy(engine_options={'poolclass': InstrumentedQueuePool})
+
+def get_pool_stats() -> dict:
+    """Estadísticas del pool de conexiones a PostgreSQL (requiere app context)"""
+    pool = db.engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.get_stats()
+    return {'status': pool.status()}
+
+# Versión global y monótona de los carritos: no se reinicia al borrar filas,
+# así una versión cacheada nunca se confunde con la de un carrito nuevo
+cart_version_seq = db.Sequence('cart_version_seq')
 
 class DBCartItem(db.Model):
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        # Un producto aparece una sola vez por carrito; el índice también sirve
+        # para cargar los items de un carrito (prefijo cart_id)
+        db.UniqueConstraint('cart_id', 'product_id', name='uq_cart_items_cart_product'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
-    product_id = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
@@ -19,7 +84,50 @@ class DBCart(db.Model):
     __tablename__ = 'carts'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.String(100), nullable=False, unique=True, index=True)
+    version = db.Column(db.BigInteger, cart_version_seq, nullable=False, server_default=cart_version_seq.next_value())
     items = db.relationship('DBCartItem', backref='cart', lazy=True, cascade='all, delete-orphan')
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class DBProductStats(db.Model):
+    """Totales por producto sobre todos los carritos.
+    
+    Los mantienen triggers sobre cart_items (ver scripts/migrate.py) a partir
+    de los cambios de cada sentencia; scripts/backfill_product_stats.py los
+    recalcula desde cero.
+    """
+    __tablename__ = 'product_stats'
+    __table_args__ = (
+        # Top de productos: se recorre de mayor a menor y se corta en `limit`
+        db.Index('ix_product_stats_total_quantity', 'total_quantity', postgresql_where=db.text('total_quantity > 0')),
+    )
+    
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    total_quantity = db.Column(db.BigInteger, nullable=False, default=0)
+    times_ordered = db.Column(db.Integer, nullable=False, default=0)
+    price_sum = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+
+def lock_product_stats_statement(product_ids, cart_ids=()):
+    """SELECT ... FOR UPDATE de las filas de product_stats que tocará una escritura
+    de varias sentencias sobre cart_items, en orden de product_id.
+    
+    Los triggers ordenan sus filas dentro de cada sentencia, pero un upsert
+    seguido de un DELETE en la misma transacción las toma en dos tandas y
+    dos transacciones pueden quedar esperándose. Tomarlas todas al principio,
+    en un orden global, lo evita. Incluye los productos que hoy tienen los
+    carritos `cart_ids` (los que el DELETE puede quitar). Los productos que
+    aún no tienen fila no se bloquean: sólo compiten al insertarla por
+    primera vez.
+    """
+    stats = DBProductStats.__table__
+    condition = stats.c.product_id.in_(list(product_ids))
+    if cart_ids:
+        items = DBCartItem.__table__
+        condition = or_(condition, stats.c.product_id.in_(
+            select(items.c.product_id).where(items.c.cart_id.in_(list(cart_ids)))
+        ))
+    return select(stats.c.product_id).where(condition).order_by(stats.c.product_id).with_for_update()
@@ -1,5 +1,8 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, g
 from app.services.cart_service import CartService
+from app.services.cart_journal import WriteBehindUnavailableError
+from app.cache import cache
+from app.config import Config
 import time
 import logging
 from sqlalchemy import text
@@ -9,6 +12,23 @@ logger = logging.getLogger(__name__)
 cart_bp = Blueprint('cart', __name__)
 cart_service = CartService()
 
+@cart_bp.before_request
+def apply_read_consistency():
+    """Aplicar el nivel de consistencia pedido en la cabecera X-Read-Consistency"""
+    level = request.headers.get('X-Read-Consistency')
+    if level is None:
+        return None
+    if level not in cache.CONSISTENCY_LEVELS:
+        return jsonify({'error': f"X-Read-Consistency debe ser uno de: {', '.join(cache.CONSISTENCY_LEVELS)}"}), 400
+    g.read_consistency_token = cache.set_consistency(level)
+
+@cart_bp.teardown_request
+def reset_read_consistency(error):
+    """Restaurar el nivel de consistencia al terminar la petición"""
+    token = g.pop('read_consistency_token', None)
+    if token is not None:
+        cache.reset_consistency(token)
+
 @cart_bp.route('/<user_id>', methods=['GET'])
 def get_cart(user_id):
     """Obtener carrito de un usuario"""
@@ -28,6 +48,32 @@ def get_cart(user_id):
         logger.error(f"Error obteniendo carrito {user_id}: {e}")
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+@cart_bp.route('/batch', methods=['POST'])
+def get_carts_batch():
+    """Obtener varios carritos en una sola petición"""
+    start_time = time.time()
+    try:
+        user_ids = (request.json or {}).get('user_ids')
+        
+        if not isinstance(user_ids, list) or not all(isinstance(user_id, str) for user_id in user_ids):
+            return jsonify({'error': 'Campo requerido: user_ids (lista de strings)'}), 400
+        if len(user_ids) > Config.CART_BATCH_MAX_SIZE:
+            return jsonify({'error': f'Máximo {Config.CART_BATCH_MAX_SIZE} carritos por petición'}), 400
+        
+        carts = cart_service.get_carts(user_ids)
+        response_time = (time.time() - start_time) * 1000
+        
+        return jsonify({
+            'carts': [cart.to_dict() for cart in carts],
+            'total_count': len(carts),
+            '_metadata': {
+                'response_time_ms': round(response_time, 2)
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error obteniendo carritos en lote: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
 @cart_bp.route('/<user_id>/add', methods=['POST'])
 def add_to_cart(user_id):
     """Agregar item al carrito"""
@@ -50,6 +96,9 @@ def add_to_cart(user_id):
                 'response_time_ms': round(response_time, 2)
             }
         })
+    except WriteBehindUnavailableError as e:
+        logger.warning(f"Escritura rechazada en carrito {user_id}: {e}")
+        return jsonify({'error': 'Servicio temporalmente no disponible, reintente'}), 503
     except Exception as e:
         logger.error(f"Error agregando item al carrito {user_id}: {e}")
         return jsonify({'error': 'Error interno del servidor'}), 500
@@ -69,6 +118,9 @@ def remove_from_cart(user_id, product_id):
                 'response_time_ms': round(response_time, 2)
             }
         })
+    except WriteBehindUnavailableError as e:
+        logger.warning(f"Escritura rechazada en carrito {user_id}: {e}")
+        return jsonify({'error': 'Servicio temporalmente no disponible, reintente'}), 503
     except Exception as e:
         logger.error(f"Error eliminando item del carrito {user_id}: {e}")
         return jsonify({'error': 'Error interno del servidor'}), 500
@@ -95,6 +147,9 @@ def update_quantity(user_id, product_id):
                 }
             })
         return jsonify({'error': 'Producto no encontrado en el carrito'}), 404
+    except WriteBehindUnavailableError as e:
+        logger.warning(f"Escritura rechazada en carrito {user_id}: {e}")
+        return jsonify({'error': 'Servicio temporalmente no disponible, reintente'}), 503
     except Exception as e:
         logger.error(f"Error actualizando cantidad en carrito {user_id}: {e}")
         return jsonify({'error': 'Error interno del servidor'}), 500
@@ -113,6 +168,9 @@ def clear_cart(user_id):
                 'response_time_ms': round(response_time, 2)
             }
         })
+    except WriteBehindUnavailableError as e:
+        logger.warning(f"Escritura rechazada en carrito {user_id}: {e}")
+        return jsonify({'error': 'Servicio temporalmente no disponible, reintente'}), 503
     except Exception as e:
         logger.error(f"Error limpiando carrito {user_id}: {e}")
         return jsonify({'error': 'Error interno del servidor'}), 500
@@ -121,14 +179,21 @@ def clear_cart(user_id):
 
 @cart_bp.route('/stats/top-products', methods=['GET'])
 def get_top_products():
-    """Obtener top 10 productos más comprados"""
+    """Obtener top productos más comprados, de siempre o de una ventana (?window=1h|24h|7d)"""
     start_time = time.time()
     try:
         limit = int(request.args.get('limit', 10))
         if limit > 50:  # Límite máximo
             limit = 50
         
-        top_products = cart_service.get_top_products(limit)
+        window = request.args.get('window')
+        if window is not None and window not in cart_service.TRENDING_WINDOWS:
+            return jsonify({'error': f"window debe ser uno de: {', '.join(cart_service.TRENDING_WINDOWS)}"}), 400
+        
+        if window:
+            top_products = cart_service.get_trending_products(window, limit)
+        else:
+            top_products = cart_service.get_top_products(limit)
         response_time = (time.time() - start_time) * 1000
         
         return jsonify({
@@ -136,7 +201,8 @@ def get_top_products():
             'total_count': len(top_products),
             '_metadata': {
                 'response_time_ms': round(response_time, 2),
-                'limit': limit
+                'limit': limit,
+                'window': window or 'all'
             }
         })
     except Exception as e:
@@ -150,6 +216,7 @@ def get_cache_stats():
         stats = cart_service.get_cache_stats()
         return jsonify({
             'cache_stats': stats,
+            'db_pool_stats': cart_service.get_db_pool_stats(),
             'timestamp': time.time()
         })
     except Exception as e:
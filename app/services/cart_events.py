@@ -0,0 +1,116 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import List, Callable, Optional
+from app.config import Config
+from app.models.cart import ItemDelta
+from app.services.stream_consumer import StreamConsumer
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CartEvent:
+    """Mutación de un carrito publicada en el stream de eventos.
+    
+    Sólo lleva los cambios por producto, sin nombres ni el carrito
+    completo. El instante sale del id de la entrada (milisegundos desde
+    epoch). Dos mutaciones concurrentes del mismo carrito pueden publicarse
+    en otro orden que el de sus versiones: para reordenar usar `version`.
+    """
+    type: str  # 'add', 'remove', 'update', 'clear' o 'save'
+    user_id: str
+    version: int
+    deltas: List[ItemDelta]
+    id: Optional[str] = None
+    timestamp: Optional[float] = None
+    
+    def to_fields(self) -> dict:
+        """Campos de la entrada XADD"""
+        return {
+            'type': self.type,
+            'user_id': self.user_id,
+            'version': self.version,
+            'deltas': json.dumps(
+                [[d.product_id, d.quantity, d.orders, round(d.price, 2)] for d in self.deltas],
+                separators=(',', ':')
+            )
+        }
+    
+    @classmethod
+    def from_entry(cls, entry_id: str, fields: dict) -> 'CartEvent':
+        """Reconstruir el evento desde una entrada del stream"""
+        return cls(
+            type=fields['type'],
+            user_id=fields['user_id'],
+            version=int(fields['version']),
+            deltas=[
+                ItemDelta(product_id=product_id, name=None, quantity=quantity, orders=orders, price=price)
+                for product_id, quantity, orders, price in json.loads(fields['deltas'])
+            ],
+            id=entry_id,
+            timestamp=int(entry_id.split('-')[0]) / 1000
+        )
+
+def publish_event(pipe, event: CartEvent) -> None:
+    """Agregar el evento al stream, acotado a CART_EVENTS_MAXLEN entradas (aproximado)"""
+    pipe.xadd(
+        Config.CART_EVENTS_STREAM,
+        event.to_fields(),
+        maxlen=Config.CART_EVENTS_MAXLEN,
+        approximate=True
+    )
+
+class CartEventConsumer(StreamConsumer):
+    """Consumidor de eventos de carritos para procesos externos (analítica, recomendaciones).
+    
+    `handler` recibe cada lote de CartEvent en orden; si retorna sin
+    excepción el lote se confirma, si falla queda pendiente y se reintenta
+    cuando se reclama (CART_EVENTS_CLAIM_IDLE_MS). Cada grupo mantiene su
+    propio checkpoint; un grupo nuevo empieza por los eventos nuevos salvo
+    que se pase start_id='0'. El stream está acotado: un grupo que se
+    atrase más de CART_EVENTS_MAXLEN eventos pierde los más viejos.
+    
+    Uso:
+        consumer = CartEventConsumer('recomendaciones', handler)
+        consumer.run(stop)      # o consumer.drain() para procesar lo acumulado
+    """
+    
+    def __init__(self, group: str, handler: Callable[[List[CartEvent]], None], consumer: str = None,
+                 batch_size: int = None, start_id: str = '$'):
+        super().__init__(
+            Config.CART_EVENTS_STREAM,
+            group,
+            consumer,
+            batch_size=batch_size or Config.CART_EVENTS_BATCH_SIZE,
+            block_ms=Config.CART_EVENTS_BLOCK_MS,
+            claim_idle_ms=Config.CART_EVENTS_CLAIM_IDLE_MS,
+            start_id=start_id
+        )
+        self.handler = handler
+        self.processed_events = 0
+        self.failed_batches = 0
+    
+    def process(self, entries: list) -> int:
+        """Entregar el lote al handler y confirmarlo si terminó sin error"""
+        if not entries:
+            return 0
+        
+        events = []
+        for entry_id, fields in entries:
+            try:
+                events.append(CartEvent.from_entry(entry_id, fields))
+            except (KeyError, ValueError, TypeError) as e:
+                # Una entrada malformada se descarta para no bloquear al grupo
+                logger.error(f"Evento de carrito {entry_id} inválido, se descarta: {e}")
+        
+        if events:
+            try:
+                self.handler(events)
+            except Exception as e:
+                self.failed_batches += 1
+                logger.error(f"Error procesando {len(events)} eventos de carritos en {self.group}: {e}")
+                return 0
+        
+        self.ack([entry_id for entry_id, _ in entries])
+        self.processed_events += len(events)
+        return len(entries)
@@ -0,0 +1,334 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Tuple
+import redis
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.cache import cache
+from app.config import Config
+from app.models.database import db, DBCart, DBCartItem, lock_product_stats_statement
+from app.services.stream_consumer import StreamConsumer
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindUnavailableError(Exception):
+    """No se puede aceptar una escritura write-behind sin romper la cota de atraso"""
+
+class CartJournal:
+    """Journal de mutaciones de carritos en un Redis Stream (modo write-behind).
+    
+    Cada mutación se aplica al carrito en Redis y se agrega al stream en un
+    único script, condicionado a la versión leída. El último estado de cada
+    carrito aún no aplicado en PostgreSQL queda además en un hash, para que
+    una lectura que no lo encuentre en caché no devuelva el de la BD.
+    
+    Cota de atraso: si la entrada más antigua sin aplicar supera
+    CART_WRITE_BEHIND_MAX_LAG segundos se rechazan nuevas escrituras
+    (WriteBehindUnavailableError) hasta que el flusher se ponga al día.
+    """
+    UNFLUSHED_KEY = "cart:unflushed"
+    UNFLUSHED_VERSIONS_KEY = "cart:unflushed:version"
+    
+    # KEYS: carrito, versión, hash de estados y de versiones sin aplicar, stream.
+    # ARGV: valor serializado, versión nueva, versión leída ('' si no había
+    # valor en caché), TTL, user_id, estado en JSON
+    APPEND_SCRIPT = """
+    local current = ''
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        current = redis.call('GET', KEYS[2]) or ''
+    end
+    if current ~= ARGV[3] then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[4])
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[4])
+    redis.call('HSET', KEYS[3], ARGV[5], ARGV[6])
+    redis.call('HSET', KEYS[4], ARGV[5], ARGV[2])
+    redis.call('XADD', KEYS[5], '*', 'user_id', ARGV[5], 'version', ARGV[2], 'payload', ARGV[6])
+    return 1
+    """
+    
+    # Quita del hash los carritos aplicados, salvo que tengan una versión más nueva.
+    # ARGV: pares user_id, versión aplicada
+    CLEAR_SCRIPT = """
+    local cleared = 0
+    for i = 1, #ARGV, 2 do
+        if redis.call('HGET', KEYS[2], ARGV[i]) == ARGV[i + 1] then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+            redis.call('HDEL', KEYS[2], ARGV[i])
+            cleared = cleared + 1
+        end
+    end
+    return cleared
+    """
+    
+    def __init__(self):
+        self.stream = Config.CART_JOURNAL_STREAM
+        self.group = Config.CART_JOURNAL_GROUP
+        self._append = None
+        self._clear = None
+        self._group_ready = False
+        self._lag = 0.0
+        self._lag_checked_at = 0.0
+        self.rejected_writes = 0
+    
+    def ensure_group(self) -> None:
+        """Crear el stream y el grupo de consumidores si no existen"""
+        if self._group_ready:
+            return
+        try:
+            cache.master.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+            logger.info(f"Grupo {self.group} creado en {self.stream}")
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._append = cache.master.register_script(self.APPEND_SCRIPT)
+        self._clear = cache.master.register_script(self.CLEAR_SCRIPT)
+        self._group_ready = True
+    
+    def check_writable(self) -> None:
+        """Lanzar WriteBehindUnavailableError si Redis no responde o el journal está atrasado"""
+        if not cache.available:
+            self.rejected_writes += 1
+            raise WriteBehindUnavailableError("Redis no disponible para el journal de carritos")
+        
+        now = time.monotonic()
+        if now - self._lag_checked_at >= Config.CART_WRITE_BEHIND_LAG_CHECK_INTERVAL:
+            try:
+                self.ensure_group()
+                self._lag = self.lag_seconds()
+            except redis.RedisError as e:
+                self.rejected_writes += 1
+                raise WriteBehindUnavailableError(f"No se pudo medir el atraso del journal: {e}")
+            self._lag_checked_at = now
+        
+        if self._lag > Config.CART_WRITE_BEHIND_MAX_LAG:
+            self.rejected_writes += 1
+            raise WriteBehindUnavailableError(
+                f"Journal de carritos atrasado {self._lag:.1f}s (máximo {Config.CART_WRITE_BEHIND_MAX_LAG}s)"
+            )
+    
+    def append(self, cache_key: str, user_id: str, payload: dict, version: int,
+               expected_version: Optional[int]) -> bool:
+        """Guardar el carrito en Redis y agregar la mutación al journal.
+        
+        Retorna False si la versión en caché ya no es `expected_version`
+        (None: no había valor), es decir, si otro proceso lo modificó.
+        """
+        self.ensure_group()
+        applied = cache.run_write_script(
+            self._append,
+            keys=[
+                cache_key,
+                f"{cache_key}{cache.VERSION_SUFFIX}",
+                self.UNFLUSHED_KEY,
+                self.UNFLUSHED_VERSIONS_KEY,
+                self.stream
+            ],
+            args=[
+                cache.serializer.dumps(payload),
+                version,
+                '' if expected_version is None else expected_version,
+                Config.CACHE_EXPIRATION,
+                user_id,
+                json.dumps(payload)
+            ],
+            invalidate=[cache_key]
+        )
+        return bool(applied)
+    
+    def load_unflushed(self, user_ids: List[str]) -> Dict[str, dict]:
+        """Estados de carritos todavía no aplicados en PostgreSQL"""
+        if not user_ids or not cache.available:
+            return {}
+        try:
+            values = cache.master.hmget(self.UNFLUSHED_KEY, user_ids)
+            return {user_id: json.loads(value) for user_id, value in zip(user_ids, values) if value}
+        except Exception as e:
+            logger.error(f"Error leyendo carritos sin aplicar: {e}")
+            return {}
+    
+    def clear_unflushed(self, versions: Dict[str, int]) -> int:
+        """Quitar del hash los carritos ya aplicados en su versión `versions[user_id]`"""
+        if not versions:
+            return 0
+        args = []
+        for user_id, version in versions.items():
+            args.extend([user_id, version])
+        return self._clear(keys=[self.UNFLUSHED_KEY, self.UNFLUSHED_VERSIONS_KEY], args=args)
+    
+    def oldest_unflushed(self) -> Tuple[Optional[str], Optional[str], float]:
+        """Entrada más antigua sin aplicar, último id entregado y hora de Redis (segundos)"""
+        pipe = cache.master.pipeline(transaction=False)
+        pipe.xpending(self.stream, self.group)
+        pipe.xinfo_groups(self.stream)
+        pipe.time()
+        pending, groups, (seconds, micros) = pipe.execute()
+        now = seconds + micros / 1_000_000
+        
+        last_delivered = next((g['last-delivered-id'] for g in groups if g['name'] == self.group), '0-0')
+        # Las entradas pendientes se entregaron antes que las no entregadas
+        if pending['pending']:
+            return pending['min'], last_delivered, now
+        following = cache.master.xrange(self.stream, min=f"({last_delivered}", count=1)
+        return (following[0][0] if following else None), last_delivered, now
+    
+    def lag_seconds(self) -> float:
+        """Antigüedad de la mutación más vieja que aún no está en PostgreSQL"""
+        oldest, _, now = self.oldest_unflushed()
+        if oldest is None:
+            return 0.0
+        return max(now - int(oldest.split('-')[0]) / 1000, 0.0)
+    
+    def get_stats(self) -> dict:
+        try:
+            self.ensure_group()
+            lag = self.lag_seconds()
+            pipe = cache.master.pipeline(transaction=False)
+            pipe.xlen(self.stream)
+            pipe.hlen(self.UNFLUSHED_KEY)
+            length, unflushed = pipe.execute()
+        except Exception as e:
+            logger.error(f"Error obteniendo estadísticas del journal: {e}")
+            return {'mode': 'write_behind', 'status': 'unavailable'}
+        return {
+            'mode': 'write_behind',
+            'stream': self.stream,
+            'stream_length': length,
+            'unflushed_carts': unflushed,
+            'lag_seconds': round(lag, 3),
+            'max_lag_seconds': Config.CART_WRITE_BEHIND_MAX_LAG,
+            'rejected_writes': self.rejected_writes
+        }
+
+class CartFlusher(StreamConsumer):
+    """Consumidor del journal que aplica los carritos en PostgreSQL por lotes.
+    
+    Cada lote se reduce a la última versión de cada carrito y se escribe con
+    un número constante de sentencias; la actualización es condicional a la
+    versión, así que reaplicar una entrada es inofensivo. Las entradas se
+    confirman sólo después del commit (ver StreamConsumer).
+    """
+    
+    def __init__(self, journal: CartJournal, consumer: str = None):
+        super().__init__(
+            journal.stream,
+            journal.group,
+            consumer,
+            batch_size=Config.CART_FLUSH_BATCH_SIZE,
+            block_ms=Config.CART_FLUSH_BLOCK_MS,
+            claim_idle_ms=Config.CART_FLUSH_CLAIM_IDLE_MS
+        )
+        self.journal = journal
+        self.flushed_carts = 0
+        self.failed_carts = 0
+    
+    def ensure_group(self) -> None:
+        self.journal.ensure_group()
+    
+    def flush_once(self) -> int:
+        """Aplicar todo lo pendiente y retornar cuántos carritos se escribieron"""
+        return self.drain()
+    
+    def after_claim(self) -> None:
+        """Recortar del stream las entradas ya aplicadas"""
+        oldest, last_delivered, _ = self.journal.oldest_unflushed()
+        cache.master.xtrim(self.journal.stream, minid=oldest or last_delivered, approximate=True)
+    
+    def process(self, entries: list) -> int:
+        """Aplicar un lote de entradas y confirmar las de carritos escritos"""
+        if not entries:
+            return 0
+        
+        latest = {}
+        entry_ids = {}
+        for entry_id, fields in entries:
+            user_id = fields['user_id']
+            version = int(fields['version'])
+            entry_ids.setdefault(user_id, []).append(entry_id)
+            if user_id not in latest or version > latest[user_id]['version']:
+                latest[user_id] = json.loads(fields['payload'])
+        
+        try:
+            self._persist(list(latest.values()))
+            flushed = list(latest)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error aplicando lote de {len(latest)} carritos, reintentando uno por uno: {e}")
+            flushed = []
+            for user_id, payload in latest.items():
+                try:
+                    self._persist([payload])
+                    flushed.append(user_id)
+                except Exception as error:
+                    db.session.rollback()
+                    self.failed_carts += 1
+                    logger.error(f"Error aplicando carrito {user_id}, queda pendiente: {error}")
+        
+        if flushed:
+            # Si el proceso muere entre ambos pasos las entradas se reaplican sin efecto
+            self.journal.clear_unflushed({user_id: latest[user_id]['version'] for user_id in flushed})
+            self.ack([entry_id for user_id in flushed for entry_id in entry_ids[user_id]])
+            self.flushed_carts += len(flushed)
+            logger.info(f"Aplicados {len(flushed)} carritos ({len(entries)} entradas del journal)")
+        return len(flushed)
+    
+    def _persist(self, payloads: List[dict]) -> None:
+        """Escribir los carritos y sus items en una transacción, salvo los que la BD tenga más nuevos"""
+        carts = DBCart.__table__
+        items = DBCartItem.__table__
+        now = datetime.now(timezone.utc)
+        
+        statement = pg_insert(carts).values([
+            {'user_id': p['user_id'], 'version': p['version'], 'created_at': now, 'updated_at': now}
+            for p in payloads
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'version': statement.excluded.version, 'updated_at': now},
+            where=carts.c.version < statement.excluded.version
+        ).returning(carts.c.id, carts.c.user_id)
+        cart_ids = {row.user_id: row.id for row in db.session.execute(statement)}
+        
+        if cart_ids:
+            # Como en save_cart: las filas de product_stats, todas y en orden, antes del upsert y el DELETE
+            db.session.execute(lock_product_stats_statement(
+                {item['product_id'] for p in payloads if p['user_id'] in cart_ids for item in p['items']},
+                cart_ids.values()
+            ))
+        
+        rows = [
+            {
+                'cart_id': cart_ids[p['user_id']],
+                'product_id': item['product_id'],
+                'name': item['name'],
+                'price': item['price'],
+                'quantity': item['quantity'],
+                'created_at': now,
+                'updated_at': now
+            }
+            for p in payloads if p['user_id'] in cart_ids for item in p['items']
+        ]
+        if rows:
+            upsert = pg_insert(items).values(rows)
+            db.session.execute(upsert.on_conflict_do_update(
+                index_elements=['cart_id', 'product_id'],
+                set_={
+                    'name': upsert.excluded.name,
+                    'price': upsert.excluded.price,
+                    'quantity': upsert.excluded.quantity,
+                    'updated_at': upsert.excluded.updated_at
+                }
+            ))
+        if cart_ids:
+            db.session.execute(
+                delete(items).where(
+                    items.c.cart_id.in_(list(cart_ids.values())),
+                    tuple_(items.c.cart_id, items.c.product_id).not_in(
+                        [(row['cart_id'], row['product_id']) for row in rows]
+                    )
+                )
+            )
+        db.session.commit()
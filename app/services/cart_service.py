@@ -1,213 +1,833 @@
-from app.models.cart import Cart, CartItem
-from app.models.database import db, DBCart, DBCartItem
+from app.models.cart import Cart, CartItem, ItemDelta, diff_items
+from app.models.database import db, DBCart, DBCartItem, DBProductStats, cart_version_seq, get_pool_stats, lock_product_stats_statement
 from app.cache import cache
-from typing import Optional
+from app.services.cart_journal import CartJournal, WriteBehindUnavailableError
+from app.services.cart_events import CartEvent, publish_event
+from app.config import Config
+from typing import Optional, List, Dict, Tuple, Callable, Any
 import logging
-from sqlalchemy import func
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import func, delete, update, select, insert, literal_column, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 logger = logging.getLogger(__name__)
 
 class CartService:
     CART_CACHE_PREFIX = "cart:"
     PRODUCT_STATS_KEY = "product_stats"
-    TOP_PRODUCTS_KEY = "top_products"
+    
+    # Ranking incremental de productos: sorted set por unidades + hashes auxiliares
+    LEADERBOARD_KEY = "leaderboard:quantity"
+    LEADERBOARD_ORDERS_KEY = "leaderboard:orders"
+    LEADERBOARD_PRICES_KEY = "leaderboard:price_sum"
+    LEADERBOARD_NAMES_KEY = "leaderboard:names"
+    LEADERBOARD_BUILT_KEY = "leaderboard:built"
+    # Vida de las claves temporales de una reconstrucción que no llegó al RENAME
+    LEADERBOARD_TEMP_TTL = 300
+    
+    # Tendencias por ventana: buckets por unidades agregadas (las quitadas no
+    # restan) que expiran solos y se suman
+    # con ZUNIONSTORE. Ventana: (segundos por bucket, cantidad de buckets)
+    TRENDING_KEY = "leaderboard:trending"
+    TRENDING_WINDOWS = {'1h': (60, 60), '24h': (3600, 24), '7d': (3600, 168)}
+    
+    def __init__(self):
+        # En write-behind las mutaciones se aplican en Redis y el flusher las lleva a la BD
+        self.journal = CartJournal() if Config.CART_WRITE_MODE == 'write_behind' else None
     
     def get_cart(self, user_id: str) -> Cart:
         """Obtener carrito usando patrón Cache-Aside"""
         cache_key = f"{self.CART_CACHE_PREFIX}{user_id}"
         
-        # 1. Intentar obtener del caché
-        cached_cart = cache.get(cache_key)
-        if cached_cart:
-            logger.info(f"Carrito {user_id} obtenido del caché")
-            items = [CartItem(**item) for item in cached_cart['items']]
-            return Cart(user_id=user_id, items=items)
+        # Ante un fallo de caché sólo una petición consulta la BD (single-flight)
+        cached_cart = cache.get_or_load(
+            cache_key,
+            lambda: self._load_cart_from_db(user_id),
+            version=lambda payload: payload['version']
+        )
+        return self._cart_from_dict(user_id, cached_cart)
+    
+    def get_carts(self, user_ids: List[str]) -> List[Cart]:
+        """Obtener varios carritos: un MGET, una consulta para los fallos y un pipeline"""
+        user_ids = list(dict.fromkeys(user_ids))
+        cache_keys = [f"{self.CART_CACHE_PREFIX}{user_id}" for user_id in user_ids]
+        
+        carts = {}
+        for user_id, cached_cart in zip(user_ids, cache.mget(cache_keys)):
+            if cached_cart is not None:
+                carts[user_id] = self._cart_from_dict(user_id, cached_cart)
+        
+        missing = [user_id for user_id in user_ids if user_id not in carts]
+        if missing:
+            logger.info(f"{len(missing)} de {len(user_ids)} carritos no encontrados en caché, consultando BD")
+            payloads = self._load_carts(missing)
+            backfill = {}
+            for user_id in missing:
+                payload = payloads.get(user_id) or self._cache_payload(Cart(user_id=user_id, items=[]), 0)
+                carts[user_id] = self._cart_from_dict(user_id, payload)
+                backfill[f"{self.CART_CACHE_PREFIX}{user_id}"] = (payload, payload['version'])
+            cache.mset_versioned(backfill)
         
-        # 2. Si no está en caché, obtener de la base de datos
+        return [carts[user_id] for user_id in user_ids]
+    
+    def _cart_from_dict(self, user_id: str, data: dict) -> Cart:
+        """Construir un Cart a partir de su representación en caché"""
+        items = [CartItem(**item) for item in data['items']]
+        return Cart(user_id=user_id, items=items)
+    
+    def _cache_payload(self, cart: Cart, version: int) -> dict:
+        """Representación en caché de un carrito, con su versión en la BD"""
+        payload = cart.to_dict()
+        payload['version'] = version
+        return payload
+    
+    def _load_cart_from_db(self, user_id: str) -> dict:
+        """Cargar carrito desde la BD (vacío si no existe)"""
         logger.info(f"Carrito {user_id} no encontrado en caché, consultando BD")
-        db_cart = DBCart.query.filter_by(user_id=user_id).first()
-        
-        if db_cart:
-            items = [
-                CartItem(
-                    product_id=item.product_id,
-                    name=item.name,
-                    price=item.price,
-                    quantity=item.quantity
-                ) for item in db_cart.items
-            ]
-            cart = Cart(user_id=user_id, items=items)
-            
-            # 3. Guardar en caché para futuras consultas
-            cache.set(cache_key, cart.to_dict())
-            logger.info(f"Carrito {user_id} guardado en caché")
-            
-            return cart
+        payload = self._load_carts([user_id]).get(user_id)
+        return payload or self._cache_payload(Cart(user_id=user_id, items=[]), 0)
+    
+    def _load_carts(self, user_ids: List[str]) -> Dict[str, dict]:
+        """Cargar carritos de la BD; en write-behind, con los cambios aún no aplicados"""
+        if self.journal is None:
+            return self._load_carts_from_db(user_ids)
+        # El hash se lee antes que la BD: un carrito que el flusher aplica
+        # entremedio se obtiene de uno u otro, nunca en su estado anterior
+        unflushed = self.journal.load_unflushed(user_ids)
+        payloads = self._load_carts_from_db(user_ids)
+        for user_id, payload in unflushed.items():
+            if user_id not in payloads or payload['version'] > payloads[user_id]['version']:
+                payloads[user_id] = payload
+        return payloads
+    
+    def _load_carts_from_db(self, user_ids: List[str]) -> Dict[str, dict]:
+        """Cargar varios carritos con sus items en una sola consulta.
         
-        # 4. Si no existe, retornar carrito vacío
-        empty_cart = Cart(user_id=user_id, items=[])
-        cache.set(cache_key, empty_cart.to_dict())
-        return empty_cart
+        Retorna tuplas planas en lugar de objetos ORM: en la ruta de lectura
+        sólo se necesitan los CartItem. Los usuarios sin carrito no aparecen.
+        """
+        rows = db.session.execute(self._load_carts_statement(user_ids)).all()
+        return self._payloads_from_rows(rows)
+    
+    # Sentencias y armado de resultados sin E/S: los comparte AsyncCartService,
+    # así una corrección aplica a los dos servicios
+    
+    def _load_carts_statement(self, user_ids: List[str]):
+        """Carritos con sus items, una fila por item (o una sin item si está vacío)"""
+        return select(
+            DBCart.user_id,
+            DBCart.version,
+            DBCartItem.product_id,
+            DBCartItem.name,
+            DBCartItem.price,
+            DBCartItem.quantity
+        ).outerjoin(
+            DBCartItem, DBCartItem.cart_id == DBCart.id
+        ).where(
+            DBCart.user_id.in_(user_ids)
+        ).order_by(
+            DBCartItem.id
+        )
+    
+    def _payloads_from_rows(self, rows) -> Dict[str, dict]:
+        """Agrupar las filas de _load_carts_statement en payloads de caché por usuario"""
+        carts = {}
+        versions = {}
+        for row in rows:
+            cart = carts.setdefault(row.user_id, Cart(user_id=row.user_id, items=[]))
+            versions[row.user_id] = row.version
+            if row.product_id is not None:
+                cart.items.append(CartItem(
+                    product_id=row.product_id,
+                    name=row.name,
+                    price=row.price,
+                    quantity=row.quantity
+                ))
+        return {user_id: self._cache_payload(cart, versions[user_id]) for user_id, cart in carts.items()}
     
     def save_cart(self, cart: Cart) -> None:
-        """Guardar carrito en BD y actualizar caché"""
+        """Guardar carrito en BD (upsert set-based) y actualizar caché"""
         cache_key = f"{self.CART_CACHE_PREFIX}{cart.user_id}"
         
+        if self.journal is not None:
+            def replace_items(current: Cart) -> None:
+                current.items = [CartItem(**item.to_dict()) for item in cart.items]
+            self._mutate_write_behind(cart.user_id, 'save', replace_items)
+            return
+        
         try:
-            # 1. Guardar en base de datos
-            db_cart = DBCart.query.filter_by(user_id=cart.user_id).first()
-            if not db_cart:
-                db_cart = DBCart(user_id=cart.user_id)
-                db.session.add(db_cart)
-                db.session.flush()
+            # 1. Guardar en base de datos con un número constante de sentencias
+            cart_id, version, _ = self._lock_cart(cart.user_id)
             
-            # Crear diccionario de items existentes para búsqueda rápida
-            existing_items = {item.product_id: item for item in db_cart.items}
-            new_items = {item.product_id: item for item in cart.items}
+            # La fila del carrito queda bloqueada hasta el commit, así que el
+            # estado previo leído aquí es consistente para calcular los cambios
+            previous = self._load_carts_from_db([cart.user_id]).get(cart.user_id)
+            previous_items = self._cart_from_dict(cart.user_id, previous).items if previous else []
+            deltas = diff_items(previous_items, cart.items)
             
-            # Actualizar o insertar items
-            for product_id, cart_item in new_items.items():
-                if product_id in existing_items:
-                    db_item = existing_items[product_id]
-                    db_item.name = cart_item.name
-                    db_item.price = cart_item.price
-                    db_item.quantity = cart_item.quantity
-                else:
-                    db_item = DBCartItem(
-                        cart_id=db_cart.id,
-                        product_id=cart_item.product_id,
-                        name=cart_item.name,
-                        price=cart_item.price,
-                        quantity=cart_item.quantity
-                    )
-                    db.session.add(db_item)
+            # El upsert y el DELETE tocan product_stats en dos sentencias:
+            # bloquear antes todas sus filas en orden evita interbloqueos
+            db.session.execute(lock_product_stats_statement([item.product_id for item in cart.items], [cart_id]))
+            
+            # Insertar o actualizar todos los items en una sentencia
+            if cart.items:
+                db.session.execute(self._upsert_items_statement(cart_id, cart.items))
             
             # Eliminar items que ya no están en el carrito
-            for product_id, db_item in existing_items.items():
-                if product_id not in new_items:
-                    db.session.delete(db_item)
+            db.session.execute(
+                delete(DBCartItem).where(
+                    DBCartItem.cart_id == cart_id,
+                    DBCartItem.product_id.not_in([item.product_id for item in cart.items])
+                )
+            )
             
             db.session.commit()
             
             # 2. Actualizar caché
-            cache.set(cache_key, cart.to_dict())
+            cache.set_versioned(cache_key, self._cache_payload(cart, version), version)
             logger.info(f"Carrito {cart.user_id} guardado en BD y caché")
             
-            # 3. Actualizar estadísticas de productos
-            self._update_product_stats(cart)
+            # 3. Actualizar estadísticas y ranking de productos y publicar el evento
+            self._publish_changes(CartEvent(type='save', user_id=cart.user_id, version=version, deltas=deltas))
             
         except Exception as e:
             db.session.rollback()
             logger.error(f"Error guardando carrito {cart.user_id}: {e}")
             raise
     
+    def _lock_cart(self, user_id: str) -> Tuple[int, int, Optional[int]]:
+        """Bloquear el carrito (creándolo si no existe) y asignarle una versión nueva.
+        
+        Retorna (id, versión nueva, versión anterior o None si no existía). Las
+        mutaciones concurrentes del mismo carrito quedan serializadas hasta el
+        commit.
+        """
+        previous_version = db.session.execute(self._lock_cart_statement(user_id)).scalar_one_or_none()
+        row = db.session.execute(self._bump_version_statement(user_id, previous_version is not None)).one()
+        return row.id, row.version, previous_version
+    
+    def _lock_cart_statement(self, user_id: str):
+        """SELECT ... FOR UPDATE de la versión del carrito"""
+        carts = DBCart.__table__
+        return select(carts.c.version).where(carts.c.user_id == user_id).with_for_update()
+    
+    def _bump_version_statement(self, user_id: str, exists: bool):
+        """Asignar al carrito una versión nueva, creándolo si no existe; retorna (id, version)"""
+        carts = DBCart.__table__
+        now = datetime.now(timezone.utc)
+        
+        if not exists:
+            statement = pg_insert(carts).values(
+                user_id=user_id,
+                version=cart_version_seq.next_value(),
+                created_at=now,
+                updated_at=now
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={'version': cart_version_seq.next_value(), 'updated_at': now}
+            )
+        else:
+            statement = update(carts).where(
+                carts.c.user_id == user_id
+            ).values(
+                version=cart_version_seq.next_value(),
+                updated_at=now
+            )
+        return statement.returning(carts.c.id, carts.c.version)
+    
+    def _upsert_items_statement(self, cart_id: int, items: List[CartItem]):
+        """INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE para todos los items"""
+        now = datetime.now(timezone.utc)
+        statement = pg_insert(DBCartItem.__table__).values([
+            {
+                'cart_id': cart_id,
+                'product_id': item.product_id,
+                'name': item.name,
+                'price': item.price,
+                'quantity': item.quantity,
+                'created_at': now,
+                'updated_at': now
+            } for item in items
+        ])
+        return statement.on_conflict_do_update(
+            index_elements=['cart_id', 'product_id'],
+            set_={
+                'name': statement.excluded.name,
+                'price': statement.excluded.price,
+                'quantity': statement.excluded.quantity,
+                'updated_at': statement.excluded.updated_at
+            }
+        )
+    
     def add_item(self, user_id: str, item_data: dict) -> Cart:
-        """Agregar item al carrito"""
-        cart = self.get_cart(user_id)
-        new_item = CartItem(**item_data)
-        cart.add_item(new_item)
-        self.save_cart(cart)
+        """Agregar item al carrito modificando sólo su fila"""
+        item = CartItem(**item_data)
+        if self.journal is not None:
+            return self._mutate_write_behind(user_id, 'add', lambda cart: cart.add_item(item))[0]
         
-        # Invalidar caché de top productos
-        cache.delete(self.TOP_PRODUCTS_KEY)
+        try:
+            cart_id, version, previous_version = self._lock_cart(user_id)
+            row = db.session.execute(self._add_item_statement(cart_id, item)).one()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error agregando item al carrito {user_id}: {e}")
+            raise
         
-        return cart
+        self._publish_changes(self._item_added_event(user_id, version, item, row))
+        return self._patch_cached_cart(user_id, version, previous_version, lambda cart: cart.add_item(item))
+    
+    def _add_item_statement(self, cart_id: int, item: CartItem):
+        """Insertar el item; si el producto ya está se suman las unidades de forma atómica"""
+        items = DBCartItem.__table__
+        now = datetime.now(timezone.utc)
+        statement = pg_insert(items).values(
+            cart_id=cart_id,
+            product_id=item.product_id,
+            name=item.name,
+            price=item.price,
+            quantity=item.quantity,
+            created_at=now,
+            updated_at=now
+        )
+        return statement.on_conflict_do_update(
+            index_elements=['cart_id', 'product_id'],
+            set_={'quantity': items.c.quantity + statement.excluded.quantity, 'updated_at': now}
+        ).returning(
+            items.c.price,
+            literal_column('(xmax = 0)').label('inserted')
+        )
+    
+    def _item_added_event(self, user_id: str, version: int, item: CartItem, row) -> CartEvent:
+        """Evento de add_item: sólo una fila nueva suma un pedido y su precio"""
+        return CartEvent(type='add', user_id=user_id, version=version, deltas=[ItemDelta(
+            product_id=item.product_id,
+            name=item.name,
+            quantity=item.quantity,
+            orders=1 if row.inserted else 0,
+            price=row.price if row.inserted else 0.0
+        )])
     
     def remove_item(self, user_id: str, product_id: int) -> Cart:
-        """Eliminar item del carrito"""
-        cart = self.get_cart(user_id)
-        cart.remove_item(product_id)
-        self.save_cart(cart)
+        """Eliminar item del carrito modificando sólo su fila"""
+        if self.journal is not None:
+            return self._mutate_write_behind(user_id, 'remove', lambda cart: cart.remove_item(product_id))[0]
         
-        # Invalidar caché de top productos
-        cache.delete(self.TOP_PRODUCTS_KEY)
+        try:
+            cart_id, version, previous_version = self._lock_cart(user_id)
+            removed = db.session.execute(self._remove_item_statement(cart_id, product_id)).one_or_none()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error eliminando item del carrito {user_id}: {e}")
+            raise
         
-        return cart
+        if removed:
+            self._publish_changes(self._item_removed_event(user_id, version, product_id, removed))
+        return self._patch_cached_cart(user_id, version, previous_version, lambda cart: cart.remove_item(product_id))
+    
+    def _remove_item_statement(self, cart_id: int, product_id: int):
+        """Borrar la fila del producto retornando lo que hay que descontar"""
+        items = DBCartItem.__table__
+        return delete(items).where(
+            items.c.cart_id == cart_id,
+            items.c.product_id == product_id
+        ).returning(items.c.name, items.c.price, items.c.quantity)
+    
+    def _item_removed_event(self, user_id: str, version: int, product_id: int, removed) -> CartEvent:
+        return CartEvent(type='remove', user_id=user_id, version=version, deltas=[ItemDelta(
+            product_id=product_id,
+            name=removed.name,
+            quantity=-removed.quantity,
+            orders=-1,
+            price=-removed.price
+        )])
     
     def update_quantity(self, user_id: str, product_id: int, quantity: int) -> Optional[Cart]:
-        """Actualizar cantidad de un item"""
-        cart = self.get_cart(user_id)
-        if cart.update_quantity(product_id, quantity):
-            self.save_cart(cart)
+        """Actualizar cantidad de un item modificando sólo su fila"""
+        if self.journal is not None:
+            cart, changed = self._mutate_write_behind(
+                user_id, 'update', lambda cart: cart.update_quantity(product_id, quantity)
+            )
+            return cart if changed else None
+        
+        try:
+            cart_id, version, previous_version = self._lock_cart(user_id)
+            current = db.session.execute(self._select_item_statement(cart_id, product_id)).one_or_none()
             
-            # Invalidar caché de top productos
-            cache.delete(self.TOP_PRODUCTS_KEY)
+            if current is None:
+                # El producto no está en el carrito: descartar también la nueva versión
+                db.session.rollback()
+                return None
             
-            return cart
-        return None
+            db.session.execute(self._set_quantity_statement(current.id, quantity))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error actualizando cantidad en carrito {user_id}: {e}")
+            raise
+        
+        self._publish_changes(self._quantity_updated_event(user_id, version, product_id, current, quantity))
+        return self._patch_cached_cart(
+            user_id, version, previous_version,
+            lambda cart: cart.update_quantity(product_id, quantity)
+        )
+    
+    def _select_item_statement(self, cart_id: int, product_id: int):
+        items = DBCartItem.__table__
+        return select(items.c.id, items.c.name, items.c.quantity).where(
+            items.c.cart_id == cart_id,
+            items.c.product_id == product_id
+        )
+    
+    def _set_quantity_statement(self, item_id: int, quantity: int):
+        items = DBCartItem.__table__
+        return update(items).where(
+            items.c.id == item_id
+        ).values(
+            quantity=quantity,
+            updated_at=datetime.now(timezone.utc)
+        )
+    
+    def _quantity_updated_event(self, user_id: str, version: int, product_id: int, current,
+                                quantity: int) -> CartEvent:
+        """Evento de update_quantity: cambian las unidades, no los pedidos ni el precio"""
+        return CartEvent(type='update', user_id=user_id, version=version, deltas=[ItemDelta(
+            product_id=product_id,
+            name=current.name,
+            quantity=quantity - current.quantity,
+            orders=0,
+            price=0.0
+        )])
+    
+    def _patch_cached_cart(self, user_id: str, version: int, previous_version: Optional[int],
+                           patch: Callable[[Cart], Any]) -> Cart:
+        """Aplicar una mutación al carrito cacheado sin releer toda la BD.
+        
+        Si la copia en caché corresponde exactamente a la versión anterior a
+        la mutación, se modifica en memoria; si no (ausente o desactualizada)
+        se recarga el carrito desde la BD. La escritura es condicional a la
+        versión, por lo que dos mutaciones concurrentes nunca dejan en caché
+        un carrito más viejo que el de la BD.
+        """
+        cache_key = f"{self.CART_CACHE_PREFIX}{user_id}"
+        cached_cart, cached_version = cache.get_versioned(cache_key)
+        
+        if cached_cart is not None and previous_version is not None and cached_version == previous_version:
+            cart = self._cart_from_dict(user_id, cached_cart)
+            patch(cart)
+            payload = self._cache_payload(cart, version)
+        else:
+            payload = self._load_cart_from_db(user_id)
+            cart = self._cart_from_dict(user_id, payload)
+        
+        cache.set_versioned(cache_key, payload, payload['version'])
+        return cart
+    
+    def _mutate_write_behind(self, user_id: str, event_type: str,
+                             mutate: Callable[[Cart], Any]) -> Tuple[Cart, bool]:
+        """Aplicar una mutación en Redis y registrarla en el journal, sin esperar a la BD.
+        
+        La versión se toma de cart_version_seq (nextval no espera commits ni
+        bloqueos), así que sigue siendo comparable con la de write-through. La
+        escritura es condicional a la versión leída: si otro proceso modificó
+        el carrito entretanto se reintenta sobre el valor nuevo. Si `mutate`
+        retorna False no hay cambios y no se escribe nada.
+        """
+        cache_key = f"{self.CART_CACHE_PREFIX}{user_id}"
+        for attempt in range(Config.CART_WRITE_BEHIND_CAS_RETRIES):
+            self.journal.check_writable()
+            cached_cart, cached_version = cache.get_versioned(cache_key)
+            base = cached_cart if cached_cart is not None else self._load_cart_from_db(user_id)
+            cart = self._cart_from_dict(user_id, base)
+            if mutate(cart) is False:
+                return cart, False
+            
+            version = self._next_version()
+            expected = cached_version if cached_cart is not None else None
+            if self.journal.append(cache_key, user_id, self._cache_payload(cart, version), version, expected):
+                deltas = diff_items(self._cart_from_dict(user_id, base).items, cart.items)
+                self._publish_changes(CartEvent(type=event_type, user_id=user_id, version=version, deltas=deltas))
+                return cart, True
+            logger.info(f"Carrito {user_id} modificado concurrentemente, reintentando")
+            # Espera aleatoria creciente para que los escritores no vuelvan a chocar
+            time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+        raise WriteBehindUnavailableError(f"Demasiadas escrituras concurrentes sobre el carrito {user_id}")
+    
+    def _next_version(self) -> int:
+        """Tomar la próxima versión de carrito de la secuencia"""
+        version = db.session.execute(select(cart_version_seq.next_value())).scalar_one()
+        db.session.commit()
+        return version
     
     def clear_cart(self, user_id: str) -> None:
         """Limpiar carrito"""
         cache_key = f"{self.CART_CACHE_PREFIX}{user_id}"
+        if self.journal is not None:
+            def clear(cart: Cart) -> bool:
+                had_items = bool(cart.items)
+                cart.items = []
+                return had_items
+            self._mutate_write_behind(user_id, 'clear', clear)
+            logger.info(f"Carrito {user_id} eliminado")
+            return
         
-        # Eliminar de base de datos
-        db_cart = DBCart.query.filter_by(user_id=user_id).first()
-        if db_cart:
-            db.session.delete(db_cart)
+        try:
+            # Se conserva la fila del carrito con una versión nueva y se borran sus items
+            cart_row = db.session.execute(self._bump_version_statement(user_id, exists=True)).one_or_none()
+            
+            removed = []
+            if cart_row:
+                removed = db.session.execute(self._clear_items_statement(cart_row.id)).all()
             db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error limpiando carrito {user_id}: {e}")
+            raise
+        
+        # Actualizar caché
+        if cart_row:
+            empty_cart = Cart(user_id=user_id, items=[])
+            cache.set_versioned(cache_key, self._cache_payload(empty_cart, cart_row.version), cart_row.version)
+        else:
+            cache.delete(cache_key)
         
-        # Eliminar del caché
-        cache.delete(cache_key)
+        if removed:
+            self._publish_changes(self._cart_cleared_event(user_id, cart_row.version, removed))
         logger.info(f"Carrito {user_id} eliminado")
     
-    def _update_product_stats(self, cart: Cart) -> None:
-        """Actualizar estadísticas de productos en Redis"""
+    def _clear_items_statement(self, cart_id: int):
+        """Borrar todos los items del carrito retornándolos para descontarlos"""
+        items = DBCartItem.__table__
+        return delete(items).where(
+            items.c.cart_id == cart_id
+        ).returning(items.c.product_id, items.c.name, items.c.price, items.c.quantity)
+    
+    def _cart_cleared_event(self, user_id: str, version: int, removed) -> CartEvent:
+        deltas = diff_items([
+            CartItem(product_id=row.product_id, name=row.name, price=row.price, quantity=row.quantity)
+            for row in removed
+        ], [])
+        return CartEvent(type='clear', user_id=user_id, version=version, deltas=deltas)
+    
+    def _publish_changes(self, event: CartEvent) -> None:
+        """Aplicar a estadísticas y ranking sólo los cambios y publicar el evento, en un round-trip"""
+        if not event.deltas:
+            return
         try:
-            for item in cart.items:
-                stats_key = f"{self.PRODUCT_STATS_KEY}:{item.product_id}"
-                cache.increment(stats_key, item.quantity)
+            with cache.batch(transaction=True) as pipe:
+                self._queue_changes(pipe, event, time.time())
         except Exception as e:
-            logger.error(f"Error actualizando estadísticas: {e}")
+            logger.error(f"Error actualizando estadísticas (evento {event.type} de {event.user_id} no publicado): {e}")
+            # El ranking quedó desfasado: se reconstruirá cuando Redis responda
+            cache.mark_dirty([self.LEADERBOARD_BUILT_KEY])
+    
+    def _queue_changes(self, pipe, event: CartEvent, now: float) -> None:
+        """Encolar en `pipe` los deltas del evento sobre estadísticas, ranking y tendencias"""
+        buckets = self._trending_buckets(now)
+        for delta in event.deltas:
+            if delta.quantity:
+                pipe.incrby(f"{self.PRODUCT_STATS_KEY}:{delta.product_id}", delta.quantity)
+                pipe.zincrby(self.LEADERBOARD_KEY, delta.quantity, delta.product_id)
+            # Las tendencias cuentan unidades agregadas: quitar o vaciar un carrito
+            # no descuenta de la ventana las que se agregaron antes
+            if delta.quantity > 0:
+                for bucket in buckets:
+                    pipe.zincrby(bucket, delta.quantity, delta.product_id)
+            if delta.orders:
+                pipe.hincrby(self.LEADERBOARD_ORDERS_KEY, delta.product_id, delta.orders)
+            if delta.price:
+                pipe.hincrbyfloat(self.LEADERBOARD_PRICES_KEY, delta.product_id, delta.price)
+            pipe.hset(self.LEADERBOARD_NAMES_KEY, delta.product_id, delta.name)
+        # Productos que ya no están en ningún carrito salen del ranking
+        pipe.zremrangebyscore(self.LEADERBOARD_KEY, '-inf', 0)
+        for bucket, ttl in buckets.items():
+            pipe.expire(bucket, ttl)
+        if Config.CART_EVENTS_ENABLED:
+            publish_event(pipe, event)
     
     def get_top_products(self, limit: int = 10) -> list:
-        """Obtener top productos más comprados usando caché"""
+        """Obtener top productos más comprados desde el ranking en Redis"""
+        # ZREVRANGE 0 -1 devolvería el ranking completo
+        if limit <= 0:
+            return []
+        if not cache.available:
+            return self._top_products_from_db(limit)
+        try:
+            # Reconstruir si falta (primer arranque, Redis vaciado) o toca reconciliar
+            cache.get_or_load(
+                self.LEADERBOARD_BUILT_KEY,
+                self._build_leaderboard,
+                expiration=Config.LEADERBOARD_REBUILD_INTERVAL
+            )
+            return self._read_leaderboard(limit)
+        except Exception as e:
+            logger.error(f"Error obteniendo top productos: {e}")
+            return []
+    
+    def _read_leaderboard(self, limit: int) -> list:
+        """Leer los `limit` primeros productos del ranking: O(log N + limit)"""
+        top = cache.zrevrange(self.LEADERBOARD_KEY, 0, limit - 1, withscores=True)
+        if not top:
+            return []
         
-        # 1. Intentar obtener del caché
-        cached_top = cache.get(self.TOP_PRODUCTS_KEY)
-        if cached_top:
-            logger.info("Top productos obtenido del caché")
-            return cached_top[:limit]
+        product_ids = [product_id for product_id, _ in top]
+        with cache.read_pipeline() as pipe:
+            pipe.hmget(self.LEADERBOARD_NAMES_KEY, product_ids)
+            pipe.hmget(self.LEADERBOARD_ORDERS_KEY, product_ids)
+            pipe.hmget(self.LEADERBOARD_PRICES_KEY, product_ids)
+            names, orders, prices = pipe.execute()
+        return self._leaderboard_entries(top, names, orders, prices)
+    
+    def _leaderboard_entries(self, top: list, names: list, orders: list, prices: list) -> list:
+        """Combinar ZREVRANGE con los HMGET de nombres, pedidos y precios"""
+        top_products = []
+        for (product_id, score), name, times_ordered, price_sum in zip(top, names, orders, prices):
+            times_ordered = int(times_ordered or 0)
+            top_products.append({
+                'product_id': int(product_id),
+                'name': name,
+                'total_quantity': int(score),
+                'times_ordered': times_ordered,
+                'avg_price': float(price_sum or 0) / times_ordered if times_ordered else 0.0
+            })
+        return top_products
+    
+    @classmethod
+    def _trending_buckets(cls, now: float) -> Dict[str, int]:
+        """Buckets en curso en `now` (uno por tamaño) con su TTL en segundos"""
+        ttls = {}
+        for size, count in cls.TRENDING_WINDOWS.values():
+            # Un bucket vive lo que la ventana más larga que lo suma, más uno en curso
+            ttls[size] = max(ttls.get(size, 0), size * (count + 1))
+        return {f"{cls.TRENDING_KEY}:{size}:{int(now // size)}": ttl for size, ttl in ttls.items()}
+    
+    @classmethod
+    def _trending_window_buckets(cls, window: str, now: float) -> List[str]:
+        """Buckets que cubren la ventana hasta `now`, incluido el bucket en curso"""
+        size, count = cls.TRENDING_WINDOWS[window]
+        current = int(now // size)
+        return [f"{cls.TRENDING_KEY}:{size}:{bucket}" for bucket in range(current - count + 1, current + 1)]
+    
+    def get_trending_products(self, window: str, limit: int = 10) -> list:
+        """Top de productos por unidades agregadas a carritos en la ventana ('1h', '24h' o '7d')"""
+        if limit <= 0:
+            return []
+        if not cache.available:
+            logger.warning(f"Redis no disponible, sin tendencias para la ventana {window}")
+            return []
+        try:
+            # La suma de buckets se recalcula a lo sumo una vez por TRENDING_CACHE_TTL
+            cache.get_or_load(
+                f"{self.TRENDING_KEY}:{window}:built",
+                lambda: self._build_trending(window),
+                expiration=Config.TRENDING_CACHE_TTL
+            )
+            return self._read_trending(window, limit)
+        except Exception as e:
+            logger.error(f"Error obteniendo tendencias {window}: {e}")
+            return []
+    
+    def _build_trending(self, window: str) -> dict:
+        """Sumar los buckets de la ventana en un sorted set: O(buckets + productos)"""
+        with cache.batch(transaction=True) as pipe:
+            buckets = self._queue_trending_build(pipe, window, time.time())
+        return {'window': window, 'buckets': len(buckets), 'built_at': time.time()}
+    
+    def _queue_trending_build(self, pipe, window: str, now: float) -> List[str]:
+        """Encolar la suma de los buckets de la ventana; retorna los buckets sumados"""
+        buckets = self._trending_window_buckets(window, now)
+        key = f"{self.TRENDING_KEY}:{window}"
+        pipe.zunionstore(key, buckets)
+        # Unidades netas: los productos que salieron más de lo que entraron no cuentan
+        pipe.zremrangebyscore(key, '-inf', 0)
+        # Vive más que la marca, para no leerlo ausente mientras se recalcula
+        pipe.expire(key, Config.TRENDING_CACHE_TTL * 2)
+        return buckets
+    
+    def _read_trending(self, window: str, limit: int) -> list:
+        """Leer los `limit` primeros productos de la ventana"""
+        top = cache.zrevrange(f"{self.TRENDING_KEY}:{window}", 0, limit - 1, withscores=True)
+        if not top:
+            return []
         
-        # 2. Si no está en caché, calcular desde BD
-        logger.info("Top productos no encontrado en caché, calculando desde BD")
+        with cache.read_pipeline() as pipe:
+            pipe.hmget(self.LEADERBOARD_NAMES_KEY, [product_id for product_id, _ in top])
+            names, = pipe.execute()
+        return self._trending_entries(top, names)
+    
+    def _trending_entries(self, top: list, names: list) -> list:
+        return [{
+            'product_id': int(product_id),
+            'name': name,
+            'total_quantity': int(score)
+        } for (product_id, score), name in zip(top, names)]
+    
+    def _top_products_from_db(self, limit: int) -> list:
+        """Leer el top de productos de product_stats (Redis no disponible): `limit` filas por índice"""
+        logger.info("Redis no disponible, leyendo top productos desde BD")
+        return self._top_product_entries(db.session.execute(self._top_products_statement(limit)).all())
+    
+    def _top_products_statement(self, limit: int):
+        """Los `limit` productos con más unidades según product_stats"""
+        return self._product_stats_query().where(
+            DBProductStats.total_quantity > 0
+        ).order_by(
+            DBProductStats.total_quantity.desc()
+        ).limit(limit)
+    
+    def _top_product_entries(self, rows) -> list:
+        """Filas de product_stats en el formato de get_top_products"""
+        return [{
+            'product_id': r.product_id,
+            'name': r.name,
+            'total_quantity': int(r.total_quantity),
+            'times_ordered': r.times_ordered,
+            'avg_price': float(r.price_sum) / r.times_ordered if r.times_ordered else 0.0
+        } for r in rows]
+    
+    def _product_stats_query(self):
+        """Totales por producto precalculados en product_stats"""
+        return select(
+            DBProductStats.product_id,
+            DBProductStats.name,
+            DBProductStats.total_quantity,
+            DBProductStats.times_ordered,
+            DBProductStats.price_sum
+        )
+    
+    def _product_totals_query(self):
+        """Totales por producto agregando todos los carritos (sólo para recalcular product_stats)"""
+        return db.session.query(
+            DBCartItem.product_id,
+            func.max(DBCartItem.name).label('name'),
+            func.sum(DBCartItem.quantity).label('total_quantity'),
+            func.count(DBCartItem.id).label('times_ordered'),
+            func.sum(DBCartItem.price).label('price_sum')
+        ).group_by(
+            DBCartItem.product_id
+        )
+    
+    def rebuild_product_stats(self) -> dict:
+        """Recalcular product_stats desde cart_items (backfill inicial o reconciliación).
         
+        El bloqueo SHARE deja leer cart_items pero espera a las escrituras en
+        curso y detiene las nuevas hasta el commit, así ningún cambio aplicado
+        por los triggers se pierde ni se cuenta dos veces.
+        """
+        stats = DBProductStats.__table__
+        totals = self._product_totals_query().subquery()
         try:
-            # Consulta para obtener productos más comprados
-            top_products_query = db.session.query(
-                DBCartItem.product_id,
-                DBCartItem.name,
-                func.sum(DBCartItem.quantity).label('total_quantity'),
-                func.count(DBCartItem.id).label('times_ordered'),
-                func.avg(DBCartItem.price).label('avg_price')
-            ).group_by(
-                DBCartItem.product_id, 
-                DBCartItem.name
-            ).order_by(
-                func.sum(DBCartItem.quantity).desc()
-            ).limit(limit * 2)  # Obtener más para el caché
-            
-            results = top_products_query.all()
-            
-            top_products = []
-            for result in results:
-                top_products.append({
-                    'product_id': result.product_id,
-                    'name': result.name,
-                    'total_quantity': int(result.total_quantity),
-                    'times_ordered': result.times_ordered,
-                    'avg_price': float(result.avg_price)
-                })
-            
-            # 3. Guardar en caché por 10 minutos
-            cache.set(self.TOP_PRODUCTS_KEY, top_products, expiration=600)
-            logger.info("Top productos calculado y guardado en caché")
-            
-            return top_products[:limit]
-            
+            # El recálculo recorre toda la tabla: sin el límite de DB_STATEMENT_TIMEOUT_MS
+            db.session.execute(text("SET LOCAL statement_timeout = 0"))
+            db.session.execute(text("LOCK TABLE cart_items IN SHARE MODE"))
+            db.session.execute(delete(stats))
+            db.session.execute(insert(stats).from_select(
+                ['product_id', 'name', 'total_quantity', 'times_ordered', 'price_sum', 'updated_at'],
+                select(
+                    totals.c.product_id,
+                    totals.c.name,
+                    totals.c.total_quantity,
+                    totals.c.times_ordered,
+                    totals.c.price_sum,
+                    func.now()
+                )
+            ))
+            products = db.session.execute(select(func.count()).select_from(stats)).scalar_one()
+            db.session.commit()
         except Exception as e:
-            logger.error(f"Error calculando top productos: {e}")
-            return []
+            db.session.rollback()
+            logger.error(f"Error recalculando product_stats: {e}")
+            raise
+        
+        logger.info(f"product_stats recalculada con {products} productos")
+        return {'products': products, 'rebuilt_at': time.time()}
+    
+    def rebuild_leaderboard(self) -> dict:
+        """Reconciliar el ranking de productos desde PostgreSQL"""
+        result = self._build_leaderboard()
+        cache.set(self.LEADERBOARD_BUILT_KEY, result, expiration=Config.LEADERBOARD_REBUILD_INTERVAL)
+        return result
+    
+    def _build_leaderboard(self) -> dict:
+        """Recalcular ranking y contadores desde la BD y reemplazarlos atómicamente.
+        
+        El ranking se arma en claves temporales y se reemplaza con RENAME en
+        un MULTI corto. Los deltas publicados entre la lectura de
+        product_stats y el RENAME pueden desfasarlo: se pierde el de una
+        escritura confirmada después de la lectura que llegó a Redis antes del
+        RENAME, y se cuenta dos veces el de una confirmada antes de la lectura
+        que llegó después. El desfase se limita a las escrituras en vuelo
+        durante la reconstrucción y la siguiente lo corrige.
+        """
+        logger.info("Reconstruyendo ranking de productos desde BD")
+        
+        results = db.session.execute(self._leaderboard_source_query()).all()
+        temp_keys = self._leaderboard_temp_keys()
+        
+        with cache.batch() as pipe:
+            scores = self._queue_leaderboard_build(pipe, results, temp_keys)
+        # MULTI/EXEC: los lectores ven el ranking anterior o el nuevo, nunca uno parcial
+        with cache.batch(transaction=True) as pipe:
+            self._queue_leaderboard_swap(pipe, temp_keys, scores, bool(results))
+        
+        logger.info(f"Ranking reconstruido con {len(scores)} productos")
+        return {'products': len(scores), 'rebuilt_at': time.time()}
+    
+    def _leaderboard_source_query(self):
+        """Productos de product_stats que alguna vez estuvieron en un carrito"""
+        return self._product_stats_query().where(DBProductStats.times_ordered > 0)
+    
+    def _leaderboard_temp_keys(self) -> Dict[str, str]:
+        """Clave temporal (única por reconstrucción) de cada clave del ranking"""
+        suffix = uuid.uuid4().hex
+        return {
+            key: f"{key}:rebuild:{suffix}"
+            for key in (
+                self.LEADERBOARD_KEY,
+                self.LEADERBOARD_ORDERS_KEY,
+                self.LEADERBOARD_PRICES_KEY,
+                self.LEADERBOARD_NAMES_KEY
+            )
+        }
+    
+    def _queue_leaderboard_build(self, pipe, results, temp_keys: Dict[str, str]) -> Dict[int, int]:
+        """Encolar el armado del ranking en las claves temporales; retorna las unidades por producto"""
+        scores = {r.product_id: int(r.total_quantity) for r in results if r.total_quantity > 0}
+        if scores:
+            pipe.zadd(temp_keys[self.LEADERBOARD_KEY], scores)
+        if results:
+            pipe.hset(temp_keys[self.LEADERBOARD_ORDERS_KEY], mapping={r.product_id: r.times_ordered for r in results})
+            pipe.hset(temp_keys[self.LEADERBOARD_PRICES_KEY], mapping={r.product_id: float(r.price_sum) for r in results})
+            pipe.hset(temp_keys[self.LEADERBOARD_NAMES_KEY], mapping={r.product_id: r.name for r in results})
+        for temp_key in temp_keys.values():
+            pipe.expire(temp_key, self.LEADERBOARD_TEMP_TTL)
+        return scores
+    
+    def _queue_leaderboard_swap(self, pipe, temp_keys: Dict[str, str], scores: Dict[int, int], has_rows: bool) -> None:
+        """Encolar el reemplazo de las claves del ranking por las temporales"""
+        for key, temp_key in temp_keys.items():
+            # RENAME falla si la temporal no existe: una clave sin datos se borra
+            filled = bool(scores) if key == self.LEADERBOARD_KEY else has_rows
+            if filled:
+                pipe.rename(temp_key, key)
+                pipe.persist(key)
+            else:
+                pipe.delete(key)
+        for product_id, total_quantity in scores.items():
+            pipe.set(f"{self.PRODUCT_STATS_KEY}:{product_id}", total_quantity)
     
     def get_cache_stats(self) -> dict:
         """Obtener estadísticas del caché"""
-        return cache.get_stats()
\ No newline at end of file
+        stats = cache.get_stats()
+        if self.journal is not None:
+            stats['write_behind'] = self.journal.get_stats()
+        return stats
+    
+    def get_db_pool_stats(self) -> dict:
+        """Obtener estadísticas del pool de conexiones a la base de datos"""
+        return get_pool_stats()
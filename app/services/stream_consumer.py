@@ -0,0 +1,157 @@
+import logging
+import os
+import socket
+import threading
+import time
+from typing import List
+import redis
+from app.cache import cache
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class StreamConsumer:
+    """Consumidor de un Redis Stream dentro de un grupo de consumidores.
+    
+    Las entradas se leen por lotes y `process` las confirma (XACK) sólo
+    después de aplicarlas: la posición confirmada del grupo es el checkpoint.
+    Si el proceso muere, lo no confirmado queda en la lista de pendientes; se
+    relee al reiniciar con el mismo nombre de consumidor y, pasado
+    `claim_idle_ms`, cualquier otro consumidor lo reclama con XAUTOCLAIM.
+    """
+    
+    def __init__(self, stream: str, group: str, consumer: str = None, batch_size: int = 100,
+                 block_ms: int = 1000, claim_idle_ms: int = 30000, start_id: str = '0'):
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        # XREADGROUP bloquea en el servidor: debe volver antes del timeout del socket
+        self.block_ms = min(block_ms, int(Config.REDIS_SOCKET_TIMEOUT * 1000 / 2))
+        self.claim_idle_ms = claim_idle_ms
+        # Posición inicial de un grupo nuevo: '0' todo lo retenido, '$' sólo lo nuevo
+        self.start_id = start_id
+        self._group_ready = False
+    
+    def ensure_group(self) -> None:
+        """Crear el stream y el grupo de consumidores si no existen"""
+        if self._group_ready:
+            return
+        try:
+            cache.master.xgroup_create(self.stream, self.group, id=self.start_id, mkstream=True)
+            logger.info(f"Grupo {self.group} creado en {self.stream}")
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+    
+    def process(self, entries: list) -> int:
+        """Aplicar un lote de entradas (id, campos), confirmarlas y retornar cuántas se aplicaron"""
+        raise NotImplementedError
+    
+    def after_claim(self) -> None:
+        """Mantenimiento periódico tras reclamar entradas (por defecto nada)"""
+    
+    def run(self, stop: threading.Event) -> None:
+        """Consumir el stream hasta que se active `stop`"""
+        self.ensure_group()
+        logger.info(f"Consumidor {self.consumer} del grupo {self.group} leyendo {self.stream}")
+        self.process(self._read_own_pending())
+        last_claim = time.monotonic()
+        
+        while not stop.is_set():
+            try:
+                if time.monotonic() - last_claim >= self.claim_idle_ms / 1000:
+                    self.process(self._claim_stale())
+                    self.after_claim()
+                    last_claim = time.monotonic()
+                self.process(self._read('>', block=self.block_ms))
+            except Exception as e:
+                logger.error(f"Error consumiendo {self.stream} ({self.group}): {e}")
+                stop.wait(1)
+        logger.info(f"Consumidor {self.consumer} del grupo {self.group} detenido")
+    
+    def drain(self) -> int:
+        """Procesar todo lo pendiente y lo no entregado; retorna el total aplicado"""
+        self.ensure_group()
+        processed = self.process(self._read_own_pending())
+        processed += self.process(self._claim_stale(min_idle_ms=0))
+        while True:
+            count = self.process(self._read('>'))
+            if not count:
+                break
+            processed += count
+        self.after_claim()
+        return processed
+    
+    def ack(self, entry_ids: List[str]) -> None:
+        """Confirmar entradas aplicadas (avanza el checkpoint del grupo)"""
+        if entry_ids:
+            cache.master.xack(self.stream, self.group, *entry_ids)
+    
+    def get_stats(self) -> dict:
+        """Posición del grupo, pendientes y entradas sin leer (lag, Redis >= 7)"""
+        try:
+            groups = cache.master.xinfo_groups(self.stream)
+        except redis.ResponseError as e:
+            # El stream aún no existe: ningún productor ni consumidor lo creó
+            if 'no such key' not in str(e).lower():
+                raise
+            groups = []
+        info = next((g for g in groups if g['name'] == self.group), None)
+        if info is None:
+            return {'stream': self.stream, 'group': self.group, 'status': 'missing'}
+        return {
+            'stream': self.stream,
+            'group': self.group,
+            'consumers': info['consumers'],
+            'pending': info['pending'],
+            'last_delivered_id': info['last-delivered-id'],
+            'lag': info.get('lag')
+        }
+    
+    def _read(self, start: str, block: int = None) -> list:
+        response = cache.master.xreadgroup(
+            self.group,
+            self.consumer,
+            {self.stream: start},
+            count=self.batch_size,
+            block=block
+        )
+        return response[0][1] if response else []
+    
+    def _read_own_pending(self) -> list:
+        """Entradas entregadas a este consumidor y no confirmadas (reinicio tras una caída)"""
+        entries = []
+        start = '0'
+        while True:
+            batch = self._read(start)
+            if not batch:
+                return entries
+            # Las entradas recortadas del stream vuelven sin campos: sólo se confirman
+            self.ack([entry_id for entry_id, fields in batch if not fields])
+            entries.extend(entry for entry in batch if entry[1])
+            start = batch[-1][0]
+    
+    def _claim_stale(self, min_idle_ms: int = None) -> list:
+        """Reclamar entradas que otro consumidor no confirmó a tiempo"""
+        if min_idle_ms is None:
+            min_idle_ms = self.claim_idle_ms
+        entries = []
+        start = '0-0'
+        while True:
+            result = cache.master.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer,
+                min_idle_ms,
+                start_id=start,
+                count=self.batch_size
+            )
+            start, claimed = result[0], result[1]
+            entries.extend(entry for entry in claimed if entry[1])
+            if start == '0-0':
+                break
+        if entries:
+            logger.warning(f"Reclamadas {len(entries)} entradas pendientes de {self.stream} ({self.group})")
+        return entries
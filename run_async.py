@@ -0,0 +1,7 @@
+from app.aio import create_app
+
+app = create_app()
+
+if __name__ == '__main__':
+    # En producción: hypercorn run_async:app --bind 0.0.0.0:5002
+    app.run(port=5002)
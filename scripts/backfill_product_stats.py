@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Recalcula la tabla product_stats desde cart_items (python -m scripts.backfill_product_stats).
+
+Los triggers instalados por scripts/migrate.py la mantienen al día; este
+script se ejecuta una vez tras instalarlos en una BD que ya tenía carritos, o
+para reconciliarla. Mientras corre, las escrituras en cart_items esperan.
+Con --leaderboard también reconstruye el ranking en Redis desde la tabla.
+"""
+
+import argparse
+from app import create_app
+from app.services.cart_service import CartService
+
+def backfill_product_stats():
+    parser = argparse.ArgumentParser(description="Recalcular product_stats desde cart_items")
+    parser.add_argument('--leaderboard', action='store_true', help="Reconstruir luego el ranking en Redis")
+    args = parser.parse_args()
+    
+    app = create_app()
+    
+    with app.app_context():
+        service = CartService()
+        result = service.rebuild_product_stats()
+        print("product_stats recalculada desde cart_items")
+        print(f"   - Productos: {result['products']}")
+        
+        if args.leaderboard:
+            leaderboard = service.rebuild_leaderboard()
+            print(f"   - Productos en el ranking de Redis: {leaderboard['products']}")
+
+if __name__ == '__main__':
+    backfill_product_stats()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia de búsqueda de carritos con y sin índices.
+
+Crea tablas temporales con la misma forma que carts/cart_items (no toca los
+datos reales), mide las consultas del servicio sin índices, crea los índices
+de app/models/database.py y vuelve a medir.
+
+Uso: python -m scripts.benchmark_indexes --carts 1000000 --lookups 200
+"""
+
+import argparse
+import random
+import statistics
+import time
+from sqlalchemy import text
+from app import create_app
+from app.models.database import db
+
+QUERIES = {
+    'carrito por user_id': (
+        "SELECT id FROM bench_carts WHERE user_id = :user_id",
+        lambda num_carts: {'user_id': f"user{random.randint(1, num_carts)}"}
+    ),
+    'items por cart_id': (
+        "SELECT product_id, quantity FROM bench_cart_items WHERE cart_id = :cart_id",
+        lambda num_carts: {'cart_id': random.randint(1, num_carts)}
+    ),
+    'item por (cart_id, product_id)': (
+        "SELECT quantity FROM bench_cart_items WHERE cart_id = :cart_id AND product_id = :product_id",
+        lambda num_carts: {'cart_id': random.randint(1, num_carts), 'product_id': random.randint(0, 9999)}
+    ),
+    'unidades por product_id': (
+        "SELECT SUM(quantity) FROM bench_cart_items WHERE product_id = :product_id",
+        lambda num_carts: {'product_id': random.randint(0, 9999)}
+    ),
+}
+
+INDEXES = [
+    "CREATE UNIQUE INDEX ON bench_carts (user_id)",
+    "CREATE UNIQUE INDEX ON bench_cart_items (cart_id, product_id)",
+    "CREATE INDEX ON bench_cart_items (product_id)",
+]
+
+def percentile(sorted_times, p):
+    index = min(len(sorted_times) - 1, int(round(p / 100 * (len(sorted_times) - 1))))
+    return sorted_times[index]
+
+def measure(conn, sql, params_factory, num_carts, num_lookups):
+    """Ejecutar la consulta `num_lookups` veces y retornar latencias en ms"""
+    times = []
+    for _ in range(num_lookups):
+        params = params_factory(num_carts)
+        start = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {
+        'mean': statistics.mean(times),
+        'p50': percentile(times, 50),
+        'p99': percentile(times, 99)
+    }
+
+def load_data(conn, num_carts, items_per_cart):
+    print(f"Generando {num_carts} carritos con {items_per_cart} items cada uno...")
+    conn.execute(text("""
+        CREATE TEMPORARY TABLE bench_carts (
+            id SERIAL PRIMARY KEY,
+            user_id VARCHAR(100) NOT NULL
+        )
+    """))
+    conn.execute(text("""
+        CREATE TEMPORARY TABLE bench_cart_items (
+            id SERIAL PRIMARY KEY,
+            cart_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL
+        )
+    """))
+    conn.execute(
+        text("INSERT INTO bench_carts (user_id) SELECT 'user' || g FROM generate_series(1, :n) g"),
+        {'n': num_carts}
+    )
+    # product_id distinto para cada item de un mismo carrito
+    conn.execute(
+        text("""
+            INSERT INTO bench_cart_items (cart_id, product_id, quantity)
+            SELECT c, (c + k * 997) % 10000, 1 + (c + k) % 5
+            FROM generate_series(1, :n) c, generate_series(1, :k) k
+        """),
+        {'n': num_carts, 'k': items_per_cart}
+    )
+    conn.execute(text("ANALYZE bench_carts"))
+    conn.execute(text("ANALYZE bench_cart_items"))
+
+def run_benchmark(num_carts, num_lookups, items_per_cart):
+    app = create_app()
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            # Sin el statement_timeout de la app: la carga y los índices pueden tardar
+            conn.execute(text("SET statement_timeout = 0"))
+            load_data(conn, num_carts, items_per_cart)
+
+            results = {}
+            for name, (sql, params_factory) in QUERIES.items():
+                results[name] = {'sin_indices': measure(conn, sql, params_factory, num_carts, num_lookups)}
+
+            print("Creando índices...")
+            for statement in INDEXES:
+                conn.execute(text(statement))
+            conn.execute(text("ANALYZE bench_carts"))
+            conn.execute(text("ANALYZE bench_cart_items"))
+
+            for name, (sql, params_factory) in QUERIES.items():
+                results[name]['con_indices'] = measure(conn, sql, params_factory, num_carts, num_lookups)
+            # Al cerrar la conexión sin commit las tablas temporales se descartan
+
+    print("\n" + "=" * 78)
+    print(f"LATENCIA DE BÚSQUEDA ({num_carts} carritos, {num_lookups} consultas por caso)")
+    print("=" * 78)
+    print(f"{'Consulta':<32}{'Sin índices p50/p99':>22}{'Con índices p50/p99':>22}")
+    for name, result in results.items():
+        before = result['sin_indices']
+        after = result['con_indices']
+        print(f"{name:<32}{before['p50']:>10.2f}/{before['p99']:<9.2f}ms"
+              f"{after['p50']:>10.2f}/{after['p99']:<9.2f}ms")
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de índices de carritos")
+    parser.add_argument('--carts', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--items-per-cart', type=int, default=5)
+    args = parser.parse_args()
+
+    run_benchmark(args.carts, args.lookups, args.items_per_cart)
+
+if __name__ == '__main__':
+    main()
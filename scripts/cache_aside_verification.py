@@ -182,8 +182,8 @@ class CacheAsideVerifier:
         print()
         
         try:
-            # Limpiar caché de top products
-            cache.delete("top_products")
+            # Forzar la reconstrucción del ranking desde la BD
+            cache.delete("leaderboard:built")
             
             print("1. PRIMERA CONSULTA TOP PRODUCTS (debe ir a BD):")
             start_time = time.time()
@@ -196,11 +196,11 @@ class CacheAsideVerifier:
                 print(f"   ✅ Productos retornados: {len(data1.get('top_products', []))}")
                 
                 # Verificar que está en caché
-                cached_top = cache.get("top_products")
+                cached_top = cache.get("leaderboard:built")
                 if cached_top:
-                    print("   ✅ Top products guardado en caché")
+                    print("   ✅ Ranking de productos reconstruido en Redis")
                 else:
-                    print("   ❌ Top products NO guardado en caché")
+                    print("   ❌ Ranking de productos NO reconstruido en Redis")
                     return False
             else:
                 print(f"   ❌ Error en primera consulta: {response1.status_code}")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Mantenimiento de claves en Redis sin bloquear la instancia.
+
+Recorre el keyspace con SCAN y procesa las claves por lotes.
+
+Uso:
+  python -m scripts.cache_maintenance audit "cart:*"
+  python -m scripts.cache_maintenance delete "cart:*"
+"""
+
+import argparse
+import json
+from app.cache import cache
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de claves en Redis")
+    parser.add_argument('command', choices=['audit', 'delete'])
+    parser.add_argument('pattern', help="Patrón de claves, p. ej. 'cart:*'")
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+    
+    if args.command == 'audit':
+        audit = cache.audit_ttls(args.pattern, batch_size=args.batch_size)
+        print(json.dumps(audit, indent=2))
+    else:
+        deleted = cache.delete_pattern(args.pattern, batch_size=args.batch_size)
+        print(f"Claves eliminadas con patrón {args.pattern}: {deleted}")
+
+if __name__ == '__main__':
+    main()
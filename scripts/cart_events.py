@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Consumidor de ejemplo del stream de eventos de carritos.
+
+`tail` imprime cada evento como una línea JSON usando un grupo propio (el
+checkpoint se conserva entre ejecuciones); `stats` muestra la posición y
+los pendientes del grupo.
+
+Uso:
+  python -m scripts.cart_events tail --group debug
+  python -m scripts.cart_events tail --group debug --from-start --once
+  python -m scripts.cart_events stats --group debug
+"""
+
+import argparse
+import json
+import signal
+import threading
+from dataclasses import asdict
+from app.services.cart_events import CartEventConsumer
+
+def print_events(events):
+    for event in events:
+        print(json.dumps(asdict(event), ensure_ascii=False), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Consumidor de eventos de carritos")
+    parser.add_argument('command', choices=['tail', 'stats'])
+    parser.add_argument('--group', required=True, help="Grupo de consumidores (un checkpoint por grupo)")
+    parser.add_argument('--consumer', default=None, help="Nombre del consumidor (por defecto host-pid)")
+    parser.add_argument('--from-start', action='store_true', help="Un grupo nuevo lee todo lo retenido")
+    parser.add_argument('--once', action='store_true', help="Procesar lo acumulado y salir")
+    args = parser.parse_args()
+    
+    consumer = CartEventConsumer(
+        args.group,
+        print_events,
+        consumer=args.consumer,
+        start_id='0' if args.from_start else '$'
+    )
+    
+    # stats sólo consulta: no crea el stream ni el grupo si faltan
+    if args.command == 'stats':
+        print(json.dumps(consumer.get_stats(), indent=2))
+        return
+    
+    consumer.ensure_group()
+    
+    if args.once:
+        consumer.drain()
+        return
+    
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    consumer.run(stop)
+
+if __name__ == '__main__':
+    main()
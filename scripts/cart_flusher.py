@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Flusher del journal de carritos (CART_WRITE_MODE=write_behind).
+
+Lee el Redis Stream con un grupo de consumidores y aplica los carritos en
+PostgreSQL por lotes. Pueden correr varias instancias con distinto
+--consumer; las entradas de una instancia caída las reclama otra.
+
+Uso:
+  python -m scripts.cart_flusher
+  python -m scripts.cart_flusher --once   (aplicar lo pendiente y salir)
+"""
+
+import argparse
+import signal
+import threading
+from app import create_app
+from app.services.cart_journal import CartJournal, CartFlusher
+
+def main():
+    parser = argparse.ArgumentParser(description="Flusher del journal de carritos")
+    parser.add_argument('--consumer', default=None, help="Nombre del consumidor (por defecto host-pid)")
+    parser.add_argument('--once', action='store_true')
+    args = parser.parse_args()
+    
+    app = create_app()
+    
+    with app.app_context():
+        flusher = CartFlusher(CartJournal(), args.consumer)
+        if args.once:
+            print(f"Carritos aplicados en PostgreSQL: {flusher.flush_once()}")
+            return
+        
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        flusher.run(stop)
+
+if __name__ == '__main__':
+    main()
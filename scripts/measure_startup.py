@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Medición del arranque de la aplicación en frío.
+
+Cada corrida es un proceso nuevo que mide el import de la app, create_app()
+y la latencia de la primera y la segunda petición, que es lo que paga cada
+worker al escalar.
+
+Uso: python -m scripts.measure_startup --runs 5 --path /cart/health
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PHASES = ['import_ms', 'create_app_ms', 'first_request_ms', 'second_request_ms', 'total_to_first_response_ms']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+status = client.get(sys.argv[1]).status_code
+first = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter()
+print(json.dumps({
+    'status': status,
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - created) * 1000,
+    'second_request_ms': (second - first) * 1000,
+    'total_to_first_response_ms': (first - start) * 1000
+}))
+"""
+
+def run_once(path):
+    """Ejecutar una medición en un proceso nuevo"""
+    result = subprocess.run([sys.executable, '-c', PROBE, path], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"La medición falló:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Medición del arranque de la aplicación")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/cart/health')
+    args = parser.parse_args()
+    
+    samples = []
+    for i in range(args.runs):
+        sample = run_once(args.path)
+        samples.append(sample)
+        print(f"Corrida {i + 1}: {sample['total_to_first_response_ms']:.1f}ms hasta la primera respuesta "
+              f"(HTTP {sample['status']})")
+    
+    print("\n" + "=" * 60)
+    print(f"ARRANQUE EN FRÍO ({args.runs} corridas, {args.path})")
+    print("=" * 60)
+    print(f"{'Fase':<30}{'p50':>10}{'min':>10}{'max':>10}")
+    for phase in PHASES:
+        values = [sample[phase] for sample in samples]
+        print(f"{phase:<30}{statistics.median(values):>10.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+if __name__ == '__main__':
+    main()
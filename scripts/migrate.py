@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Creación y migración del esquema (python -m scripts.migrate).
+
+Crea las tablas que falten con db.create_all() y luego aplica las
+migraciones: create_all sólo crea tablas que no existen, no agrega índices
+ni restricciones a tablas ya creadas. Cada paso es idempotente, por lo que el
+script puede ejecutarse varias veces. La aplicación no crea el esquema al
+arrancar: este script debe ejecutarse antes del primer despliegue y tras
+cada cambio de modelos.
+"""
+
+from sqlalchemy import text
+from app import create_app
+from app.models.database import db
+
+MIGRATIONS = [
+    (
+        "Unificar carritos duplicados por user_id",
+        [
+            # Mover los items al carrito más antiguo de cada usuario
+            """
+            WITH ranked AS (
+                SELECT id, MIN(id) OVER (PARTITION BY user_id) AS keep_id FROM carts
+            )
+            UPDATE cart_items ci SET cart_id = r.keep_id
+            FROM ranked r
+            WHERE ci.cart_id = r.id AND r.id <> r.keep_id
+            """,
+            """
+            DELETE FROM carts c USING carts k
+            WHERE c.user_id = k.user_id AND c.id > k.id
+            """,
+        ]
+    ),
+    (
+        "Unificar productos repetidos dentro de un carrito",
+        [
+            """
+            WITH totals AS (
+                SELECT MIN(id) AS keep_id, SUM(quantity) AS quantity
+                FROM cart_items
+                GROUP BY cart_id, product_id
+                HAVING COUNT(*) > 1
+            )
+            UPDATE cart_items ci SET quantity = t.quantity
+            FROM totals t
+            WHERE ci.id = t.keep_id
+            """,
+            """
+            DELETE FROM cart_items ci USING cart_items k
+            WHERE ci.cart_id = k.cart_id AND ci.product_id = k.product_id AND ci.id > k.id
+            """,
+        ]
+    ),
+    (
+        "Eliminar índices inválidos de una ejecución CONCURRENTLY interrumpida",
+        [
+            """
+            DO $$
+            DECLARE idx text;
+            BEGIN
+                FOR idx IN
+                    SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE NOT i.indisvalid
+                      AND c.relname IN ('ix_carts_user_id', 'uq_cart_items_cart_product', 'ix_cart_items_product_id')
+                LOOP
+                    EXECUTE 'DROP INDEX ' || quote_ident(idx);
+                END LOOP;
+            END $$
+            """,
+        ]
+    ),
+    (
+        "Índices en carts.user_id, cart_items(cart_id, product_id) y cart_items.product_id",
+        [
+            # CONCURRENTLY no bloquea escrituras mientras se construye el índice
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_carts_user_id ON carts (user_id)",
+            """
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_cart_items_cart_product
+            ON cart_items (cart_id, product_id)
+            """,
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_cart_items_cart_product') THEN
+                    ALTER TABLE cart_items
+                    ADD CONSTRAINT uq_cart_items_cart_product UNIQUE USING INDEX uq_cart_items_cart_product;
+                END IF;
+            END $$
+            """,
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cart_items_product_id ON cart_items (product_id)",
+        ]
+    ),
+    (
+        "Versión de carritos para escrituras condicionales en caché",
+        [
+            "CREATE SEQUENCE IF NOT EXISTS cart_version_seq",
+            """
+            ALTER TABLE carts
+            ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT nextval('cart_version_seq')
+            """,
+        ]
+    ),
+    (
+        "Triggers que mantienen product_stats desde cart_items "
+        "(en una BD con carritos, ejecutar luego python -m scripts.backfill_product_stats)",
+        [
+            # Se aplican los cambios de la sentencia completa (tablas de transición):
+            # una fila de product_stats por producto, en orden de product_id.
+            # Ese orden sólo vale dentro de una sentencia: una transacción con
+            # varias (upsert y DELETE en save_cart o en el flusher) bloquea antes
+            # todas sus filas con lock_product_stats_statement (app/models/database.py)
+            # para que dos transacciones no se bloqueen mutuamente.
+            # Costo: cada escritura en cart_items bloquea la fila de sus productos
+            # hasta el commit, así que las escrituras concurrentes sobre un mismo
+            # producto popular se serializan en ese tramo. Se acepta porque las
+            # transacciones de carrito son de una o pocas sentencias y la fila
+            # se toma en las últimas, poco antes del commit; productos distintos
+            # no compiten. Si un producto concentra demasiado tráfico, la
+            # alternativa es acumular deltas y aplicarlos por lotes.
+            """
+            CREATE OR REPLACE FUNCTION product_stats_apply_deltas() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO product_stats AS s
+                        (product_id, name, total_quantity, times_ordered, price_sum, updated_at)
+                    SELECT product_id, max(name), sum(quantity), count(*), sum(price), now()
+                    FROM new_rows
+                    GROUP BY product_id
+                    ORDER BY product_id
+                    ON CONFLICT (product_id) DO UPDATE SET
+                        name = excluded.name,
+                        total_quantity = s.total_quantity + excluded.total_quantity,
+                        times_ordered = s.times_ordered + excluded.times_ordered,
+                        price_sum = s.price_sum + excluded.price_sum,
+                        updated_at = excluded.updated_at;
+                ELSIF TG_OP = 'DELETE' THEN
+                    INSERT INTO product_stats AS s
+                        (product_id, name, total_quantity, times_ordered, price_sum, updated_at)
+                    SELECT product_id, max(name), -sum(quantity), -count(*), -sum(price), now()
+                    FROM old_rows
+                    GROUP BY product_id
+                    ORDER BY product_id
+                    ON CONFLICT (product_id) DO UPDATE SET
+                        total_quantity = s.total_quantity + excluded.total_quantity,
+                        times_ordered = s.times_ordered + excluded.times_ordered,
+                        price_sum = s.price_sum + excluded.price_sum,
+                        updated_at = excluded.updated_at;
+                ELSE
+                    INSERT INTO product_stats AS s
+                        (product_id, name, total_quantity, times_ordered, price_sum, updated_at)
+                    SELECT
+                        product_id,
+                        -- El nombre nuevo, para que un producto renombrado no quede con el anterior
+                        coalesce(max(name) FILTER (WHERE orders > 0), max(name)),
+                        sum(quantity), sum(orders), sum(price), now()
+                    FROM (
+                        SELECT product_id, name, quantity, 1 AS orders, price FROM new_rows
+                        UNION ALL
+                        SELECT product_id, name, -quantity, -1, -price FROM old_rows
+                    ) AS deltas
+                    GROUP BY product_id
+                    -- Las actualizaciones que no cambian totales ni nombre no tocan product_stats
+                    HAVING sum(quantity) <> 0 OR sum(orders) <> 0 OR sum(price) <> 0
+                        OR max(name) FILTER (WHERE orders > 0) IS DISTINCT FROM max(name) FILTER (WHERE orders < 0)
+                    ORDER BY product_id
+                    ON CONFLICT (product_id) DO UPDATE SET
+                        name = excluded.name,
+                        total_quantity = s.total_quantity + excluded.total_quantity,
+                        times_ordered = s.times_ordered + excluded.times_ordered,
+                        price_sum = s.price_sum + excluded.price_sum,
+                        updated_at = excluded.updated_at;
+                END IF;
+                RETURN NULL;
+            END $$
+            """,
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_product_stats_insert') THEN
+                    CREATE TRIGGER trg_product_stats_insert
+                    AFTER INSERT ON cart_items REFERENCING NEW TABLE AS new_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION product_stats_apply_deltas();
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_product_stats_update') THEN
+                    CREATE TRIGGER trg_product_stats_update
+                    AFTER UPDATE ON cart_items REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION product_stats_apply_deltas();
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_product_stats_delete') THEN
+                    CREATE TRIGGER trg_product_stats_delete
+                    AFTER DELETE ON cart_items REFERENCING OLD TABLE AS old_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION product_stats_apply_deltas();
+                END IF;
+            END $$
+            """,
+        ]
+    ),
+]
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        print("- Crear tablas faltantes")
+        db.create_all()
+
+        # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            # El statement_timeout de la app (DB_STATEMENT_TIMEOUT_MS) cortaría
+            # CREATE INDEX CONCURRENTLY y las reconstrucciones sobre tablas grandes
+            conn.execute(text("SET statement_timeout = 0"))
+            for description, statements in MIGRATIONS:
+                print(f"- {description}")
+                for statement in statements:
+                    conn.execute(text(statement))
+
+        print("Migraciones aplicadas correctamente")
+
+if __name__ == '__main__':
+    migrate()
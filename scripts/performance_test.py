@@ -1,265 +1,380 @@
-import requests
-import time
-import statistics
+#!/usr/bin/env python3
+"""
+Generador de carga para la API de carritos a partir de escenarios JSON.
+
+Modos:
+  closed  `concurrency` clientes; cada uno envía la siguiente petición al
+          recibir la respuesta (más un think time opcional).
+  open    llegadas a tasa fija (`rate` peticiones/s, Poisson o uniformes)
+          independientes de las respuestas. La latencia se mide desde la
+          hora programada, así la espera en cola cuenta (sin omisión
+          coordinada).
+
+Cada cliente usa su propia sesión HTTP keep-alive. Usuarios y productos se
+eligen con una distribución Zipf (s=0 es uniforme). El reporte JSON incluye
+por operación y en total: throughput, errores, códigos de estado,
+percentiles p50/p90/p99/p99.9 e histograma de latencias.
+
+Uso:
+  python -m scripts.performance_test scripts/scenarios/read_heavy.json
+  python -m scripts.performance_test scripts/scenarios/mixed_open_loop.json --rate 300 --duration 60
+  python -m scripts.performance_test ESCENARIO --mode closed --concurrency 32 --output reporte.json
+"""
+
+import argparse
+import bisect
+import itertools
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import sys
-import os
+import math
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
+import requests
 
-# Agregar el directorio padre al path para importar la app
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PERCENTILES = (50, 90, 99, 99.9)
 
-from app.cache import cache
+class ZipfSampler:
+    """Claves 1..n con probabilidad proporcional a 1/rank^s (s=0: uniforme)"""
+    
+    def __init__(self, n: int, s: float):
+        weights = [1 / rank ** s for rank in range(1, n + 1)]
+        total = sum(weights)
+        self.cdf = list(itertools.accumulate(weight / total for weight in weights))
+    
+    def sample(self, rng: random.Random) -> int:
+        return min(bisect.bisect_left(self.cdf, rng.random()), len(self.cdf) - 1) + 1
 
-class PerformanceTest:
-    def __init__(self, base_url="http://localhost:5001"):
-        self.base_url = base_url
-        self.results = {
-            'cache_enabled': {
-                'get_cart': [],
-                'add_item': [],
-                'top_products': []
-            },
-            'cache_disabled': {
-                'get_cart': [],
-                'add_item': [],
-                'top_products': []
-            }
+class LatencyHistogram:
+    """Histograma logarítmico de latencias en microsegundos.
+    
+    Exacto hasta 128µs y luego 64 sub-buckets por potencia de 2 (error
+    relativo < 1.6%): memoria acotada y se combina sumando conteos.
+    """
+    SUB_BUCKET_BITS = 6
+    
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+    
+    def record(self, seconds: float) -> None:
+        us = max(int(seconds * 1_000_000), 1)
+        shift = max(us.bit_length() - self.SUB_BUCKET_BITS - 1, 0)
+        self.counts[(shift, us >> shift)] += 1
+        self.count += 1
+        self.total_us += us
+        self.min_us = us if self.min_us is None else min(self.min_us, us)
+        self.max_us = max(self.max_us, us)
+    
+    def merge(self, other: 'LatencyHistogram') -> None:
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total_us += other.total_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+    
+    def _buckets(self):
+        """(límite superior en µs, conteo) en orden creciente"""
+        for shift, mantissa in sorted(self.counts, key=lambda bucket: bucket[1] << bucket[0]):
+            yield ((mantissa + 1) << shift) - 1, self.counts[(shift, mantissa)]
+    
+    def percentile(self, p: float) -> float:
+        """Percentil en ms (límite superior del bucket que lo contiene)"""
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(p / 100 * self.count), 1)
+        seen = 0
+        for upper_us, count in self._buckets():
+            seen += count
+            if seen >= rank:
+                return min(upper_us, self.max_us) / 1000
+        return self.max_us / 1000
+    
+    def summary(self) -> dict:
+        if not self.count:
+            return {}
+        summary = {
+            'min': round(self.min_us / 1000, 3),
+            'mean': round(self.total_us / self.count / 1000, 3),
+            'max': round(self.max_us / 1000, 3)
         }
+        for p in PERCENTILES:
+            summary[f"p{p:g}"] = round(self.percentile(p), 3)
+        return summary
     
-    def clear_cache(self):
-        """Limpiar todo el cache de Redis"""
-        try:
-            cache.master.flushall()
-            print("Cache limpiado")
-        except Exception as e:
-            print(f"Error limpiando cache: {e}")
+    def coarse(self) -> Dict[str, int]:
+        """Conteos por potencia de 2 en ms ('<=1', '<=2', '<=4', ...) para el reporte"""
+        histogram = Counter()
+        for upper_us, count in self._buckets():
+            limit = 1
+            while limit * 1000 < upper_us:
+                limit *= 2
+            histogram[f"<={limit}"] += count
+        return dict(sorted(histogram.items(), key=lambda item: int(item[0][2:])))
+
+@dataclass
+class Operation:
+    """Petición del escenario; `path` y `json` admiten {user_id} y {product_id}"""
+    name: str
+    method: str
+    path: str
+    weight: float = 1.0
+    json: Optional[dict] = None
+    ok_status: List[int] = field(default_factory=list)  # No-2xx que no cuentan como error
+
+@dataclass
+class OperationStats:
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    statuses: Counter = field(default_factory=Counter)
+    errors: int = 0
     
-    def measure_request_time(self, method, url, **kwargs):
-        """Medir tiempo de respuesta de una peticion"""
-        start_time = time.time()
-        try:
-            if method.upper() == 'GET':
-                response = requests.get(url, **kwargs)
-            elif method.upper() == 'POST':
-                response = requests.post(url, **kwargs)
-            elif method.upper() == 'PUT':
-                response = requests.put(url, **kwargs)
-            else:
-                raise ValueError(f"Metodo HTTP no soportado: {method}")
-            
-            end_time = time.time()
-            response_time = (end_time - start_time) * 1000  # en milisegundos
-            
-            return {
-                'response_time': response_time,
-                'status_code': response.status_code,
-                'success': response.status_code == 200
-            }
-        except Exception as e:
-            end_time = time.time()
-            return {
-                'response_time': (end_time - start_time) * 1000,
-                'status_code': 0,
-                'success': False,
-                'error': str(e)
-            }
+    def merge(self, other: 'OperationStats') -> None:
+        self.latency.merge(other.latency)
+        self.statuses.update(other.statuses)
+        self.errors += other.errors
+
+def render(value, keys: dict):
+    """Reemplazar {user_id}/{product_id}; un string que es sólo el marcador conserva el tipo"""
+    if isinstance(value, str):
+        for name, key in keys.items():
+            if value == f"{{{name}}}":
+                return key
+        return value.format(**keys)
+    if isinstance(value, dict):
+        return {k: render(v, keys) for k, v in value.items()}
+    if isinstance(value, list):
+        return [render(v, keys) for v in value]
+    return value
+
+class LoadGenerator:
+    DEFAULTS = {
+        'base_url': 'http://localhost:5001',
+        'mode': 'closed',
+        'concurrency': 10,
+        'rate': 100,            # open: peticiones por segundo
+        'arrival': 'poisson',   # open: 'poisson' o 'uniform'
+        'duration': 30,         # segundos medidos
+        'warmup': 5,            # segundos iniciales sin medir
+        'think_time': 0,        # closed: segundos entre respuesta y siguiente petición
+        'timeout': 5,
+        'seed': None,
+        'users': {'count': 25, 'format': 'user{:03d}', 'zipf_s': 1.0},
+        'products': {'count': 250, 'zipf_s': 1.0}
+    }
     
-    def test_get_cart_performance(self, user_ids, num_requests=50):
-        """Probar rendimiento de obtener carritos"""
-        print(f"\nProbando GET /cart/<user_id> con {num_requests} peticiones...")
-        
-        # Test con cache habilitado
-        print("  Con cache habilitado:")
-        times = []
-        for i in range(num_requests):
-            user_id = user_ids[i % len(user_ids)]
-            result = self.measure_request_time('GET', f"{self.base_url}/cart/{user_id}")
-            if result['success']:
-                times.append(result['response_time'])
+    def __init__(self, scenario: dict):
+        self.config = {**self.DEFAULTS, **scenario}
+        self.name = self.config.get('name', 'escenario')
+        self.operations = [Operation(**op) for op in self.config['operations']]
+        self.cumulative_weights = list(itertools.accumulate(op.weight for op in self.operations))
+        users = {**self.DEFAULTS['users'], **self.config['users']}
+        products = {**self.DEFAULTS['products'], **self.config['products']}
+        self.user_format = users['format']
+        self.users = ZipfSampler(users['count'], users['zipf_s'])
+        self.products = ZipfSampler(products['count'], products['zipf_s'])
+        self.base_url = self.config['base_url'].rstrip('/')
+        self.seed = self.config['seed'] if self.config['seed'] is not None else random.randrange(2 ** 32)
+        self.dropped = 0
+        self.max_backlog = 0
+        self._dropped_lock = threading.Lock()
+    
+    def run(self) -> dict:
+        """Ejecutar el escenario y retornar el reporte"""
+        mode = self.config['mode']
+        concurrency = self.config['concurrency']
+        started_at = datetime.now(timezone.utc).isoformat()
+        self.measure_start = time.perf_counter() + self.config['warmup']
+        self.deadline = self.measure_start + self.config['duration']
         
-        self.results['cache_enabled']['get_cart'] = times
-        avg_time = statistics.mean(times) if times else 0
-        print(f"    Tiempo promedio: {avg_time:.2f}ms")
-        print(f"    Peticiones exitosas: {len(times)}/{num_requests}")
+        worker_stats = [{} for _ in range(concurrency)]
+        if mode == 'open':
+            self.pending = queue.Queue()
+            threads = [threading.Thread(target=self._open_producer, daemon=True)]
+            target = self._open_worker
+        elif mode == 'closed':
+            threads = []
+            target = self._closed_worker
+        else:
+            raise ValueError(f"Modo desconocido: {mode} (usar 'open' o 'closed')")
+        threads += [threading.Thread(target=target, args=(i, worker_stats[i]), daemon=True) for i in range(concurrency)]
         
-        # Limpiar cache y probar sin cache
-        self.clear_cache()
-        print("  Sin cache (primer acceso):")
-        times = []
-        for i in range(num_requests):
-            user_id = user_ids[i % len(user_ids)]
-            # Limpiar cache antes de cada peticion para simular sin cache
-            cache.delete(f"cart:{user_id}")
-            result = self.measure_request_time('GET', f"{self.base_url}/cart/{user_id}")
-            if result['success']:
-                times.append(result['response_time'])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
         
-        self.results['cache_disabled']['get_cart'] = times
-        avg_time = statistics.mean(times) if times else 0
-        print(f"    Tiempo promedio: {avg_time:.2f}ms")
-        print(f"    Peticiones exitosas: {len(times)}/{num_requests}")
+        return self._report(worker_stats, started_at)
     
-    def test_add_item_performance(self, user_ids, num_requests=30):
-        """Probar rendimiento de agregar items"""
-        print(f"\nProbando POST /cart/<user_id>/add con {num_requests} peticiones...")
-        
-        sample_item = {
-            "product_id": 9999,
-            "name": "Producto de Prueba",
-            "price": 99.99,
-            "quantity": 1
+    def _pick(self, rng: random.Random) -> Operation:
+        return self.operations[bisect.bisect_right(self.cumulative_weights, rng.random() * self.cumulative_weights[-1])]
+    
+    def _request(self, session: requests.Session, rng: random.Random, stats: dict, scheduled: float) -> None:
+        """Enviar una operación y registrarla si `scheduled` cae en la ventana medida"""
+        operation = self._pick(rng)
+        keys = {
+            'user_id': self.user_format.format(self.users.sample(rng)),
+            'product_id': self.products.sample(rng)
         }
-        
-        # Test con cache
-        print("  Con cache habilitado:")
-        times = []
-        for i in range(num_requests):
-            user_id = user_ids[i % len(user_ids)]
-            sample_item['product_id'] = 9999 + i  # IDs unicos
-            result = self.measure_request_time(
-                'POST', 
-                f"{self.base_url}/cart/{user_id}/add",
-                json=sample_item,
-                headers={'Content-Type': 'application/json'}
+        try:
+            response = session.request(
+                operation.method,
+                self.base_url + render(operation.path, keys),
+                json=render(operation.json, keys),
+                timeout=self.config['timeout']
             )
-            if result['success']:
-                times.append(result['response_time'])
+            status = response.status_code
+            failed = not (200 <= status < 300 or status in operation.ok_status)
+        except requests.RequestException as e:
+            status = type(e).__name__
+            failed = True
+        finished = time.perf_counter()
         
-        self.results['cache_enabled']['add_item'] = times
-        avg_time = statistics.mean(times) if times else 0
-        print(f"    Tiempo promedio: {avg_time:.2f}ms")
-        print(f"    Peticiones exitosas: {len(times)}/{num_requests}")
+        if scheduled < self.measure_start:
+            return
+        op_stats = stats.setdefault(operation.name, OperationStats())
+        op_stats.latency.record(finished - scheduled)
+        op_stats.statuses[str(status)] += 1
+        if failed:
+            op_stats.errors += 1
     
-    def test_top_products_performance(self, num_requests=20):
-        """Probar rendimiento del endpoint de top productos"""
-        print(f"\nProbando GET /cart/stats/top-products con {num_requests} peticiones...")
-        
-        # Test con cache habilitado
-        print("  Con cache habilitado:")
-        times = []
-        for i in range(num_requests):
-            result = self.measure_request_time('GET', f"{self.base_url}/cart/stats/top-products")
-            if result['success']:
-                times.append(result['response_time'])
-        
-        self.results['cache_enabled']['top_products'] = times
-        avg_time = statistics.mean(times) if times else 0
-        print(f"    Tiempo promedio: {avg_time:.2f}ms")
-        print(f"    Peticiones exitosas: {len(times)}/{num_requests}")
-        
-        # Test sin cache
-        cache.delete("top_products")
-        print("  Sin cache:")
-        times = []
-        for i in range(num_requests):
-            # Limpiar cache antes de cada peticion
-            cache.delete("top_products")
-            result = self.measure_request_time('GET', f"{self.base_url}/cart/stats/top-products")
-            if result['success']:
-                times.append(result['response_time'])
-        
-        self.results['cache_disabled']['top_products'] = times
-        avg_time = statistics.mean(times) if times else 0
-        print(f"    Tiempo promedio: {avg_time:.2f}ms")
-        print(f"    Peticiones exitosas: {len(times)}/{num_requests}")
+    def _closed_worker(self, index: int, stats: dict) -> None:
+        rng = random.Random(self.seed + index)
+        think_time = self.config['think_time']
+        with requests.Session() as session:
+            while time.perf_counter() < self.deadline:
+                self._request(session, rng, stats, time.perf_counter())
+                if think_time:
+                    time.sleep(think_time)
     
-    def test_concurrent_requests(self, user_ids, num_threads=10, requests_per_thread=5):
-        """Probar rendimiento con peticiones concurrentes"""
-        print(f"\nProbando peticiones concurrentes: {num_threads} hilos, {requests_per_thread} peticiones/hilo")
-        
-        def make_requests(thread_id):
-            times = []
-            for i in range(requests_per_thread):
-                user_id = user_ids[(thread_id * requests_per_thread + i) % len(user_ids)]
-                result = self.measure_request_time('GET', f"{self.base_url}/cart/{user_id}")
-                if result['success']:
-                    times.append(result['response_time'])
-            return times
-        
-        start_time = time.time()
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = [executor.submit(make_requests, i) for i in range(num_threads)]
-            all_times = []
-            for future in as_completed(futures):
-                all_times.extend(future.result())
-        
-        total_time = time.time() - start_time
-        avg_time = statistics.mean(all_times) if all_times else 0
-        
-        print(f"    Tiempo total: {total_time:.2f}s")
-        print(f"    Tiempo promedio por peticion: {avg_time:.2f}ms")
-        print(f"    Peticiones por segundo: {len(all_times)/total_time:.2f}")
-        print(f"    Peticiones exitosas: {len(all_times)}/{num_threads * requests_per_thread}")
+    def _open_producer(self) -> None:
+        """Programar llegadas a `rate` por segundo hasta el final de la prueba"""
+        rng = random.Random(self.seed - 1)
+        rate = self.config['rate']
+        poisson = self.config['arrival'] == 'poisson'
+        next_arrival = time.perf_counter()
+        while next_arrival < self.deadline:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.pending.put(next_arrival)
+            self.max_backlog = max(self.max_backlog, self.pending.qsize())
+            next_arrival += rng.expovariate(rate) if poisson else 1 / rate
+        for _ in range(self.config['concurrency']):
+            self.pending.put(None)
     
-    def generate_report(self):
-        """Generar reporte de rendimiento"""
-        print("\n" + "="*70)
-        print("REPORTE DE RENDIMIENTO")
-        print("="*70)
+    def _open_worker(self, index: int, stats: dict) -> None:
+        rng = random.Random(self.seed + index)
+        with requests.Session() as session:
+            while True:
+                scheduled = self.pending.get()
+                if scheduled is None:
+                    return
+                if time.perf_counter() >= self.deadline + self.config['timeout']:
+                    # Llegadas que no alcanzaron a enviarse: el sistema no sostuvo la tasa
+                    with self._dropped_lock:
+                        self.dropped += 1
+                    continue
+                self._request(session, rng, stats, scheduled)
+    
+    def _report(self, worker_stats: List[dict], started_at: str) -> dict:
+        # Se registran las peticiones iniciadas (o programadas) dentro de la ventana medida
+        elapsed = self.config['duration']
+        operations = {}
+        for stats in worker_stats:
+            for name, op_stats in stats.items():
+                operations.setdefault(name, OperationStats()).merge(op_stats)
+        totals = OperationStats()
+        for op_stats in operations.values():
+            totals.merge(op_stats)
         
-        for operation in ['get_cart', 'add_item', 'top_products']:
-            if (self.results['cache_enabled'][operation] and 
-                self.results['cache_disabled'][operation]):
-                
-                cache_enabled = self.results['cache_enabled'][operation]
-                cache_disabled = self.results['cache_disabled'][operation]
-                
-                avg_with_cache = statistics.mean(cache_enabled)
-                avg_without_cache = statistics.mean(cache_disabled)
-                improvement = ((avg_without_cache - avg_with_cache) / avg_without_cache) * 100
-                
-                print(f"\n{operation.upper()}:")
-                print(f"  Con cache:    {avg_with_cache:.2f}ms (promedio)")
-                print(f"  Sin cache:    {avg_without_cache:.2f}ms (promedio)")
-                print(f"  Mejora:       {improvement:.1f}% mas rapido con cache")
-                print(f"  Factor:       {avg_without_cache/avg_with_cache:.1f}x mas rapido")
+        def describe(op_stats: OperationStats) -> dict:
+            requests_count = op_stats.latency.count
+            return {
+                'requests': requests_count,
+                'errors': op_stats.errors,
+                'error_rate': round(op_stats.errors / requests_count, 4) if requests_count else 0.0,
+                'throughput_rps': round(requests_count / elapsed, 2),
+                'status_codes': dict(op_stats.statuses),
+                'latency_ms': op_stats.latency.summary(),
+                'histogram_ms': op_stats.latency.coarse()
+            }
         
-        # Estadisticas de Redis
-        try:
-            redis_stats = cache.get_stats()
-            print(f"\nESTADISTICAS DE REDIS:")
-            print(f"  Master: {redis_stats['master']['status']}")
-            if redis_stats['master']['status'] == 'connected':
-                info = redis_stats['master']['info']
-                print(f"    Clientes conectados: {info.get('connected_clients', 0)}")
-                print(f"    Memoria utilizada: {info.get('used_memory_human', '0')}")
-                print(f"    Cache hits: {info.get('keyspace_hits', 0)}")
-                print(f"    Cache misses: {info.get('keyspace_misses', 0)}")
-            
-            print(f"  Slaves: {len([s for s in redis_stats['slaves'] if s.get('status') == 'connected'])} activos")
-        except Exception as e:
-            print(f"  Error obteniendo estadisticas: {e}")
+        report = {
+            'scenario': self.name,
+            'started_at': started_at,
+            'config': {**{key: self.config[key] for key in self.DEFAULTS}, 'seed': self.seed},
+            'measured_seconds': elapsed,
+            'totals': describe(totals),
+            'operations': {name: describe(op_stats) for name, op_stats in sorted(operations.items())}
+        }
+        if self.config['mode'] == 'open':
+            report['open_loop'] = {'dropped': self.dropped, 'max_backlog': self.max_backlog}
+        return report
+
+def print_report(report: dict) -> None:
+    config = report['config']
+    print("\n" + "=" * 100)
+    print(f"ESCENARIO {report['scenario']} - modo {config['mode']}, {config['concurrency']} clientes"
+          + (f", {config['rate']} pet/s" if config['mode'] == 'open' else "")
+          + f", {report['measured_seconds']}s medidos")
+    print("=" * 100)
+    header = f"{'operación':<22}{'pet':>8}{'err':>7}{'pet/s':>10}" + "".join(f"{'p' + format(p, 'g'):>10}" for p in PERCENTILES) + f"{'max':>10}"
+    print(header)
+    rows = list(report['operations'].items()) + [('TOTAL', report['totals'])]
+    for name, data in rows:
+        latency = data['latency_ms']
+        print(f"{name:<22}{data['requests']:>8}{data['errors']:>7}{data['throughput_rps']:>10}"
+              + "".join(f"{latency.get(f'p{p:g}', 0):>10}" for p in PERCENTILES)
+              + f"{latency.get('max', 0):>10}")
+    if 'open_loop' in report:
+        print(f"\nLlegadas descartadas: {report['open_loop']['dropped']}, cola máxima: {report['open_loop']['max_backlog']}")
+    print("(latencias en ms)")
 
 def main():
-    # Verificar que la API este disponible
-    tester = PerformanceTest()
+    parser = argparse.ArgumentParser(description="Generador de carga para la API de carritos")
+    parser.add_argument('scenario', help="Archivo JSON del escenario (ver scripts/scenarios/)")
+    parser.add_argument('--base-url')
+    parser.add_argument('--mode', choices=['open', 'closed'])
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--rate', type=float, help="Peticiones por segundo (modo open)")
+    parser.add_argument('--duration', type=float)
+    parser.add_argument('--warmup', type=float)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help="Archivo del reporte JSON (por defecto load_report_<escenario>.json)")
+    args = parser.parse_args()
+    
+    with open(args.scenario, encoding='utf-8') as f:
+        scenario = json.load(f)
+    for key in ('base_url', 'mode', 'concurrency', 'rate', 'duration', 'warmup', 'seed'):
+        value = getattr(args, key)
+        if value is not None:
+            scenario[key] = value
     
+    generator = LoadGenerator(scenario)
     try:
-        response = requests.get(f"{tester.base_url}/cart/health", timeout=5)
-        if response.status_code != 200:
-            print("La API no esta disponible. Asegurate de que este ejecutandose en localhost:5001")
-            return
-    except requests.exceptions.RequestException:
-        print("No se puede conectar a la API. Asegurate de que este ejecutandose en localhost:5001")
+        response = requests.get(f"{generator.base_url}/cart/general-health", timeout=5)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"No se puede conectar a la API en {generator.base_url}: {e}")
         return
     
-    print("Iniciando pruebas de rendimiento...")
-    print("Asegurate de tener datos de prueba cargados (ejecuta seed_data.py primero)")
-    
-    # Lista de usuarios de prueba
-    user_ids = [f"user{i:03d}" for i in range(1, 26)]  # user001 a user025
-    
-    # Ejecutar pruebas
-    tester.test_get_cart_performance(user_ids, num_requests=100)
-    tester.test_add_item_performance(user_ids, num_requests=50)
-    tester.test_top_products_performance(num_requests=30)
-    tester.test_concurrent_requests(user_ids, num_threads=10, requests_per_thread=10)
-    
-    # Generar reporte final
-    tester.generate_report()
+    print(f"Ejecutando escenario {generator.name} ({generator.config['warmup']}s de calentamiento "
+          f"+ {generator.config['duration']}s medidos)...")
+    report = generator.run()
+    print_report(report)
     
-    print("\nPruebas de rendimiento completadas")
+    output = args.output or f"load_report_{generator.name}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Reporte guardado en {output}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
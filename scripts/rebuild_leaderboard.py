@@ -0,0 +1,13 @@
+from app import create_app
+from app.services.cart_service import CartService
+
+def rebuild_leaderboard():
+    app = create_app()
+    
+    with app.app_context():
+        result = CartService().rebuild_leaderboard()
+        print("Ranking de productos reconstruido desde PostgreSQL")
+        print(f"   - Productos en el ranking: {result['products']}")
+
+if __name__ == '__main__':
+    rebuild_leaderboard()
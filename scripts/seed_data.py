@@ -1,5 +1,6 @@
 from app import create_app
 from app.models.database import db, DBCart, DBCartItem
+from app.services.cart_service import CartService
 from datetime import datetime, timezone
 import random
 
@@ -109,6 +110,9 @@ def seed_database():
         
         db.session.commit()
         
+        # Reconciliar el ranking de productos con los datos nuevos
+        CartService().rebuild_leaderboard()
+        
         print("Datos de prueba insertados correctamente")
         print("Estadísticas:")
         print(f"   - Carritos creados: {total_carts}")